@@ -4,9 +4,12 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from redis.asyncio import Redis as AsyncRedis
 from app.schemas.auth import LoginRequest, TokenResponse, UserResponse
 from app.models.user import User
 from app.core.db import get_db
+from app.core.executor import ExecutorBusyError
+from app.core.redis import get_async_redis
 from app.services import auth
 from app.dependencies import get_current_user
 from app.core.logger import get_logger
@@ -19,7 +22,8 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 @router.post("/login", response_model=TokenResponse, summary="使用者登入")
 async def login(
     req: LoginRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    redis: AsyncRedis = Depends(get_async_redis)
 ):
     """
     使用者登入介面
@@ -27,7 +31,8 @@ async def login(
     - **username**: 使用者名（3-50個字元，只能包含字母、數字和底線）
     - **password**: 密碼（最少6個字元）
     
-    返回 JWT Token，用於後續 API 調用的認證
+    返回 JWT Token，用於後續 API 調用的認證。
+    密碼驗證在有界執行緒池中執行，排隊已滿時返回 503
     """
     logger.info(f"使用者登入嘗試: {req.username}")
     
@@ -41,16 +46,35 @@ async def login(
         )
     
     # 驗證密碼
-    if not auth.verify_password(req.password, user.hashed_password):
+    try:
+        valid, new_hash = await auth.verify_password_async(req.password, user.hashed_password)
+    except ExecutorBusyError as e:
+        logger.warning(f"登入請求過多: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="登入請求過多，請稍後重試",
+            headers={"Retry-After": "1"}
+        )
+    if not valid:
         logger.warning(f"登入失敗：密碼錯誤 - {req.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="使用者名或密碼錯誤"
         )
     
+    # 將舊的密碼雜湊升級為目前配置的演算法和成本（失敗不影響登入）
+    if new_hash:
+        try:
+            user.hashed_password = new_hash
+            db.commit()
+            logger.info(f"已升級使用者密碼雜湊: {req.username}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"升級密碼雜湊失敗: {e}")
+    
     # 創建存取令牌
     try:
-        token = auth.create_access_token(user.username)
+        token = await auth.create_access_token_async(user.username, redis)
         logger.info(f"使用者登入成功: {req.username}")
         return TokenResponse(
             access_token=token,
@@ -65,7 +89,10 @@ async def login(
 
 
 @router.post("/logout", summary="使用者登出")
-async def logout(current_user: User = Depends(get_current_user)):
+async def logout(
+    current_user: User = Depends(get_current_user),
+    redis: AsyncRedis = Depends(get_async_redis)
+):
     """
     使用者登出介面
     
@@ -74,7 +101,7 @@ async def logout(current_user: User = Depends(get_current_user)):
     logger.info(f"使用者登出: {current_user.username}")
     
     try:
-        auth.revoke_token(current_user.username)
+        await auth.revoke_token_async(current_user.username, redis)
         return {"message": "登出成功"}
     except Exception as e:
         logger.error(f"登出失敗: {e}")
@@ -3,27 +3,97 @@
 處理 Facebook 爬蟲相關請求
 """
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
-from sqlalchemy.orm import Session
-from app.schemas.crawl import CrawlRequest, CrawlResponse
+from typing import Any, Dict, List
+from redis.asyncio import Redis as AsyncRedis
+from app.schemas.crawl import CrawlRequest, CrawlResponse, TaskStatusBatchRequest
 from app.models.user import User
-from app.core.db import get_db
-from app.core.redis import redis_client
-from app.services.post_service import save_posts_to_db, save_posts_to_redis
+from app.core.db import SessionLocal
+from app.core.config import settings
+from app.core.executor import BoundedExecutor, ExecutorBusyError
+from app.core.redis import (
+    redis_client,
+    redis_cache_client,
+    get_async_cache_redis,
+    get_async_redis,
+    get_async_result_redis
+)
+from app.services.post_service import save_posts_to_db, save_posts_to_redis, POSTS_INDEX_KEY
+from app.services.post_cache import warm_post_listing, publish_listing_invalidation
+from app.services.task_events import (
+    TaskEventStreamResponse,
+    reserve_event_stream,
+    task_event_stream
+)
+from app.services.task_status import get_task_statuses
 from app.crawler.facebook import crawl_facebook_posts, FacebookCrawlerError
 from app.dependencies import require_admin1_user
 from app.core.logger import get_logger
 from app.core.rate_limit import limiter
 from app.tasks.crawler_tasks import crawl_facebook_async
-from celery.result import AsyncResult
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/crawler", tags=["Crawler"])
 
+# 同步爬取使用的執行緒池：Playwright 同步 API 和資料庫寫入不在事件迴圈上執行，
+# 容量已滿時直接返回 429，而不是讓請求無限制地排隊
+crawl_executor = BoundedExecutor(
+    "crawl",
+    max_workers=settings.CRAWLER_SYNC_WORKERS,
+    max_pending=settings.CRAWLER_SYNC_MAX_PENDING
+)
+
+
+def _crawl_and_store(page_url: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    爬取貼文並寫入資料庫與 Redis 快取（在 crawl_executor 的執行緒中執行）
+    
+    資料庫會話在執行緒內自行開啟和關閉：客戶端斷線時請求範圍的會話會被關閉，
+    但已開始的爬取仍會在執行緒中執行完畢
+    
+    Args:
+        page_url: Facebook 頁面 URL
+        limit: 最多爬取的貼文數量
+        
+    Returns:
+        爬取到的貼文列表
+        
+    Raises:
+        FacebookCrawlerError: 爬蟲執行失敗
+    """
+    posts = crawl_facebook_posts(page_url, limit)
+    if not posts:
+        return posts
+    
+    db = SessionLocal()
+    try:
+        # 儲存到資料庫
+        try:
+            db_count = save_posts_to_db(db, posts)
+            logger.info(f"已儲存 {db_count} 條新貼文到資料庫")
+        except Exception as e:
+            logger.error(f"儲存到資料庫失敗: {e}")
+            # 繼續執行，嘗試儲存到 Redis
+        
+        # 儲存到 Redis
+        try:
+            redis_count = save_posts_to_redis(redis_cache_client, posts)
+            logger.info(f"已儲存 {redis_count} 條貼文到 Redis")
+        except Exception as e:
+            logger.error(f"儲存到 Redis 失敗: {e}")
+            # Redis 失敗不影响整體流程
+        
+        # 預熱列表前幾頁並通知各 worker 清空進程內列表快取（失敗只記錄日誌）
+        categories = [post.get("category") for post in posts]
+        warm_post_listing(redis_cache_client, db, categories)
+        publish_listing_invalidation(redis_client, categories)
+    finally:
+        db.close()
+    return posts
+
 
 @router.post("/crawl", response_model=CrawlResponse, summary="爬取 Facebook 貼文")
 async def crawl_posts(
     req: CrawlRequest,
-    db: Session = Depends(get_db),
     current_user: User = Depends(require_admin1_user)
 ):
     """
@@ -34,22 +104,21 @@ async def crawl_posts(
     - **page_url**: Facebook 頁面 URL（必須是有效的 Facebook URL）
     - **limit**: 最多爬取的貼文數量（1-100，預設30）
     
-    爬取的數据会同時儲存到 PostgreSQL 和 Redis 快取中
+    爬取的數据会同時儲存到 PostgreSQL 和 Redis 快取中。
+    爬取在獨立的執行緒池中執行，不阻塞其他請求；同時進行的爬取已達上限時返回 429
     """
     logger.info(f"使用者 {current_user.username} 請求爬取: {req.page_url}")
     
-    # 爬取貼文
+    # 爬取並儲存貼文
     try:
-        posts = crawl_facebook_posts(str(req.page_url), req.limit)
-        
-        if not posts:
-            logger.warning(f"未爬取到任何貼文: {req.page_url}")
-            return CrawlResponse(
-                message="爬取完成，但未找到任何貼文",
-                posts_count=0,
-                success=True
-            )
-        
+        posts = await crawl_executor.run(_crawl_and_store, str(req.page_url), req.limit)
+    except ExecutorBusyError as e:
+        logger.warning(f"同步爬取請求過多: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="爬蟲忙碌中，請稍後重試或使用 /crawler/crawl/async",
+            headers={"Retry-After": str(settings.CRAWLER_SYNC_RETRY_AFTER)}
+        )
     except FacebookCrawlerError as e:
         logger.error(f"爬蟲執行失敗: {e}")
         raise HTTPException(
@@ -63,21 +132,13 @@ async def crawl_posts(
             detail="爬取失敗，請稍後重試"
         )
     
-    # 儲存到資料庫
-    try:
-        db_count = save_posts_to_db(db, posts)
-        logger.info(f"已儲存 {db_count} 條新貼文到資料庫")
-    except Exception as e:
-        logger.error(f"儲存到資料庫失敗: {e}")
-        # 繼續執行，嘗試儲存到 Redis
-    
-    # 儲存到 Redis
-    try:
-        redis_count = save_posts_to_redis(redis_client, posts)
-        logger.info(f"已儲存 {redis_count} 條貼文到 Redis")
-    except Exception as e:
-        logger.error(f"儲存到 Redis 失敗: {e}")
-        # Redis 失敗不影响整體流程
+    if not posts:
+        logger.warning(f"未爬取到任何貼文: {req.page_url}")
+        return CrawlResponse(
+            message="爬取完成，但未找到任何貼文",
+            posts_count=0,
+            success=True
+        )
     
     return CrawlResponse(
         message=f"已成功爬取 {len(posts)} 則貼文并儲存",
@@ -126,7 +187,8 @@ async def crawl_posts_async(
 @router.get("/task/{task_id}", summary="查詢異步任務狀態")
 async def get_task_status(
     task_id: str,
-    current_user: User = Depends(require_admin1_user)
+    current_user: User = Depends(require_admin1_user),
+    redis: AsyncRedis = Depends(get_async_result_redis)
 ):
     """
     查詢異步爬蟲任務的執行狀態
@@ -134,23 +196,8 @@ async def get_task_status(
     **權限要求：** 僅限 admin1 使用者
     """
     try:
-        task = AsyncResult(task_id)
-        
-        response = {
-            "task_id": task_id,
-            "status": task.state,
-        }
-        
-        if task.state == 'PENDING':
-            response["message"] = "任務等待中"
-        elif task.state == 'PROGRESS':
-            response["message"] = task.info.get('status', '執行中')
-        elif task.state == 'SUCCESS':
-            response["result"] = task.result
-        elif task.state == 'FAILURE':
-            response["error"] = str(task.info)
-        
-        return response
+        statuses = await get_task_statuses(redis, [task_id])
+        return statuses[0]
     except Exception as e:
         logger.error(f"查詢任務狀態失敗: {e}")
         raise HTTPException(
@@ -159,11 +206,72 @@ async def get_task_status(
         )
 
 
+@router.post("/tasks/status", summary="批次查詢異步任務狀態")
+async def get_task_statuses_batch(
+    req: TaskStatusBatchRequest,
+    current_user: User = Depends(require_admin1_user),
+    redis: AsyncRedis = Depends(get_async_result_redis)
+):
+    """
+    一次查詢多個異步爬蟲任務的執行狀態
+    
+    **權限要求：** 僅限 admin1 使用者
+    
+    - **task_ids**: 任務 ID 列表（每次最多 TASK_STATUS_BATCH_MAX 個）
+    
+    所有任務以一次讀取從結果後端取得，已結束的任務狀態會快取在伺服器，不再重複讀取
+    """
+    try:
+        return {"tasks": await get_task_statuses(redis, req.task_ids)}
+    except Exception as e:
+        logger.error(f"批次查詢任務狀態失敗: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="查詢失敗"
+        )
+
+
+@router.get("/task/{task_id}/events", summary="訂閱異步任務進度（SSE）")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    current_user: User = Depends(require_admin1_user),
+    redis: AsyncRedis = Depends(get_async_redis)
+):
+    """
+    以 Server-Sent Events 推送異步爬蟲任務的進度，取代輪詢 /crawler/task/{task_id}
+    
+    **權限要求：** 僅限 admin1 使用者
+    
+    事件類型：
+    - **progress**: 階段變化（crawling / loading / scrolling / parsed / saving_db / saving_cache）與已找到的貼文數
+    - **result**: 任務完成的結果，推送後關閉連接
+    - **error**: 任務失敗的原因，推送後關閉連接
+    
+    任務結束後事件保留一段時間，期間連接仍可收到完整紀錄；
+    斷線重連時帶上 Last-Event-ID 標頭從中斷處繼續
+    """
+    if not reserve_event_stream():
+        logger.warning(f"任務進度 SSE 連接已達上限: {settings.TASK_EVENTS_MAX_STREAMS}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="進度訂閱過多，請稍後重試或使用 /crawler/task/{task_id} 查詢",
+            headers={"Retry-After": "5"}
+        )
+    
+    # 名額在接受請求時預留，由回應結束時釋放
+    return TaskEventStreamResponse(
+        task_event_stream(redis, task_id, request.headers.get("Last-Event-ID")),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/status", summary="獲取爬蟲狀態")
 @limiter.limit("30/minute")
 async def get_crawler_status(
     request: Request,
-    current_user: User = Depends(require_admin1_user)
+    current_user: User = Depends(require_admin1_user),
+    redis: AsyncRedis = Depends(get_async_cache_redis)
 ):
     """
     獲取爬蟲系統的狀態資訊
@@ -172,7 +280,7 @@ async def get_crawler_status(
     """
     try:
         # 獲取 Redis 中快取的貼文數量
-        cached_count = redis_client.zcard("posts:index")
+        cached_count = await redis.zcard(POSTS_INDEX_KEY)
         
         return {
             "status": "運行中",
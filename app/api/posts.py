@@ -2,51 +2,172 @@
 貼文 API 路由
 處理貼文查詢相關請求
 """
-from fastapi import APIRouter, Query, Depends, HTTPException, status
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.core.redis import redis_client
-from app.core.db import get_db
+from redis.asyncio import Redis as AsyncRedis
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from app.core.config import settings
+from app.core.redis import get_async_cache_redis
+from app.core.serialization import FastJSONResponse
+from app.core.db import get_read_db, get_read_session_factory, retry_on_primary
+from app.models.user import User
+from app.dependencies import require_admin1_user
 from app.schemas.crawl import PostSchema
-from app.services.post_service import get_posts_from_redis, get_posts_from_db
+from app.services.post_cache import (
+    get_listing_version,
+    get_materialized_page,
+    get_posts_read_through,
+    listing_cache,
+    render_listing_page
+)
+from app.services.post_service import (
+    get_posts_range_from_redis_async,
+    get_post_dicts_from_db,
+    parse_fields,
+    project_post,
+    search_posts,
+    to_timestamp
+)
+from app.services.export_service import stream_posts_export
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
 
+def _cache_headers(version: Optional[Tuple[int, float]]) -> Dict[str, str]:
+    """列表回應的快取標頭：內容版本的弱 ETag、Last-Modified 以及設定的 Cache-Control"""
+    headers = {}
+    if settings.LISTING_CACHE_CONTROL:
+        headers["Cache-Control"] = settings.LISTING_CACHE_CONTROL
+    if version:
+        number, modified = version
+        headers["ETag"] = f'W/"{number}-{int(modified)}"'
+        headers["Last-Modified"] = formatdate(modified, usegmt=True)
+    return headers
+
+
+def _not_modified(request: Request, version: Optional[Tuple[int, float]]) -> bool:
+    """
+    判斷條件請求是否可以返回 304
+    
+    優先比較 If-None-Match（弱比較），沒有時才比較 If-Modified-Since
+    """
+    if not version:
+        return False
+    etag = _cache_headers(version)["ETag"]
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag[2:] for tag in tags)
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(version[1]) <= since
+
+
 @router.get("/", response_model=dict, summary="獲取貼文清單（從快取）")
 async def get_posts(
+    request: Request,
     category: Optional[str] = Query(None, description="貼文類別：text/image/video/reels"),
     limit: int = Query(10, ge=1, le=100, description="返回數量限制"),
-    offset: int = Query(0, ge=0, description="偏移量（用於分頁）")
+    offset: int = Query(0, ge=0, description="偏移量（用於分頁）"),
+    since: Optional[datetime] = Query(None, description="只返回此時間（含）之後爬取的貼文"),
+    until: Optional[datetime] = Query(None, description="只返回此時間之前爬取的貼文"),
+    cursor: Optional[str] = Query(None, description="時間範圍分頁游標（上一頁的 next_cursor）"),
+    fields: Optional[str] = Query(None, description="只返回指定欄位（逗號分隔），例如 uid,post_url,category"),
+    session_factory: Callable[[], Session] = Depends(get_read_session_factory),
+    redis: AsyncRedis = Depends(get_async_cache_redis)
 ):
     """
-    從 Redis 快取獲取貼文清單
+    從 Redis 快取獲取貼文清單（按爬取時間倒序）
     
     - **category**: 可選，按類別篩選（text/image/video/reels）
     - **limit**: 返回數量限制（1-100，預設10）
     - **offset**: 偏移量，用於分頁（預設0）
+    - **since** / **until**: 可選，按爬取時間範圍篩選
+    - **cursor**: 可選，傳入上一頁的 next_cursor 取得下一頁（新貼文寫入時分頁依然穩定）
+    - **fields**: 可選，只返回指定欄位（uid/post_url/video_url/image_url/comments/reactions/category/crawled_at）
     
-    返回快取中的貼文數据，速度较快但可能不包含最新數据
+    offset 分頁為讀穿快取：快取未命中時從資料庫讀取並回填，回應中的 source
+    表示資料來源（cache / db）。各列表的前幾頁在爬取完成時已預先渲染，
+    直接返回 Redis 中的位元組；其他頁面將快取中貼文的 JSON 直接拼接成回應，同樣不需逐則解碼貼文。序列化後的回應另外保存在進程內列表快取，
+    直到過期或收到爬取完成的失效通知。提供 since / until / cursor 任一參數時改用快取的
+    時間範圍查詢並忽略 offset，回應中包含 next_cursor
+    
+    回應帶有列表內容版本（每次爬取寫入後遞增）的弱 ETag 與 Last-Modified，
+    If-None-Match / If-Modified-Since 與目前版本相符時直接返回 304，不讀取貼文內容或查詢資料庫
+    
+    指定 fields 時不使用預先渲染的頁面，貼文讀出後投影為指定欄位，投影後的回應同樣保存在進程內列表快取
+    
+    只有快取未命中需要回填或直接查詢時才開啟資料庫會話，命中快取和 304 回應不會佔用資料庫連接
     """
-    logger.info(f"查詢貼文: category={category}, limit={limit}, offset={offset}")
+    logger.info(
+        f"查詢貼文: category={category}, limit={limit}, offset={offset}, "
+        f"since={since}, until={until}, cursor={cursor}, fields={fields}"
+    )
     
     try:
-        posts = get_posts_from_redis(
-            redis_client,
+        projection = parse_fields(fields)
+        version = await get_listing_version(redis, category)
+        headers = _cache_headers(version)
+        if _not_modified(request, version):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        if since is None and until is None and cursor is None:
+            cache_key = (category, limit, offset, projection)
+            body = listing_cache.get(cache_key)
+            if body is None and projection is None:
+                body = await get_materialized_page(redis, category, limit, offset)
+            if body is None:
+                posts, source = await get_posts_read_through(
+                    redis,
+                    session_factory,
+                    category=category,
+                    limit=limit,
+                    offset=offset,
+                    raw=projection is None
+                )
+                if projection is not None:
+                    posts = [project_post(post, projection) for post in posts]
+                body = render_listing_page(posts, category, limit, offset, source)
+            
+            listing_cache.set(cache_key, body)
+            return Response(content=body, media_type="application/json", headers=headers)
+        
+        posts, next_cursor = await get_posts_range_from_redis_async(
+            redis,
             category=category,
             limit=limit,
-            offset=offset
+            since=to_timestamp(since) if since else None,
+            until=to_timestamp(until) if until else None,
+            cursor=cursor
         )
+        if projection is not None:
+            posts = [project_post(post, projection) for post in posts]
         
-        return {
+        return FastJSONResponse({
             "data": posts,
             "count": len(posts),
             "category": category,
             "limit": limit,
-            "offset": offset
-        }
+            "since": since,
+            "until": until,
+            "next_cursor": next_cursor
+        }, headers=headers)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"獲取貼文失敗: {e}")
         raise HTTPException(
@@ -60,48 +181,53 @@ async def get_posts_from_database(
     category: Optional[str] = Query(None, description="貼文類別：text/image/video/reels"),
     limit: int = Query(10, ge=1, le=100, description="返回數量限制"),
     offset: int = Query(0, ge=0, description="偏移量（用於分頁）"),
-    db: Session = Depends(get_db)
+    since: Optional[datetime] = Query(None, description="只返回此時間（含）之後爬取的貼文"),
+    until: Optional[datetime] = Query(None, description="只返回此時間之前爬取的貼文"),
+    fields: Optional[str] = Query(None, description="只返回指定欄位（逗號分隔），例如 uid,post_url,category"),
+    db: Session = Depends(get_read_db)
 ):
     """
-    從 PostgreSQL 資料庫獲取貼文清單
+    從 PostgreSQL 資料庫獲取貼文清單（按爬取時間倒序）
     
     - **category**: 可選，按類別篩選（text/image/video/reels）
     - **limit**: 返回數量限制（1-100，預設10）
     - **offset**: 偏移量，用於分頁（預設0）
+    - **since** / **until**: 可選，按爬取時間範圍篩選（只掃描相關分區）
+    - **fields**: 可選，只返回指定欄位（只查詢這些欄位）
     
-    返回資料庫中的完整數据，包含所有历史貼文
+    返回資料庫中的完整數据，包含所有历史貼文（配置讀取副本時從副本讀取）
     """
-    logger.info(f"從資料庫查詢貼文: category={category}, limit={limit}, offset={offset}")
+    logger.info(
+        f"從資料庫查詢貼文: category={category}, limit={limit}, offset={offset}, fields={fields}"
+    )
+    
+    try:
+        projection = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     
     try:
-        posts = get_posts_from_db(
+        # 直接以 orjson 序列化（不經過 jsonable_encoder）
+        posts_data = get_post_dicts_from_db(
             db,
+            projection,
             category=category,
             limit=limit,
-            offset=offset
+            offset=offset,
+            since=since,
+            until=until
         )
         
-        # 转换為字典清單
-        posts_data = [
-            {
-                "uid": post.uid,
-                "post_url": post.post_url,
-                "video_url": post.video_url,
-                "image_url": post.image_url,
-                "comments": post.comments,
-                "reactions": post.reactions,
-                "category": post.category
-            }
-            for post in posts
-        ]
-        
-        return {
+        return FastJSONResponse({
             "data": posts_data,
             "count": len(posts_data),
             "category": category,
             "limit": limit,
             "offset": offset
-        }
+        })
     except Exception as e:
         logger.error(f"從資料庫獲取貼文失敗: {e}")
         raise HTTPException(
@@ -110,26 +236,154 @@ async def get_posts_from_database(
         )
 
 
+@router.get("/search", response_model=dict, summary="搜尋貼文（網址與文字）")
+async def search_posts_endpoint(
+    q: str = Query(..., min_length=3, max_length=200, description="搜尋字串（至少3個字元）"),
+    category: Optional[str] = Query(None, description="貼文類別：text/image/video/reels"),
+    since: Optional[datetime] = Query(None, description="只搜尋此時間（含）之後爬取的貼文"),
+    until: Optional[datetime] = Query(None, description="只搜尋此時間之前爬取的貼文"),
+    limit: int = Query(20, ge=1, le=100, description="返回數量限制"),
+    cursor: Optional[str] = Query(None, description="上一頁返回的 next_cursor"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    按貼文網址和貼文文字搜尋（PostgreSQL trigram 索引）
+    
+    - **q**: 搜尋字串，比對 post_url 與貼文文字
+    - **category**: 可選，按類別篩選
+    - **since** / **until**: 可選，按爬取時間範圍篩選
+    - **limit**: 返回數量限制（1-100，預設20）
+    - **cursor**: 鍵集分頁游標，傳入上一頁的 next_cursor 取得下一頁
+    
+    結果按相似度排序，next_cursor 為 null 表示沒有更多結果
+    """
+    logger.info(f"搜尋貼文: q={q}, category={category}, limit={limit}")
+    
+    try:
+        posts, next_cursor = search_posts(
+            db,
+            q,
+            category=category,
+            since=since,
+            until=until,
+            limit=limit,
+            cursor=cursor
+        )
+        
+        return {
+            "data": posts,
+            "count": len(posts),
+            "query": q,
+            "category": category,
+            "limit": limit,
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"搜尋貼文失敗: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="搜尋貼文失敗"
+        )
+
+
+@router.get("/export", summary="匯出貼文（串流 NDJSON/CSV）")
+async def export_posts(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="匯出格式：ndjson/csv"),
+    compress: bool = Query(False, description="是否以 gzip 壓縮輸出"),
+    category: Optional[str] = Query(None, description="貼文類別：text/image/video/reels"),
+    since: Optional[datetime] = Query(None, description="只匯出此時間（含）之後爬取的貼文"),
+    until: Optional[datetime] = Query(None, description="只匯出此時間之前爬取的貼文"),
+    after_crawled_at: Optional[datetime] = Query(None, description="續傳游標：上次最後一筆的 crawled_at"),
+    after_uid: Optional[str] = Query(None, description="續傳游標：上次最後一筆的 uid"),
+    session_factory: Callable[[], Session] = Depends(get_read_session_factory),
+    current_user: User = Depends(require_admin1_user)
+):
+    """
+    以串流方式匯出篩選後的貼文
+    
+    **權限要求：** 僅限 admin1 使用者
+    
+    - **format**: ndjson（每行一個 JSON 物件）或 csv
+    - **compress**: 即時 gzip 壓縮，下載檔名加上 .gz
+    - **category** / **since** / **until**: 篩選條件
+    - **after_crawled_at** + **after_uid**: 中斷後續傳，傳入已收到的最後一筆貼文的值
+    
+    貼文按 (crawled_at, uid) 升序輸出，伺服器端游標讀取，記憶體佔用固定
+    """
+    if (after_crawled_at is None) != (after_uid is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="after_crawled_at 與 after_uid 必須同時提供"
+        )
+    after = (after_crawled_at, after_uid) if after_uid is not None else None
+    
+    logger.info(
+        f"使用者 {current_user.username} 匯出貼文: format={format}, "
+        f"compress={compress}, category={category}, after={after}"
+    )
+    
+    filename = f"posts-export.{format}"
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        stream_posts_export(
+            session_factory,
+            fmt=format,
+            compress=compress,
+            category=category,
+            since=since,
+            until=until,
+            after=after
+        ),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @router.get("/categories", summary="獲取所有貼文類別")
-async def get_categories(db: Session = Depends(get_db)):
+async def get_categories(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    redis: AsyncRedis = Depends(get_async_cache_redis)
+):
     """
     獲取資料庫中所有貼文的類別清單及其數量
+    
+    使用全域列表的內容版本作為 ETag，版本未變時返回 304 而不查詢資料庫
     """
     try:
         from sqlalchemy import func
         from app.models.post import Post
         
-        # 查詢每個類別的數量
-        categories = db.query(
-            Post.category,
-            func.count(Post.uid).label('count')
-        ).group_by(Post.category).all()
+        version = await get_listing_version(redis)
+        headers = _cache_headers(version)
+        if _not_modified(request, version):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        # 查詢每個類別的數量（副本連接失敗時改從主庫讀取）
+        categories = retry_on_primary(
+            db,
+            lambda session: session.query(
+                Post.category,
+                func.count(Post.uid).label('count')
+            ).group_by(Post.category).all()
+        )
         
         result = {
             cat.category: cat.count
             for cat in categories
         }
         
+        response.headers.update(headers)
         return {
             "categories": result,
             "total": sum(result.values())
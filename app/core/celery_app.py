@@ -10,8 +10,9 @@ logger = get_logger(__name__)
 # 創建 Celery 應用
 celery_app = Celery(
     "facebook_crawler",
-    broker=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/2",
-    backend=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/3"
+    broker=settings.celery_broker_url,
+    backend=settings.celery_result_backend,
+    include=["app.tasks.crawler_tasks"]  # worker / beat 啟動時註冊任務和定期任務配置
 )
 
 # Celery 配置
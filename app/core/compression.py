@@ -0,0 +1,170 @@
+"""
+回應壓縮
+依 Accept-Encoding 協商 br / gzip，只壓縮達到大小門檻的回應，
+並按端點記錄壓縮前與實際傳送的位元組數
+"""
+import zlib
+from typing import List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.monitoring import http_response_bytes_total, http_response_uncompressed_bytes_total
+
+try:
+    import brotli
+except ImportError:  # 可選依賴，未安裝時只使用 gzip
+    brotli = None
+
+# 本身已壓縮或需要逐則即時送出的內容類型不壓縮
+SKIP_CONTENT_TYPES = ("text/event-stream", "application/gzip", "image/", "video/")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    依 Accept-Encoding（含 q 值）選擇壓縮編碼
+    
+    Args:
+        accept_encoding: 請求的 Accept-Encoding 標頭
+    
+    Returns:
+        br 或 gzip（權重相同時優先 br），都不接受時返回 None
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[token] = weight
+    
+    best, best_weight = None, 0.0
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class _Compressor:
+    """增量壓縮器：非最後一段時同步刷新，已壓縮的資料可以立即送出"""
+    
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    回應壓縮中間件（ASGI）
+    
+    先緩衝本文直到達到 minimum_size：整個回應小於門檻時原樣送出；
+    一次送出的完整回應整體壓縮（壓縮後沒有變小則原樣送出），
+    串流回應（如匯出）達到門檻後逐段壓縮並立即送出。
+    SSE 與已壓縮的內容不處理；minimum_size 為 0 時停用壓縮，只記錄位元組數
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        endpoint = scope["path"]
+        encoding = None
+        if self.minimum_size > 0:
+            encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start: Optional[Message] = None
+        buffer: List[bytes] = []
+        buffered = 0
+        compressor: Optional[_Compressor] = None
+        wire_encoding = "identity"
+        
+        async def send_body(body: bytes, more_body: bool) -> None:
+            http_response_bytes_total.labels(endpoint=endpoint, encoding=wire_encoding).inc(len(body))
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, buffered, compressor, wire_encoding
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                wire_encoding = headers.get("content-encoding", "identity")
+                if self._can_compress(encoding, message["status"], headers):
+                    # 等到本文達到門檻才能決定是否壓縮
+                    start = message
+                else:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            http_response_uncompressed_bytes_total.labels(endpoint=endpoint).inc(len(body))
+            
+            if compressor is not None:
+                await send_body(compressor.compress(body, final=not more_body), more_body)
+                return
+            if start is None:
+                await send_body(body, more_body)
+                return
+            
+            buffer.append(body)
+            buffered += len(body)
+            if more_body and buffered < self.minimum_size:
+                return
+            
+            headers = MutableHeaders(raw=start["headers"])
+            body = b"".join(buffer)
+            buffer.clear()
+            if buffered >= self.minimum_size:
+                candidate = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                compressed = candidate.compress(body, final=not more_body)
+                # 完整回應壓縮後沒有變小就原樣送出
+                if more_body or len(compressed) < len(body):
+                    compressor = candidate
+                    body = compressed
+                    wire_encoding = encoding
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+            await send(start)
+            start = None
+            await send_body(body, more_body)
+        
+        await self.app(scope, receive, send_wrapper)
+    
+    def _can_compress(self, encoding: Optional[str], status_code: int, headers: MutableHeaders) -> bool:
+        if encoding is None or status_code < 200 or status_code in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        return not headers.get("content-type", "").startswith(SKIP_CONTENT_TYPES)
@@ -3,20 +3,182 @@
 """
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
-from typing import Generator
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+from typing import Callable, Dict, Generator, List, TypeVar
+import itertools
+import threading
+import time
 from app.core.config import settings
 from app.core.logger import get_logger
+from app.core.monitoring import db_pool_connections, db_replica_healthy
+from app.core.partitions import ensure_post_partitions
 
 logger = get_logger(__name__)
 
-# 創建資料庫引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # 自動檢測斷開的連接
-    pool_size=10,  # 連接池大小
-    max_overflow=20,  # 最大溢出連接數
-    echo=settings.DEBUG  # 調試模式下顯示 SQL
+T = TypeVar("T")
+
+
+def _record_pool_metrics(target: str, engine: Engine) -> None:
+    """將連接池狀態寫入 Prometheus 指標"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    db_pool_connections.labels(target=target, state="size").set(pool.size())
+    db_pool_connections.labels(target=target, state="checked_out").set(pool.checkedout())
+    db_pool_connections.labels(target=target, state="checked_in").set(pool.checkedin())
+    db_pool_connections.labels(target=target, state="overflow").set(max(pool.overflow(), 0))
+
+
+def create_db_engine(url: str, target: str) -> Engine:
+    """
+    創建資料庫引擎並掛載連接池指標
+
+    Args:
+        url: 資料庫連接 URL
+        target: 指標中使用的目標名稱（避免暴露連接字串）
+
+    Returns:
+        資料庫引擎
+    """
+    connect_args = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        # 無法連線的資料庫（例如封包被丟棄的副本）不會讓連接無限期等待
+        connect_args["connect_timeout"] = settings.DATABASE_CONNECT_TIMEOUT
+    db_engine = create_engine(
+        url,
+        pool_pre_ping=True,  # 自動檢測斷開的連接
+        pool_size=10,  # 連接池大小
+        max_overflow=20,  # 最大溢出連接數
+        echo=settings.DEBUG,  # 調試模式下顯示 SQL
+        connect_args=connect_args
+    )
+
+    def _on_pool_event(*args):
+        _record_pool_metrics(target, db_engine)
+
+    for event_name in ("connect", "checkout", "checkin"):
+        event.listen(db_engine, event_name, _on_pool_event)
+
+    return db_engine
+
+
+# 創建資料庫引擎（主庫，處理所有寫入）
+engine = create_db_engine(settings.DATABASE_URL, "primary")
+
+
+class ReplicaRouter:
+    """
+    讀取副本路由器
+
+    以輪詢方式分派唯讀會話到副本，定期做健康檢查，
+    所有副本不可用時回退到主庫
+
+    每個副本同時只有一個健康檢查在執行：第一次檢查由取得檢查權的請求同步執行，
+    同時到達的其他請求暫時跳過該副本；之後的定期檢查在背景執行緒中進行，
+    期間沿用上一次的結果，請求執行緒不會等待無回應的副本
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: List[Engine],
+        health_check_interval: int = 30
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.health_check_interval = health_check_interval
+        self._cycle = itertools.cycle(range(len(replicas)))
+        self._lock = threading.Lock()
+        # 副本索引 -> (是否健康, 上次檢查時間)
+        self._health: Dict[int, tuple] = {}
+        # 正在執行健康檢查的副本索引
+        self._probing: set = set()
+
+    @staticmethod
+    def target_name(index: int) -> str:
+        """副本在指標中的目標名稱"""
+        return f"replica-{index}"
+
+    def _check(self, index: int) -> bool:
+        """對副本執行 SELECT 1 健康檢查"""
+        try:
+            with self.replicas[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+            healthy = True
+        except Exception as e:
+            logger.warning(f"讀取副本 {self.target_name(index)} 健康檢查失敗: {e}")
+            healthy = False
+        self._set_health(index, healthy)
+        return healthy
+
+    def _set_health(self, index: int, healthy: bool) -> None:
+        with self._lock:
+            self._health[index] = (healthy, time.monotonic())
+        db_replica_healthy.labels(target=self.target_name(index)).set(1 if healthy else 0)
+
+    def _probe(self, index: int) -> bool:
+        try:
+            return self._check(index)
+        finally:
+            with self._lock:
+                self._probing.discard(index)
+
+    def _is_healthy(self, index: int) -> bool:
+        with self._lock:
+            state = self._health.get(index)
+            stale = state is None or time.monotonic() - state[1] >= self.health_check_interval
+            probe = stale and index not in self._probing
+            if probe:
+                self._probing.add(index)
+        if state is None:
+            return self._probe(index) if probe else False
+        if probe:
+            threading.Thread(
+                target=self._probe,
+                args=(index,),
+                name=f"{self.target_name(index)}-health",
+                daemon=True
+            ).start()
+        return state[0]
+
+    def is_replica(self, db_engine: Engine) -> bool:
+        """引擎是否為讀取副本"""
+        return any(replica is db_engine for replica in self.replicas)
+
+    def get_engine(self) -> Engine:
+        """
+        選擇處理唯讀查詢的引擎
+
+        Returns:
+            健康的副本引擎，若無可用副本則返回主庫引擎
+        """
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                index = next(self._cycle)
+            if self._is_healthy(index):
+                return self.replicas[index]
+        return self.primary
+
+    def mark_unhealthy(self, db_engine: Engine) -> None:
+        """將出現連接錯誤的副本標記為不健康，直到下一次健康檢查"""
+        for index, replica in enumerate(self.replicas):
+            if replica is db_engine:
+                logger.warning(f"讀取副本 {self.target_name(index)} 已標記為不健康")
+                self._set_health(index, False)
+                return
+
+
+# 創建讀取副本路由器（未配置副本時所有讀取都落在主庫）
+replica_router = ReplicaRouter(
+    engine,
+    [
+        create_db_engine(url, ReplicaRouter.target_name(i))
+        for i, url in enumerate(settings.DATABASE_REPLICA_URLS)
+    ],
+    health_check_interval=settings.DATABASE_REPLICA_HEALTH_CHECK_INTERVAL
 )
 
 # 創建會話工廠
@@ -33,7 +195,7 @@ Base = declarative_base()
 def get_db() -> Generator[Session, None, None]:
     """
     獲取資料庫會話的依賴注入函數
-    
+
     Yields:
         Session: 資料庫會話物件
     """
@@ -48,11 +210,95 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def get_session_factory() -> Callable[[], Session]:
+    """
+    獲取主庫會話工廠的依賴注入函數
+
+    用於只在部分情況下需要查詢的依賴（例如認證快取未命中時），
+    由呼叫方在查詢前創建會話並在查詢後立即關閉，不會在整個請求（包括串流回應）期間佔用連接
+
+    Returns:
+        創建主庫會話的可呼叫物件
+    """
+    return SessionLocal
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """
+    獲取唯讀資料庫會話的依賴注入函數
+
+    會話綁定到讀取副本（輪詢），僅用於不寫入的查詢端點
+
+    Yields:
+        Session: 綁定到副本或主庫的資料庫會話物件
+    """
+    read_engine = replica_router.get_engine()
+    db = SessionLocal(bind=read_engine)
+    try:
+        yield db
+    except Exception as e:
+        logger.error(f"唯讀資料庫會話錯誤: {e}")
+        if isinstance(e, OperationalError):
+            replica_router.mark_unhealthy(read_engine)
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def retry_on_primary(db: Session, query: Callable[[Session], T]) -> T:
+    """
+    在唯讀會話上執行查詢，副本連接失敗時改在主庫重試一次
+
+    副本出現 OperationalError 時標記為不健康（之後的讀取不再分派到該副本），
+    回滾原會話後以新的主庫會話重新執行；會話不是綁定到副本時直接抛出
+
+    Args:
+        db: 唯讀資料庫會話
+        query: 接收會話並執行查詢的函數
+
+    Returns:
+        查詢結果
+    """
+    try:
+        return query(db)
+    except OperationalError as e:
+        read_engine = db.get_bind()
+        if not replica_router.is_replica(read_engine):
+            raise
+        logger.warning(f"讀取副本查詢失敗，改從主庫讀取: {e}")
+        replica_router.mark_unhealthy(read_engine)
+        db.rollback()
+    primary_db = SessionLocal()
+    try:
+        return query(primary_db)
+    finally:
+        primary_db.close()
+
+
+def get_read_session_factory() -> Callable[[], Session]:
+    """
+    獲取唯讀會話工廠的依賴注入函數
+
+    用於串流回應：會話由回應產生器自行創建和關閉，
+    不依賴請求結束時的依賴清理時機
+
+    Returns:
+        創建綁定到讀取副本會話的可呼叫物件
+    """
+    return lambda: SessionLocal(bind=replica_router.get_engine())
+
+
 def init_db():
     """初始化資料庫表"""
     try:
+        if engine.dialect.name == "postgresql":
+            # 貼文搜尋的 trigram 索引依賴 pg_trgm 擴充
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         Base.metadata.create_all(bind=engine)
+        ensure_post_partitions(engine)
         logger.info("資料庫表初始化成功")
     except Exception as e:
         logger.error(f"資料庫表初始化失敗: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,122 @@
+"""
+有界執行緒池
+將阻塞或 CPU 密集的工作移出事件迴圈執行，限制同時執行和排隊的數量並記錄排隊時間
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import threading
+import time
+from app.core.logger import get_logger
+from app.core.monitoring import (
+    executor_tasks_total,
+    executor_queue_seconds,
+    executor_run_seconds,
+    executor_pending
+)
+
+logger = get_logger(__name__)
+
+
+class ExecutorBusyError(Exception):
+    """執行中和排隊中的工作已達上限"""
+    pass
+
+
+class BoundedExecutor:
+    """
+    有界執行緒池
+    
+    最多 max_workers 個工作同時執行，執行中加上排隊中的工作超過 max_pending 時
+    直接抛出 ExecutorBusyError，由呼叫方回應 503 / 429，而不是無限制地排隊。
+    執行緒在第一次使用時才創建
+    """
+    
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max(max_workers, 1)
+        self.max_pending = max(max_pending, self.max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+    
+    @property
+    def pending(self) -> int:
+        """執行中和排隊中的工作數"""
+        return self._pending
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name
+                )
+            return self._executor
+    
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                executor_tasks_total.labels(pool=self.name, status="rejected").inc()
+                raise ExecutorBusyError(f"{self.name} 執行緒池已滿（{self.max_pending} 個工作）")
+            self._pending += 1
+            executor_pending.labels(pool=self.name).set(self._pending)
+    
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            executor_pending.labels(pool=self.name).set(self._pending)
+    
+    def _finish(self, future: Future) -> None:
+        """工作結束（完成、失敗或在排隊時被取消）時才釋放名額"""
+        self._release()
+        if future.cancelled():
+            status = "cancelled"
+        elif future.exception() is not None:
+            status = "error"
+        else:
+            status = "success"
+        executor_tasks_total.labels(pool=self.name, status=status).inc()
+    
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        在執行緒池中執行函數並等待結果
+        
+        等待中的協程被取消（例如客戶端斷線）時無法中止已在執行的工作，
+        名額會保留到工作實際結束；尚在排隊的工作則會被取消並立即釋放名額
+        
+        Args:
+            fn: 要執行的函數
+            *args: 函數參數
+        
+        Returns:
+            函數的返回值
+        
+        Raises:
+            ExecutorBusyError: 執行中和排隊中的工作已達上限時抛出
+        """
+        self._acquire()
+        submitted = time.perf_counter()
+        
+        def _call() -> Any:
+            started = time.perf_counter()
+            executor_queue_seconds.labels(pool=self.name).observe(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                executor_run_seconds.labels(pool=self.name).observe(time.perf_counter() - started)
+        
+        try:
+            future = self._get_executor().submit(_call)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._finish)
+        return await asyncio.wrap_future(future)
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """關閉執行緒池（下次使用時重新創建）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
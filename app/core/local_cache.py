@@ -0,0 +1,177 @@
+"""
+進程內快取
+有界的 TTL/LRU 快取，以及透過 Redis pub/sub 接收失效通知的訂閱執行緒
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import threading
+import time
+import redis
+from app.core.logger import get_logger
+from app.core.monitoring import (
+    local_cache_requests_total,
+    local_cache_evictions_total,
+    local_cache_entries
+)
+
+logger = get_logger(__name__)
+
+
+class TTLCache:
+    """
+    執行緒安全的 TTL/LRU 快取
+    
+    超過 maxsize 時淘汰最久未使用的項目，讀取時遇到過期項目即刪除；
+    ttl 為 0 時停用（get 永遠未命中，set 不保存）
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        # 鍵 -> (過期時間, 值)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        讀取快取項目
+        
+        Args:
+            key: 快取鍵
+        
+        Returns:
+            快取的值，未命中或已過期時返回 None
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= self._timer():
+                del self._data[key]
+                entry = None
+                local_cache_evictions_total.labels(cache=self.name, reason="expired").inc()
+                local_cache_entries.labels(cache=self.name).set(len(self._data))
+            if entry is None:
+                local_cache_requests_total.labels(cache=self.name, result="miss").inc()
+                return None
+            self._data.move_to_end(key)
+        local_cache_requests_total.labels(cache=self.name, result="hit").inc()
+        return entry[1]
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        寫入快取項目，超過容量時淘汰最久未使用的項目
+        
+        Args:
+            key: 快取鍵
+            value: 快取的值
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (self._timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+            size = len(self._data)
+        if evicted:
+            local_cache_evictions_total.labels(cache=self.name, reason="capacity").inc(evicted)
+        local_cache_entries.labels(cache=self.name).set(size)
+    
+    def delete(self, key: Hashable) -> None:
+        """刪除單一項目（收到針對該鍵的失效通知時呼叫）"""
+        with self._lock:
+            removed = self._data.pop(key, None) is not None
+            size = len(self._data)
+        if removed:
+            local_cache_evictions_total.labels(cache=self.name, reason="invalidated").inc()
+            local_cache_entries.labels(cache=self.name).set(size)
+    
+    def clear(self) -> None:
+        """清空所有項目（收到失效通知時呼叫）"""
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+        if count:
+            local_cache_evictions_total.labels(cache=self.name, reason="invalidated").inc(count)
+        local_cache_entries.labels(cache=self.name).set(0)
+
+
+class InvalidationSubscriber:
+    """
+    在背景執行緒中訂閱 Redis 頻道，收到訊息時呼叫回呼函數
+    
+    連接中斷期間可能漏掉訊息，因此每次（重新）訂閱成功後也會呼叫一次回呼，
+    避免進程內快取在斷線期間保留過期資料
+    """
+    
+    def __init__(
+        self,
+        client: redis.Redis,
+        channel: str,
+        callback: Callable[[Any], None],
+        retry_interval: float = 1.0,
+        poll_timeout: float = 0.25
+    ):
+        self.client = client
+        self.channel = channel
+        self.callback = callback
+        self.retry_interval = retry_interval
+        # 停止時最多等待一個輪詢週期
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        """啟動訂閱執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"invalidation-{self.channel}",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止訂閱執行緒"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                self.callback(None)
+                logger.info(f"已訂閱快取失效頻道: {self.channel}")
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=self.poll_timeout)
+                    if message and message["type"] == "message":
+                        self.callback(message["data"])
+            except Exception as e:
+                logger.warning(f"快取失效頻道 {self.channel} 訂閱中斷: {e}")
+                self._stop.wait(self.retry_interval)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
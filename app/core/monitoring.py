@@ -28,6 +28,18 @@ http_requests_in_progress = Gauge(
     ['method', 'endpoint']
 )
 
+http_response_bytes_total = Counter(
+    'http_response_bytes_total',
+    'HTTP 回應實際傳送的本文位元組數（壓縮後）',
+    ['endpoint', 'encoding']
+)
+
+http_response_uncompressed_bytes_total = Counter(
+    'http_response_uncompressed_bytes_total',
+    'HTTP 回應壓縮前的本文位元組數',
+    ['endpoint']
+)
+
 crawler_tasks_total = Counter(
     'crawler_tasks_total',
     '爬蟲任務總數',
@@ -45,12 +57,120 @@ redis_operations_total = Counter(
     ['operation', 'status']
 )
 
+redis_pipeline_duration_seconds = Histogram(
+    'redis_pipeline_duration_seconds',
+    'Redis pipeline 批次耗時（秒）',
+    ['operation'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+post_cache_requests_total = Counter(
+    'post_cache_requests_total',
+    '貼文列表快取讀取總數',
+    ['result']  # materialized / hit / miss / wait / bypass
+)
+
+post_cache_fills_total = Counter(
+    'post_cache_fills_total',
+    '從資料庫回填貼文快取的次數',
+    ['trigger', 'status']  # trigger: read / warm
+)
+
+post_cache_fill_rows_total = Counter(
+    'post_cache_fill_rows_total',
+    '從資料庫回填到快取的貼文總數',
+    ['trigger']
+)
+
+local_cache_requests_total = Counter(
+    'local_cache_requests_total',
+    '進程內快取讀取總數',
+    ['cache', 'result']  # hit / miss
+)
+
+local_cache_evictions_total = Counter(
+    'local_cache_evictions_total',
+    '進程內快取淘汰的項目總數',
+    ['cache', 'reason']  # expired / capacity / invalidated
+)
+
+local_cache_entries = Gauge(
+    'local_cache_entries',
+    '進程內快取目前的項目數',
+    ['cache']
+)
+
+executor_tasks_total = Counter(
+    'executor_tasks_total',
+    '有界執行緒池的工作總數',
+    ['pool', 'status']  # success / error / rejected / cancelled
+)
+
+executor_queue_seconds = Histogram(
+    'executor_queue_seconds',
+    '工作在有界執行緒池中等待執行的時間（秒）',
+    ['pool'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+executor_run_seconds = Histogram(
+    'executor_run_seconds',
+    '工作在有界執行緒池中的執行時間（秒）',
+    ['pool'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+executor_pending = Gauge(
+    'executor_pending',
+    '有界執行緒池中執行中和排隊中的工作數',
+    ['pool']
+)
+
+task_event_streams = Gauge(
+    'task_event_streams',
+    '進行中的任務進度 SSE 連接數量'
+)
+
+task_events_published_total = Counter(
+    'task_events_published_total',
+    '寫入 Redis Stream 的任務進度事件總數',
+    ['event', 'status']
+)
+
 database_queries_total = Counter(
     'database_queries_total',
     '資料庫查詢總數',
     ['operation', 'status']
 )
 
+snapshot_rows_exported_total = Counter(
+    'snapshot_rows_exported_total',
+    'Parquet 快照匯出的貼文總數'
+)
+
+snapshot_file_size_bytes = Histogram(
+    'snapshot_file_size_bytes',
+    'Parquet 快照檔案大小（位元組）',
+    buckets=(64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2, 256 * 1024 ** 2)
+)
+
+snapshot_throughput_rows_per_second = Gauge(
+    'snapshot_throughput_rows_per_second',
+    '最近一次 Parquet 快照的匯出速度（行/秒）'
+)
+
+db_pool_connections = Gauge(
+    'db_pool_connections',
+    '資料庫連接池狀態（按目標區分）',
+    ['target', 'state']
+)
+
+db_replica_healthy = Gauge(
+    'db_replica_healthy',
+    '讀取副本健康狀態（1 為正常）',
+    ['target']
+)
+
 
 async def prometheus_middleware(request: Request, call_next):
     """Prometheus 監控中間件"""
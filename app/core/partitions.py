@@ -0,0 +1,203 @@
+"""
+貼文表分區管理
+posts 表在 PostgreSQL 上按 crawled_at 做月份範圍分區，
+保留策略通過刪除或分離整個分區實現，不需要大批量 DELETE。
+crawled_at 以 UTC 寫入，月份邊界也一律按 UTC 日期計算
+"""
+import re
+from datetime import date, datetime
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+PARENT_TABLE = "posts"
+PARTITION_NAME_PATTERN = re.compile(r"^posts_y(\d{4})m(\d{2})$")
+# 承接沒有對應月份分區的資料，維護任務漏跑時寫入不會失敗
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+
+def utc_today() -> date:
+    """返回當前的 UTC 日期（與 crawled_at 的時區一致）"""
+    return datetime.utcnow().date()
+
+
+def add_months(month_start: date, months: int) -> date:
+    """返回 month_start 加上指定月份數後的月初日期"""
+    index = month_start.year * 12 + (month_start.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_start: date) -> str:
+    """返回指定月份的分區表名稱，例如 posts_y2024m05"""
+    return f"{PARENT_TABLE}_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def is_partitioned(engine: Engine) -> bool:
+    """
+    檢查 posts 是否為 PostgreSQL 分區表
+
+    非 PostgreSQL 資料庫或舊的未分區表都返回 False
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE relname = :name"),
+            {"name": PARENT_TABLE}
+        ).scalar()
+    return relkind == "p"
+
+
+def list_post_partitions(engine: Engine) -> List[str]:
+    """列出 posts 表目前掛載的所有分區名稱"""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE parent.relname = :name"
+            ),
+            {"name": PARENT_TABLE}
+        ).scalars().all()
+    return sorted(rows)
+
+
+def _create_month_partition(conn, name: str, start: date, end: date) -> None:
+    """創建月份分區，並將預設分區中屬於該月份的資料搬入"""
+    bounds = {"start": start, "end": end}
+    has_rows = conn.execute(
+        text(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            "WHERE crawled_at >= :start AND crawled_at < :end)"
+        ),
+        bounds
+    ).scalar()
+    create = (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    if not has_rows:
+        conn.execute(text(create))
+        return
+
+    logger.warning(f"預設分區中有 {start:%Y-%m} 的貼文，分區維護任務可能漏跑，搬移到 {name}")
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    conn.execute(text(create))
+    conn.execute(
+        text(
+            f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} "
+            "WHERE crawled_at >= :start AND crawled_at < :end"
+        ),
+        bounds
+    )
+    conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE crawled_at >= :start AND crawled_at < :end"),
+        bounds
+    )
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+
+def ensure_post_partitions(
+    engine: Engine,
+    months_ahead: Optional[int] = None,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    預先創建當月及未來數個月的分區，以及預設分區
+
+    預設分區中已有某個月份的資料時（維護任務曾經漏跑），直接創建該月份分區會失敗，
+    此時在同一交易內分離預設分區、創建月份分區並搬移資料後再掛回
+
+    Args:
+        engine: 資料庫引擎（必須是主庫）
+        months_ahead: 預先創建的月份數，預設使用配置
+        today: 基準日期，預設為今天（UTC）
+
+    Returns:
+        新創建的分區名稱清單
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    if not is_partitioned(engine):
+        logger.warning("posts 不是分區表，跳過分區創建（請參考部署指南遷移）")
+        return []
+
+    if months_ahead is None:
+        months_ahead = settings.POSTS_PARTITION_PREMAKE_MONTHS
+    current = (today or utc_today()).replace(day=1)
+
+    existing = set(list_post_partitions(engine))
+    created = []
+    with engine.begin() as conn:
+        if DEFAULT_PARTITION not in existing:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"
+            ))
+            created.append(DEFAULT_PARTITION)
+
+        for i in range(months_ahead + 1):
+            start = add_months(current, i)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            _create_month_partition(conn, name, start, add_months(start, 1))
+            created.append(name)
+
+    if created:
+        logger.info(f"已創建貼文分區: {created}")
+    return created
+
+
+def expire_post_partitions(
+    engine: Engine,
+    retention_months: Optional[int] = None,
+    mode: Optional[str] = None,
+    today: Optional[date] = None
+) -> List[str]:
+    """
+    刪除或分離超出保留期的分區
+
+    Args:
+        engine: 資料庫引擎（必須是主庫）
+        retention_months: 保留月份數（含當月），0 表示永久保留
+        mode: drop 直接刪除分區；detach 分離為獨立表以便歸檔
+        today: 基準日期，預設為今天（UTC）
+
+    Returns:
+        被處理的分區名稱清單
+    """
+    if retention_months is None:
+        retention_months = settings.POSTS_RETENTION_MONTHS
+    if mode is None:
+        mode = settings.POSTS_RETENTION_MODE
+    if mode not in ("drop", "detach"):
+        raise ValueError(f"不支援的分區保留模式: {mode}")
+    if retention_months <= 0 or not is_partitioned(engine):
+        return []
+
+    # 早於此月份開始的分區全部過期（預設分區不符合命名規則，不會被處理）
+    cutoff = add_months((today or utc_today()).replace(day=1), -(retention_months - 1))
+
+    expired = []
+    for name in list_post_partitions(engine):
+        match = PARTITION_NAME_PATTERN.match(name)
+        if not match:
+            continue
+        if date(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+            expired.append(name)
+
+    with engine.begin() as conn:
+        for name in expired:
+            if mode == "detach":
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            else:
+                conn.execute(text(f"DROP TABLE {name}"))
+
+    if expired:
+        logger.info(f"已{'分離' if mode == 'detach' else '刪除'}過期貼文分區: {expired}")
+    return expired
@@ -4,6 +4,7 @@ API 限流中間件
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from app.core.config import settings
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -12,7 +13,7 @@ logger = get_logger(__name__)
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["100/minute"],
-    storage_uri="redis://redis:6379/1",
+    storage_uri=settings.rate_limit_storage_uri,
     strategy="fixed-window"
 )
 
@@ -1,41 +1,169 @@
 """
 Redis 連接管理
+API 路由使用 redis.asyncio 客戶端（在應用生命週期中創建連接池），
+Celery 任務等同步程式碼使用同步客戶端。
+REDIS_CLUSTER 開啟時一般資料和貼文快取的客戶端改為 RedisCluster
 """
 import redis
-from typing import Optional
+import redis.asyncio as aioredis
+from redis.cluster import RedisCluster
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+from typing import Any, Optional, Union
 from app.core.config import settings
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
+SyncClient = Union[redis.Redis, RedisCluster]
+AsyncClient = Union[aioredis.Redis, AsyncRedisCluster]
+
+
+def is_cluster(client: Any) -> bool:
+    """
+    判斷客戶端是否連接 Redis Cluster
+    
+    Cluster 模式下 pipeline 不支援 MULTI/EXEC，跨 slot 的 MGET 需改用 mget_nonatomic
+    """
+    return isinstance(client, (RedisCluster, AsyncRedisCluster))
+
+
+def _client_url(decode_responses: bool) -> str:
+    """字串客戶端連接一般資料端點，二進位客戶端連接貼文快取端點"""
+    return settings.redis_url if decode_responses else settings.redis_cache_url
+
 
 class RedisClient:
-    """Redis 客戶端單例類別"""
+    """
+    同步 Redis 客戶端單例類別
+    
+    redis-py 在第一次執行命令時才建立連接，匯入模組時不會連接 Redis
+    """
     
-    _instance: Optional[redis.Redis] = None
+    _instance: Optional[SyncClient] = None
+    _binary_instance: Optional[SyncClient] = None
+    
+    @staticmethod
+    def _create(decode_responses: bool) -> SyncClient:
+        """創建 Redis 客戶端"""
+        client_class = RedisCluster if settings.REDIS_CLUSTER else redis.Redis
+        return client_class.from_url(
+            _client_url(decode_responses),
+            decode_responses=decode_responses,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            retry_on_timeout=True
+        )
     
     @classmethod
-    def get_client(cls) -> redis.Redis:
+    def get_client(cls) -> SyncClient:
         """獲取 Redis 客戶端實例"""
         if cls._instance is None:
-            try:
-                cls._instance = redis.Redis(
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    db=settings.REDIS_DB,
-                    decode_responses=settings.REDIS_DECODE_RESPONSES,
-                    socket_connect_timeout=5,
-                    socket_timeout=5,
-                    retry_on_timeout=True
-                )
-                # 測試連接
-                cls._instance.ping()
-                logger.info(f"Redis 連接成功: {settings.REDIS_HOST}:{settings.REDIS_PORT}")
-            except Exception as e:
-                logger.error(f"Redis 連接失敗: {e}")
-                raise
+            cls._instance = cls._create(settings.REDIS_DECODE_RESPONSES)
         return cls._instance
+    
+    @classmethod
+    def get_binary_client(cls) -> SyncClient:
+        """獲取返回原始位元組的 Redis 客戶端實例（用於貼文快取的二進位編碼）"""
+        if cls._binary_instance is None:
+            cls._binary_instance = cls._create(False)
+        return cls._binary_instance
+
+
+class AsyncRedisClient:
+    """
+    非同步 Redis 客戶端管理
+    
+    字串客戶端和二進位客戶端各自使用一個有上限的連接池（Cluster 模式下為每個節點一個），
+    查詢任務狀態另有一個連接 Celery 結果後端的二進位客戶端（不支援 Cluster）。
+    由 FastAPI 生命週期呼叫 init / close；尚未初始化時第一次使用會自動創建
+    """
+    
+    _instance: Optional[AsyncClient] = None
+    _binary_instance: Optional[AsyncClient] = None
+    _result_instance: Optional[aioredis.Redis] = None
+    
+    @staticmethod
+    def _create(decode_responses: bool, url: Optional[str] = None) -> AsyncClient:
+        """創建帶連接池的非同步 Redis 客戶端（指定 url 時連接該單一實例）"""
+        options = dict(
+            decode_responses=decode_responses,
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL
+        )
+        if settings.REDIS_CLUSTER and url is None:
+            return AsyncRedisCluster.from_url(_client_url(decode_responses), **options)
+        pool = aioredis.ConnectionPool.from_url(
+            url or _client_url(decode_responses),
+            retry_on_timeout=True,
+            **options
+        )
+        return aioredis.Redis(connection_pool=pool)
+    
+    @classmethod
+    async def init(cls) -> None:
+        """創建連接池並測試連接（連接失敗只記錄日誌，不阻止應用啟動）"""
+        client = cls.get_client()
+        cls.get_binary_client()
+        try:
+            await client.ping()
+            logger.info(f"Redis 連接成功: {settings.redis_url}")
+        except Exception as e:
+            logger.error(f"Redis 連接失敗: {e}")
+    
+    @classmethod
+    async def close(cls) -> None:
+        """關閉客戶端並釋放連接池"""
+        for client in (cls._instance, cls._binary_instance, cls._result_instance):
+            if client is None:
+                continue
+            if is_cluster(client):
+                await client.aclose()
+            else:
+                await client.aclose(close_connection_pool=True)
+        cls._instance = None
+        cls._binary_instance = None
+        cls._result_instance = None
+    
+    @classmethod
+    def get_client(cls) -> AsyncClient:
+        """獲取非同步 Redis 客戶端實例"""
+        if cls._instance is None:
+            cls._instance = cls._create(settings.REDIS_DECODE_RESPONSES)
+        return cls._instance
+    
+    @classmethod
+    def get_binary_client(cls) -> AsyncClient:
+        """獲取返回原始位元組的非同步 Redis 客戶端實例"""
+        if cls._binary_instance is None:
+            cls._binary_instance = cls._create(False)
+        return cls._binary_instance
+    
+    @classmethod
+    def get_result_backend_client(cls) -> aioredis.Redis:
+        """獲取連接 Celery 結果後端的非同步二進位客戶端實例"""
+        if cls._result_instance is None:
+            cls._result_instance = cls._create(False, settings.celery_result_backend)
+        return cls._result_instance
+
+
+def get_async_redis() -> AsyncClient:
+    """非同步 Redis 客戶端的依賴注入函數"""
+    return AsyncRedisClient.get_client()
+
+
+def get_async_cache_redis() -> AsyncClient:
+    """貼文快取使用的非同步二進位客戶端的依賴注入函數"""
+    return AsyncRedisClient.get_binary_client()
+
+
+def get_async_result_redis() -> aioredis.Redis:
+    """Celery 結果後端的非同步客戶端的依賴注入函數"""
+    return AsyncRedisClient.get_result_backend_client()
 
 
-# 創建全域 Redis 客戶端實例
+# 創建全域同步 Redis 客戶端實例（Celery 任務使用）
 redis_client = RedisClient.get_client()
+# 貼文快取使用的二進位客戶端
+redis_cache_client = RedisClient.get_binary_client()
@@ -0,0 +1,63 @@
+"""
+JSON 序列化
+API 回應使用 orjson 序列化，未安裝時退回標準庫 json；
+兩者輸出格式相同（UTF-8、不轉義非 ASCII 字元、無多餘空白）
+"""
+import json
+from datetime import date, datetime, time
+from typing import Any
+from uuid import UUID
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 可選依賴，未安裝時使用標準庫
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """標準庫 json 無法序列化的型別，轉換方式與 orjson 相同"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    序列化為 JSON 位元組
+    
+    Args:
+        content: 要序列化的內容（可包含 datetime）
+    
+    Returns:
+        JSON 位元組
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default
+    ).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """解析 JSON（位元組或字串）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    以 orjson 序列化的 JSON 回應
+    
+    路由直接返回此回應時不經過 FastAPI 的 jsonable_encoder，省去逐值轉換
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
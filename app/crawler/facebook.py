@@ -3,10 +3,11 @@ Facebook 爬蟲模組
 使用 Playwright 爬取 Facebook 頁面貼文
 """
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional
 import time
 import uuid
 import re
+import html
 from app.core.config import settings
 from app.core.logger import get_logger
 
@@ -18,6 +19,22 @@ class FacebookCrawlerError(Exception):
     pass
 
 
+def extract_post_text(post_html: str) -> str:
+    """
+    從 HTML 片段提取純文字內容（供全文搜尋使用）
+    
+    Args:
+        post_html: 貼文的 HTML 代碼
+        
+    Returns:
+        去除標籤並壓縮空白後的文字
+    """
+    text = re.sub(r'<(script|style)\b[^>]*>.*?</\1>', ' ', post_html, flags=re.S | re.I)
+    text = re.sub(r'<[^>]*>', ' ', text)
+    text = html.unescape(re.sub(r'\s+', ' ', text)).strip()
+    return text[:settings.CRAWLER_CONTENT_MAX_LENGTH]
+
+
 def extract_post_info(post_html: str) -> Optional[Dict]:
     """
     從 HTML 片段提取貼文資訊
@@ -58,19 +75,25 @@ def extract_post_info(post_html: str) -> Optional[Dict]:
             "comments": 0,
             "reactions": 0,
             "category": category,
+            "content": extract_post_text(post_html),
         }
     except Exception as e:
         logger.warning(f"解析貼文資訊失敗: {e}")
         return None
 
 
-def crawl_facebook_posts(page_url: str, max_posts: int = None) -> List[Dict]:
+def crawl_facebook_posts(
+    page_url: str,
+    max_posts: int = None,
+    progress: Optional[Callable[[str, Dict[str, Any]], None]] = None
+) -> List[Dict]:
     """
     爬取 Facebook 頁面的貼文
     
     Args:
         page_url: Facebook 頁面的 URL
         max_posts: 最多爬取的貼文數量
+        progress: 進度回呼，以 (階段, 資料) 呼叫，階段為 loading / scrolling / parsed
         
     Returns:
         貼文數据清單
@@ -84,6 +107,10 @@ def crawl_facebook_posts(page_url: str, max_posts: int = None) -> List[Dict]:
     posts_data = []
     logger.info(f"開始爬取 Facebook 頁面: {page_url}, 目標數量: {max_posts}")
     
+    def report(phase: str, **data: Any) -> None:
+        if progress is not None:
+            progress(phase, data)
+    
     try:
         with sync_playwright() as p:
             # 啟動瀏覽器
@@ -105,6 +132,7 @@ def crawl_facebook_posts(page_url: str, max_posts: int = None) -> List[Dict]:
             try:
                 # 存取頁面
                 logger.info(f"正在加載頁面: {page_url}")
+                report("loading", page_url=str(page_url))
                 page.goto(str(page_url), wait_until='networkidle')
                 page.wait_for_timeout(5000)
                 
@@ -112,6 +140,7 @@ def crawl_facebook_posts(page_url: str, max_posts: int = None) -> List[Dict]:
                 scroll_count = settings.CRAWLER_SCROLL_COUNT
                 for i in range(scroll_count):
                     logger.debug(f"滾動頁面 {i+1}/{scroll_count}")
+                    report("scrolling", scroll=i + 1, total=scroll_count)
                     page.keyboard.press("PageDown")
                     time.sleep(settings.CRAWLER_SCROLL_DELAY)
                 
@@ -133,7 +162,14 @@ def crawl_facebook_posts(page_url: str, max_posts: int = None) -> List[Dict]:
                         posts_data.append(info)
                         logger.debug(f"成功解析貼文 {len(posts_data)}: {info['category']}")
                 
+                # 同一次爬取的貼文共用爬取時間，按頁面順序每則遞減 1 毫秒，
+                # 使快取索引按分數倒序時與頁面順序一致
+                crawled_at = time.time()
+                for position, info in enumerate(posts_data):
+                    info["timestamp"] = crawled_at - position * 0.001
+                
                 logger.info(f"爬取完成，共獲取 {len(posts_data)} 則貼文")
+                report("parsed", posts_found=len(posts_data))
                 
             except PlaywrightTimeout as e:
                 logger.error(f"頁面加載逾時: {e}")
@@ -5,10 +5,12 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Callable, Optional
+from redis.asyncio import Redis as AsyncRedis
 from app.models.user import User
-from app.core.db import get_db
-from app.services.auth import validate_token
+from app.core.db import get_session_factory
+from app.core.redis import get_async_redis
+from app.services.auth import cache_user, get_cached_user, validate_token_async
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -19,14 +21,20 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
+    redis: AsyncRedis = Depends(get_async_redis)
 ) -> User:
     """
     獲取當前認證使用者
     
+    已驗證的 token ID 與使用者資料保存在進程內快取，常見情況下只需在本地驗證 JWT 簽章，
+    不查詢 Redis 和資料庫。快取未命中時才開啟資料庫會話，查詢後立即關閉，
+    長時間的串流回應不會一直佔用連接池中的連接
+    
     Args:
         token: JWT Token
-        db: 資料庫會話
+        session_factory: 資料庫會話工廠
+        redis: 非同步 Redis 客戶端
         
     Returns:
         當前使用者物件
@@ -35,7 +43,7 @@ async def get_current_user(
         HTTPException: 認證失敗時拋出 401
     """
     # 驗證 Token
-    username = validate_token(token)
+    username = await validate_token_async(token, redis)
     if not username:
         logger.warning("Token 驗證失敗")
         raise HTTPException(
@@ -45,7 +53,14 @@ async def get_current_user(
         )
     
     # 查詢使用者
-    user = db.query(User).filter(User.username == username).first()
+    user = get_cached_user(username)
+    if user is not None:
+        return user
+    db = session_factory()
+    try:
+        user = db.query(User).filter(User.username == username).first()
+    finally:
+        db.close()
     if not user:
         logger.warning(f"使用者不存在: {username}")
         raise HTTPException(
@@ -54,6 +69,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    cache_user(user)
     return user
 
 
@@ -99,14 +115,16 @@ async def require_admin1_user(
 
 async def get_optional_user(
     token: Optional[str] = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
+    redis: AsyncRedis = Depends(get_async_redis)
 ) -> Optional[User]:
     """
     獲取可選的當前使用者（用於可選認證的端點）
     
     Args:
         token: JWT Token（可選）
-        db: 資料庫會話
+        session_factory: 資料庫會話工廠
+        redis: 非同步 Redis 客戶端
         
     Returns:
         當前使用者物件或 None
@@ -115,6 +133,6 @@ async def get_optional_user(
         return None
     
     try:
-        return await get_current_user(token, db)
+        return await get_current_user(token, session_factory, redis)
     except HTTPException:
         return None
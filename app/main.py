@@ -10,7 +10,13 @@ from app.core.db import init_db
 from app.core.config import settings
 from app.core.logger import setup_logging, get_logger
 from app.core.monitoring import prometheus_middleware, metrics_endpoint
+from app.core.compression import CompressionMiddleware
 from app.core.rate_limit import limiter, _rate_limit_exceeded_handler
+from app.core.local_cache import InvalidationSubscriber
+from app.core.redis import AsyncRedisClient, redis_client
+from app.core.serialization import FastJSONResponse
+from app.services.auth import AUTH_REVOCATION_CHANNEL, invalidate_auth_cache, password_executor
+from app.services.post_cache import POSTS_INVALIDATION_CHANNEL, invalidate_listing_cache
 from slowapi.errors import RateLimitExceeded
 
 # 設置日誌
@@ -25,15 +31,36 @@ async def lifespan(app: FastAPI):
     logger.info(f"正在啟動 {settings.APP_NAME} v{settings.APP_VERSION}")
     try:
         init_db()
+        await AsyncRedisClient.init()
         logger.info("應用啟動成功")
     except Exception as e:
         logger.error(f"應用啟動失敗: {e}")
         raise
     
+    # 訂閱列表快取失效通知（每個 worker 各自清空自己的進程內快取）
+    invalidation_subscriber = InvalidationSubscriber(
+        redis_client,
+        POSTS_INVALIDATION_CHANNEL,
+        invalidate_listing_cache
+    )
+    invalidation_subscriber.start()
+    # 訂閱 Token 撤銷通知（刪除進程內認證快取中該使用者的項目）
+    revocation_subscriber = InvalidationSubscriber(
+        redis_client,
+        AUTH_REVOCATION_CHANNEL,
+        invalidate_auth_cache
+    )
+    revocation_subscriber.start()
+    
     yield
     
     # 關閉時執行
     logger.info("應用正在關閉")
+    invalidation_subscriber.stop()
+    revocation_subscriber.stop()
+    password_executor.shutdown(wait=False)
+    crawler.crawl_executor.shutdown(wait=False)
+    await AsyncRedisClient.close()
 
 
 # 創建 FastAPI 應用
@@ -43,7 +70,8 @@ app = FastAPI(
     description="一個用於爬取和管理 Facebook 貼文的 API 服務",
     lifespan=lifespan,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # 配置限流器
@@ -62,6 +90,14 @@ app.add_middleware(
 # 添加 Prometheus 監控中間件
 app.middleware("http")(prometheus_middleware)
 
+# 回應壓縮（最外層，記錄每個端點實際傳送的位元組數）
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+    gzip_level=settings.RESPONSE_GZIP_LEVEL,
+    brotli_quality=settings.RESPONSE_BROTLI_QUALITY
+)
+
 
 # 全域異常處理
 @app.exception_handler(Exception)
@@ -86,8 +122,7 @@ async def root():
 async def health_check(request: Request):
     """健康檢查端點"""
     try:
-        from app.core.redis import redis_client
-        redis_client.ping()
+        await AsyncRedisClient.get_client().ping()
         redis_status = "正常"
     except Exception as e:
         logger.error(f"Redis 健康檢查失敗: {e}")
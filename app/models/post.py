@@ -1,8 +1,27 @@
-from sqlalchemy import Column, String, Integer
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, Text, Index
 from app.core.db import Base
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # pg_trgm GIN 索引，支援 /posts/search 的 ILIKE 與相似度排序
+        Index(
+            "ix_posts_post_url_trgm",
+            "post_url",
+            postgresql_using="gin",
+            postgresql_ops={"post_url": "gin_trgm_ops"}
+        ),
+        Index(
+            "ix_posts_content_trgm",
+            "content",
+            postgresql_using="gin",
+            postgresql_ops={"content": "gin_trgm_ops"}
+        ),
+        # PostgreSQL 上按 crawled_at 做月份範圍分區（分區鍵必須包含在主鍵中），
+        # 因此資料庫不再保證 uid 唯一，由 save_posts_to_db 以 advisory lock 避免重複寫入
+        {"postgresql_partition_by": "RANGE (crawled_at)"},
+    )
 
     uid = Column(String, primary_key=True, index=True)
     post_url = Column(String)
@@ -11,3 +30,5 @@ class Post(Base):
     comments = Column(Integer, default=0)
     reactions = Column(Integer, default=0)
     category = Column(String)
+    content = Column(Text, nullable=True)
+    crawled_at = Column(DateTime, primary_key=True, default=datetime.utcnow, index=True)
@@ -2,7 +2,9 @@
 爬蟲相關的 Pydantic 模型
 """
 from pydantic import BaseModel, HttpUrl, Field, validator
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
+from app.core.config import settings
 
 
 class CrawlRequest(BaseModel):
@@ -26,6 +28,18 @@ class CrawlResponse(BaseModel):
     success: bool = True
 
 
+class TaskStatusBatchRequest(BaseModel):
+    """批次查詢任務狀態請求模型"""
+    task_ids: List[str] = Field(..., min_length=1, description="任務 ID 列表")
+    
+    @validator('task_ids')
+    def validate_batch_size(cls, v):
+        """限制每次查詢的任務數"""
+        if len(v) > settings.TASK_STATUS_BATCH_MAX:
+            raise ValueError(f'每次最多查詢 {settings.TASK_STATUS_BATCH_MAX} 個任務')
+        return v
+
+
 class PostSchema(BaseModel):
     """貼文數据模型"""
     uid: str
@@ -35,6 +49,7 @@ class PostSchema(BaseModel):
     comments: int = 0
     reactions: int = 0
     category: str
+    crawled_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
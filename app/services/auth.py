@@ -2,18 +2,111 @@
 認證服務
 處理使用者認證、Token 生成和驗證
 """
-from passlib.hash import bcrypt
+from passlib.context import CryptContext
 from jose import jwt, JWTError
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Optional, Tuple
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from app.models.user import User
 from app.core.config import settings
-from app.core.redis import redis_client
+from app.core.executor import BoundedExecutor
+from app.core.local_cache import TTLCache
+from app.core.redis import is_cluster, redis_client
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+def _build_password_context() -> CryptContext:
+    """新密碼使用 PASSWORD_HASH_SCHEME，既有的 bcrypt 雜湊仍可驗證"""
+    schemes = [settings.PASSWORD_HASH_SCHEME]
+    if settings.PASSWORD_HASH_SCHEME != "bcrypt":
+        schemes.append("bcrypt")
+    return CryptContext(
+        schemes=schemes,
+        deprecated="auto",
+        bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS
+    )
+
+
+pwd_context = _build_password_context()
+
+# bcrypt 在計算時釋放 GIL，以執行緒執行即可不阻塞事件迴圈
+password_executor = BoundedExecutor(
+    "password-hash",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
+
+# Token 創建或撤銷時發布使用者名，各 API worker 收到後刪除該使用者的認證快取
+AUTH_REVOCATION_CHANNEL = "auth:revoke"
+
+# 進程內認證快取：使用者名 -> 目前有效的 token ID / 使用者資料
+token_cache = TTLCache(
+    "auth_tokens",
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS
+)
+user_cache = TTLCache(
+    "auth_users",
+    maxsize=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_CACHE_TTL_SECONDS
+)
+
+# 每次失效時遞增，避免失效前從 Redis 讀到的結果在失效之後才寫入快取
+_cache_generation = 0
+
+
+def invalidate_auth_cache(message: Any = None) -> None:
+    """
+    收到撤銷通知時刪除該使用者的認證快取
+    
+    重新訂閱時（message 為 None）可能已漏掉通知，清空全部快取
+    """
+    global _cache_generation
+    _cache_generation += 1
+    if message is None:
+        token_cache.clear()
+        user_cache.clear()
+        return
+    username = message.decode("utf-8") if isinstance(message, bytes) else str(message)
+    token_cache.delete(username)
+    user_cache.delete(username)
+
+
+def _publish_revocation(username: str) -> None:
+    """清除本進程的快取並通知其他 worker（發布失敗時其他 worker 的快取最多在 TTL 後過期）"""
+    invalidate_auth_cache(username)
+    try:
+        redis_client.publish(AUTH_REVOCATION_CHANNEL, username)
+    except RedisError as e:
+        logger.error(f"發布 Token 撤銷通知失敗: {e}")
+
+
+async def _publish_revocation_async(username: str, redis: AsyncRedis) -> None:
+    """清除本進程的快取並通知其他 worker（非同步 Redis 版本）"""
+    invalidate_auth_cache(username)
+    try:
+        await redis.publish(AUTH_REVOCATION_CHANNEL, username)
+    except RedisError as e:
+        logger.error(f"發布 Token 撤銷通知失敗: {e}")
+
+
+def get_cached_user(username: str) -> Optional[User]:
+    """從進程內快取讀取使用者（與資料庫會話分離的物件）"""
+    return user_cache.get(username)
+
+
+def cache_user(user: User) -> None:
+    """將使用者的欄位複製為與會話分離的物件後寫入進程內快取"""
+    user_cache.set(
+        user.username,
+        User(**{column.name: getattr(user, column.name) for column in User.__table__.columns})
+    )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     驗證密碼
@@ -21,28 +114,133 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Args:
         plain_password: 明文密碼
         hashed_password: 雜湊密碼
-        
+    
     Returns:
         密碼是否匹配
     """
     try:
-        return bcrypt.verify(plain_password, hashed_password)
+        return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
         logger.error(f"密碼驗證失敗: {e}")
         return False
 
 
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        valid, new_hash = pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        logger.error(f"密碼驗證失敗: {e}")
+        return False, None
+    if not settings.PASSWORD_REHASH_ON_LOGIN:
+        new_hash = None
+    return valid, new_hash
+
+
+async def verify_password_async(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    在密碼雜湊執行緒池中驗證密碼，不阻塞事件迴圈
+    
+    Args:
+        plain_password: 明文密碼
+        hashed_password: 雜湊密碼
+    
+    Returns:
+        (密碼是否匹配, 新的雜湊)；只有開啟 PASSWORD_REHASH_ON_LOGIN 且既有雜湊的演算法或成本
+        不符合目前配置時才返回新的雜湊，否則為 None
+    
+    Raises:
+        ExecutorBusyError: 排隊中的密碼雜湊已達上限時抛出
+    """
+    return await password_executor.run(_verify_and_update, plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """
     生成密碼雜湊
     
     Args:
         password: 明文密碼
-        
+    
     Returns:
         雜湊后的密碼
     """
-    return bcrypt.hash(password)
+    return pwd_context.hash(password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    在密碼雜湊執行緒池中生成密碼雜湊
+    
+    Args:
+        password: 明文密碼
+    
+    Returns:
+        雜湊后的密碼
+    
+    Raises:
+        ExecutorBusyError: 排隊中的密碼雜湊已達上限時抛出
+    """
+    return await password_executor.run(pwd_context.hash, password)
+
+
+def _encode_token(username: str) -> Tuple[str, str]:
+    """
+    生成 JWT
+    
+    Returns:
+        (JWT Token, token ID)
+    """
+    # 生成唯一的 token ID
+    token_id = str(uuid.uuid4())
+    
+    # 計算過期時間
+    expire = datetime.utcnow() + timedelta(
+        minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+    
+    # 創建 payload
+    payload = {
+        "sub": username,
+        "exp": expire,
+        "jti": token_id,
+        "iat": datetime.utcnow()
+    }
+    
+    # 編碼 JWT
+    encoded_jwt = jwt.encode(
+        payload,
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
+    return encoded_jwt, token_id
+
+
+def _decode_token(token: str) -> Optional[Tuple[str, str]]:
+    """
+    解碼 JWT
+    
+    Returns:
+        (使用者名, token ID)，payload 缺少必要欄位時返回 None
+    
+    Raises:
+        JWTError: 簽章無效或已過期時抛出
+    """
+    payload = jwt.decode(
+        token,
+        settings.SECRET_KEY,
+        algorithms=[settings.ALGORITHM]
+    )
+    
+    username = payload.get("sub")
+    token_id = payload.get("jti")
+    
+    if not username or not token_id:
+        logger.warning("Token payload 缺少必要欄位")
+        return None
+    return username, token_id
 
 
 def create_access_token(username: str) -> str:
@@ -51,33 +249,12 @@ def create_access_token(username: str) -> str:
     
     Args:
         username: 使用者名
-        
+    
     Returns:
         JWT Token
     """
     try:
-        # 生成唯一的 token ID
-        token_id = str(uuid.uuid4())
-        
-        # 計算過期時間
-        expire = datetime.utcnow() + timedelta(
-            minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
-        )
-        
-        # 創建 payload
-        payload = {
-            "sub": username,
-            "exp": expire,
-            "jti": token_id,
-            "iat": datetime.utcnow()
-        }
-        
-        # 編碼 JWT
-        encoded_jwt = jwt.encode(
-            payload,
-            settings.SECRET_KEY,
-            algorithm=settings.ALGORITHM
-        )
+        encoded_jwt, token_id = _encode_token(username)
         
         # 在 Redis 中儲存 Token（確保同一帳號只有一個有效 Token）
         expire_seconds = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
@@ -91,10 +268,42 @@ def create_access_token(username: str) -> str:
             username,
             ex=expire_seconds
         )
+        # 舊的 Token 已被取代，通知各 worker 刪除快取
+        _publish_revocation(username)
         
         logger.info(f"為使用者 {username} 創建了新的存取令牌")
         return encoded_jwt
+    
+    except Exception as e:
+        logger.error(f"創建存取令牌失敗: {e}")
+        raise
+
+
+async def create_access_token_async(username: str, redis: AsyncRedis) -> str:
+    """
+    創建存取令牌（非同步 Redis 版本，供 API 路由使用）
+    
+    Args:
+        username: 使用者名
+        redis: 非同步 Redis 客戶端
+    
+    Returns:
+        JWT Token
+    """
+    try:
+        encoded_jwt, token_id = _encode_token(username)
         
+        expire_seconds = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        # Cluster 模式下兩個鍵位於不同 slot，pipeline 無法以 MULTI/EXEC 執行
+        async with redis.pipeline(transaction=not is_cluster(redis)) as pipe:
+            pipe.set(f"user_token:{username}", token_id, ex=expire_seconds)
+            pipe.set(f"token_user:{token_id}", username, ex=expire_seconds)
+            await pipe.execute()
+        await _publish_revocation_async(username, redis)
+        
+        logger.info(f"為使用者 {username} 創建了新的存取令牌")
+        return encoded_jwt
+    
     except Exception as e:
         logger.error(f"創建存取令牌失敗: {e}")
         raise
@@ -106,24 +315,15 @@ def validate_token(token: str) -> Optional[str]:
     
     Args:
         token: JWT Token
-        
+    
     Returns:
         使用者名，如果 Token 無效則返回 None
     """
     try:
-        # 解碼 JWT
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
-        
-        username = payload.get("sub")
-        token_id = payload.get("jti")
-        
-        if not username or not token_id:
-            logger.warning("Token payload 缺少必要欄位")
+        decoded = _decode_token(token)
+        if not decoded:
             return None
+        username, token_id = decoded
         
         # 檢查 Redis 中的 Token 是否匹配（防止 Token 被撤銷）
         stored_token_id = redis_client.get(f"user_token:{username}")
@@ -132,7 +332,47 @@ def validate_token(token: str) -> Optional[str]:
             return None
         
         return username
+    
+    except JWTError as e:
+        logger.warning(f"Token 驗證失敗: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Token 驗證出錯: {e}")
+        return None
+
+
+async def validate_token_async(token: str, redis: AsyncRedis) -> Optional[str]:
+    """
+    驗證存取令牌（非同步 Redis 版本，供 API 路由使用）
+    
+    token ID 與進程內快取相符時只需在本地驗證簽章，不查詢 Redis；
+    快取由撤銷通知頻道保持一致，最多保留 AUTH_CACHE_TTL_SECONDS
+    
+    Args:
+        token: JWT Token
+        redis: 非同步 Redis 客戶端
+    
+    Returns:
+        使用者名，如果 Token 無效則返回 None
+    """
+    try:
+        decoded = _decode_token(token)
+        if not decoded:
+            return None
+        username, token_id = decoded
+        if token_cache.get(username) == token_id:
+            return username
+        
+        generation = _cache_generation
+        stored_token_id = await redis.get(f"user_token:{username}")
+        if not stored_token_id or stored_token_id != token_id:
+            logger.warning(f"Token 已失效或被撤銷: {username}")
+            return None
         
+        if generation == _cache_generation:
+            token_cache.set(username, token_id)
+        return username
+    
     except JWTError as e:
         logger.warning(f"Token 驗證失敗: {e}")
         return None
@@ -147,7 +387,7 @@ def revoke_token(username: str) -> bool:
     
     Args:
         username: 使用者名
-        
+    
     Returns:
         是否撤銷成功
     """
@@ -156,6 +396,31 @@ def revoke_token(username: str) -> bool:
         if token_id:
             redis_client.delete(f"user_token:{username}")
             redis_client.delete(f"token_user:{token_id}")
+            _publish_revocation(username)
+            logger.info(f"已撤銷使用者 {username} 的令牌")
+            return True
+        return False
+    except Exception as e:
+        logger.error(f"撤銷令牌失敗: {e}")
+        return False
+
+
+async def revoke_token_async(username: str, redis: AsyncRedis) -> bool:
+    """
+    撤銷使用者的存取令牌（非同步 Redis 版本，供 API 路由使用）
+    
+    Args:
+        username: 使用者名
+        redis: 非同步 Redis 客戶端
+    
+    Returns:
+        是否撤銷成功
+    """
+    try:
+        token_id = await redis.get(f"user_token:{username}")
+        if token_id:
+            await redis.delete(f"user_token:{username}", f"token_user:{token_id}")
+            await _publish_revocation_async(username, redis)
             logger.info(f"已撤銷使用者 {username} 的令牌")
             return True
         return False
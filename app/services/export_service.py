@@ -0,0 +1,346 @@
+"""
+匯出服務
+以串流方式匯出貼文資料，以及生成 Parquet 分析快照
+"""
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from pathlib import Path
+import csv
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+import zlib
+from app.models.post import Post
+from app.services.post_service import iter_posts_for_export, post_to_dict
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.monitoring import (
+    snapshot_rows_exported_total,
+    snapshot_file_size_bytes,
+    snapshot_throughput_rows_per_second
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可選依賴，只有 Parquet 快照需要
+    pa = None
+    pq = None
+
+logger = get_logger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_FIELDS = [
+    "uid", "post_url", "video_url", "image_url",
+    "comments", "reactions", "category", "crawled_at"
+]
+
+# 累積到此大小後才送出一個區塊，避免逐行送出過小的封包
+CHUNK_SIZE = 64 * 1024
+
+
+def _encode_rows(rows: Iterator[Dict], fmt: str) -> Iterator[str]:
+    """將貼文字典逐行編碼為 NDJSON 或 CSV 文字"""
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # 只有表頭（沒有資料行）時也要輸出
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_posts_export(
+    session_factory: Callable[[], Session],
+    fmt: str = "ndjson",
+    compress: bool = False,
+    category: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, str]] = None
+) -> Iterator[bytes]:
+    """
+    產生匯出檔案的位元組區塊
+
+    會話在產生器內部創建並於結束時關閉，適合直接交給 StreamingResponse
+
+    Args:
+        session_factory: 唯讀會話工廠
+        fmt: 匯出格式（ndjson / csv）
+        compress: 是否即時 gzip 壓縮
+        category: 貼文類別過濾
+        since: 只匯出此時間（含）之後爬取的貼文
+        until: 只匯出此時間之前爬取的貼文
+        after: 從此 (crawled_at, uid) 之後繼續匯出
+
+    Yields:
+        編碼（及壓縮）後的位元組區塊
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支援的匯出格式: {fmt}")
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    db = session_factory()
+    row_count = 0
+
+    def _rows() -> Iterator[Dict]:
+        nonlocal row_count
+        for post in iter_posts_for_export(
+            db,
+            category=category,
+            since=since,
+            until=until,
+            after=after
+        ):
+            row_count += 1
+            yield post_to_dict(post)
+
+    try:
+        pending = []
+        pending_size = 0
+        for line in _encode_rows(_rows(), fmt):
+            pending.append(line)
+            pending_size += len(line)
+            if pending_size < CHUNK_SIZE:
+                continue
+            data = "".join(pending).encode("utf-8")
+            pending, pending_size = [], 0
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+        data = "".join(pending).encode("utf-8")
+        if compressor:
+            data = compressor.compress(data) + compressor.flush()
+        if data:
+            yield data
+
+        logger.info(f"匯出完成，共 {row_count} 條貼文（格式: {fmt}，壓縮: {compress}）")
+    finally:
+        db.close()
+
+
+MANIFEST_NAME = "_manifest.json"
+# 執行中的檔案先寫到此目錄，「_」開頭的目錄不會被 Parquet 讀取端當作資料分區
+STAGING_DIR = "_staging"
+MANIFEST_MAX_RUNS = 100
+
+SNAPSHOT_COLUMNS = [
+    "uid", "post_url", "video_url", "image_url",
+    "comments", "reactions", "category", "content", "crawled_at"
+]
+
+
+def _snapshot_schema():
+    """Parquet 快照的欄位結構"""
+    return pa.schema([
+        ("uid", pa.string()),
+        ("post_url", pa.string()),
+        ("video_url", pa.string()),
+        ("image_url", pa.string()),
+        ("comments", pa.int64()),
+        ("reactions", pa.int64()),
+        ("category", pa.string()),
+        ("content", pa.string()),
+        ("crawled_at", pa.timestamp("us")),
+    ])
+
+
+def load_manifest(output_dir: Path) -> Dict:
+    """讀取快照清單，不存在時返回空清單"""
+    path = output_dir / MANIFEST_NAME
+    if not path.exists():
+        return {"watermark": None, "runs": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(output_dir: Path, manifest: Dict) -> None:
+    """原子性寫入快照清單（先寫暫存檔再替換）"""
+    path = output_dir / MANIFEST_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class _PartitionBuffer:
+    """單個 (日期, 類別) 分區的列式緩衝區"""
+
+    def __init__(self):
+        self.columns: Dict[str, List] = {name: [] for name in SNAPSHOT_COLUMNS}
+        self.file_seq = 0
+
+    def __len__(self) -> int:
+        return len(self.columns["uid"])
+
+    def append(self, post: Post) -> None:
+        for name in SNAPSHOT_COLUMNS:
+            self.columns[name].append(getattr(post, name))
+
+    def clear(self) -> None:
+        for values in self.columns.values():
+            values.clear()
+
+
+def write_parquet_snapshot(
+    session_factory: Callable[[], Session],
+    output_dir: Optional[str] = None,
+    rows_per_file: Optional[int] = None,
+    safety_lag_seconds: Optional[int] = None
+) -> Dict:
+    """
+    將上次快照之後新增的貼文寫成 Parquet 檔案
+
+    檔案按 dt=YYYY-MM-DD/category=xxx 分目錄，每個檔案最多 rows_per_file 行。
+    貼文按 (crawled_at, uid) 順序串流讀取，日期前進時即寫出舊日期的緩衝區，
+    記憶體上限約為「類別數 × rows_per_file」行。清單中的水位線記錄最後匯出的
+    (crawled_at, uid)，下次執行只匯出之後的貼文。
+
+    檔案先寫到本次執行的暫存目錄，全部寫完才移入分區目錄並保存清單；
+    執行失敗時刪除本次的檔案，下次從原水位線重新匯出不會產生重複資料。
+
+    Args:
+        session_factory: 唯讀會話工廠
+        output_dir: 輸出目錄，預設使用配置
+        rows_per_file: 每個檔案最多行數，預設使用配置
+        safety_lag_seconds: 只匯出早於此延遲的貼文，預設使用配置
+
+    Returns:
+        本次執行的統計資訊
+
+    Raises:
+        RuntimeError: 未安裝 pyarrow 時抛出
+    """
+    if pa is None:
+        raise RuntimeError("Parquet 快照需要安裝 pyarrow")
+
+    root = Path(output_dir or settings.SNAPSHOT_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    rows_per_file = rows_per_file or settings.SNAPSHOT_ROWS_PER_FILE
+    if safety_lag_seconds is None:
+        safety_lag_seconds = settings.SNAPSHOT_SAFETY_LAG_SECONDS
+
+    manifest = load_manifest(root)
+    watermark = manifest.get("watermark")
+    after = None
+    if watermark:
+        after = (datetime.fromisoformat(watermark["crawled_at"]), watermark["uid"])
+    until = datetime.utcnow() - timedelta(seconds=safety_lag_seconds)
+
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    staging = root / STAGING_DIR / run_id
+    schema = _snapshot_schema()
+    buffers: Dict[Tuple[str, str], _PartitionBuffer] = {}
+    files: List[Dict] = []
+    row_count = 0
+    last_post: Optional[Tuple[datetime, str]] = None
+    started = time.monotonic()
+
+    def _flush(key: Tuple[str, str], buffer: _PartitionBuffer) -> None:
+        if not len(buffer):
+            return
+        day, category = key
+        relative = (
+            Path(f"dt={day}") / f"category={category}"
+            / f"part-{run_id}-{buffer.file_seq:05d}.parquet"
+        )
+        path = staging / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pydict(buffer.columns, schema=schema)
+        pq.write_table(table, path, compression="snappy")
+        size = path.stat().st_size
+        snapshot_file_size_bytes.observe(size)
+        files.append({
+            "path": str(relative),
+            "rows": len(buffer),
+            "bytes": size
+        })
+        buffer.file_seq += 1
+        buffer.clear()
+
+    published: List[Path] = []
+    try:
+        db = session_factory()
+        try:
+            current_day = None
+            for post in iter_posts_for_export(db, until=until, after=after):
+                day = post.crawled_at.date().isoformat()
+                if day != current_day:
+                    # 按時間順序讀取，進入新日期後舊日期的緩衝區不會再增加
+                    for key in [k for k in buffers if k[0] != day]:
+                        _flush(key, buffers.pop(key))
+                    current_day = day
+
+                key = (day, post.category or "unknown")
+                buffer = buffers.setdefault(key, _PartitionBuffer())
+                buffer.append(post)
+                if len(buffer) >= rows_per_file:
+                    _flush(key, buffer)
+
+                row_count += 1
+                last_post = (post.crawled_at, post.uid)
+
+            for key, buffer in buffers.items():
+                _flush(key, buffer)
+        finally:
+            db.close()
+
+        elapsed = time.monotonic() - started
+        throughput = row_count / elapsed if elapsed > 0 else 0.0
+
+        run = {
+            "run_id": run_id,
+            "finished_at": datetime.utcnow().isoformat(),
+            "rows": row_count,
+            "files": files,
+            "bytes": sum(f["bytes"] for f in files),
+            "duration_seconds": round(elapsed, 3),
+            "rows_per_second": round(throughput, 1)
+        }
+
+        # 檔案全部寫完才移入分區目錄並推進水位線
+        for f in files:
+            target = root / f["path"]
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / f["path"], target)
+            published.append(target)
+
+        if last_post:
+            manifest["watermark"] = {
+                "crawled_at": last_post[0].isoformat(),
+                "uid": last_post[1]
+            }
+        manifest["runs"] = (manifest.get("runs", []) + [run])[-MANIFEST_MAX_RUNS:]
+        _save_manifest(root, manifest)
+    except Exception as e:
+        # 水位線沒有推進，刪除本次的檔案，避免下次重新匯出時產生重複資料
+        for path in published:
+            path.unlink(missing_ok=True)
+        logger.error(f"Parquet 快照 {run_id} 失敗，已刪除本次寫出的檔案: {e}")
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    snapshot_rows_exported_total.inc(row_count)
+    snapshot_throughput_rows_per_second.set(throughput)
+
+    logger.info(
+        f"Parquet 快照 {run_id} 完成：{row_count} 行，{len(files)} 個檔案，"
+        f"{run['bytes']} 位元組，{run['rows_per_second']} 行/秒"
+    )
+    return run
@@ -0,0 +1,519 @@
+"""
+貼文快取讀穿服務
+快取未命中時從資料庫讀取並回填 Redis，爬取完成後主動預熱列表前幾頁
+"""
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import asyncio
+import json
+import time
+import uuid
+from app.core.config import settings
+from app.core.local_cache import TTLCache
+from app.core.logger import get_logger
+from app.core.redis import is_cluster
+from app.core.serialization import dumps
+from app.core.monitoring import (
+    post_cache_requests_total,
+    post_cache_fills_total,
+    post_cache_fill_rows_total
+)
+from app.services.post_service import (
+    NO_CATEGORY,
+    get_posts_from_db,
+    get_post_fragments_from_redis_async,
+    get_posts_from_redis_async,
+    post_to_dict,
+    query_posts,
+    save_posts_to_redis,
+    save_posts_to_redis_async
+)
+
+logger = get_logger(__name__)
+
+# 只刪除自己持有的鎖，避免鎖過期後誤刪其他請求取得的鎖
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 等待其他請求回填時輪詢鎖的間隔（秒）
+FILL_POLL_INTERVAL = 0.05
+
+# 爬取結果寫入快取後發布到此頻道，各 API worker 收到後清空進程內列表快取
+POSTS_INVALIDATION_CHANNEL = "posts:invalidate"
+
+# 進程內列表快取：(類別, limit, offset) -> 序列化後的回應內容
+listing_cache = TTLCache(
+    "posts_listing",
+    maxsize=settings.LISTING_CACHE_MAX_ENTRIES,
+    ttl=settings.LISTING_CACHE_TTL_SECONDS
+)
+
+# 進程內列表版本快取：類別 -> (版本號, 更新時間戳)，沒有版本時為 (0, 0.0)
+listing_version_cache = TTLCache(
+    "posts_listing_version",
+    maxsize=settings.LISTING_CACHE_MAX_ENTRIES,
+    ttl=settings.LISTING_CACHE_TTL_SECONDS
+)
+
+
+def fill_lock_key(category: Optional[str] = None) -> str:
+    """回填（全域或類別）索引時使用的單飛鎖鍵"""
+    return f"posts:fill-lock:{category}" if category else "posts:fill-lock"
+
+
+def complete_marker_key(category: Optional[str] = None) -> str:
+    """
+    索引已完整的標記鍵
+    
+    回填時資料庫的行數不足，表示快取已包含全部貼文，
+    此時頁面不足不再視為未命中（負快取）
+    """
+    return f"posts:complete:{category}" if category else "posts:complete"
+
+
+def listing_pages_key(category: Optional[str] = None) -> str:
+    """
+    預先渲染的列表頁（hash）：欄位 "<頁碼>" 為序列化後的回應內容
+    
+    與類別索引使用相同的 hash tag
+    """
+    return f"posts:pages:{{{category or NO_CATEGORY}}}"
+
+
+def listing_version_key(category: Optional[str] = None) -> str:
+    """
+    列表內容版本（hash）：欄位 version 為每次爬取寫入後遞增的版本號，modified 為更新時間戳
+    
+    不設過期時間，確保版本號單調遞增
+    """
+    return f"posts:listing:{{{category or NO_CATEGORY}}}"
+
+
+def listing_payload(
+    posts: List[Dict],
+    category: Optional[str],
+    limit: int,
+    offset: int,
+    source: str
+) -> Dict[str, Any]:
+    """/posts/ offset 分頁的回應內容"""
+    return {
+        "data": posts,
+        "count": len(posts),
+        "category": category,
+        "limit": limit,
+        "offset": offset,
+        "source": source
+    }
+
+
+def render_listing_page(
+    posts: List[Union[Dict, bytes]],
+    category: Optional[str],
+    limit: int,
+    offset: int,
+    source: str
+) -> bytes:
+    """
+    序列化列表頁
+    
+    posts 中的位元組為快取中貼文的 JSON，直接拼接到 data 陣列而不解碼；字典以 orjson 序列化。
+    預先渲染的頁面與動態組裝的回應使用相同的方式，內容逐位元組一致
+    """
+    payload = listing_payload(posts, category, limit, offset, source)
+    data = b",".join(post if isinstance(post, bytes) else dumps(post) for post in payload.pop("data"))
+    return b'{"data":[' + data + b"]," + dumps(payload)[1:]
+
+
+def _materialized_page_number(limit: int, offset: int) -> Optional[int]:
+    """請求對應的預先渲染頁碼，不在預先渲染範圍內時返回 None"""
+    page_size = settings.LISTING_MATERIALIZED_PAGE_SIZE
+    if limit != page_size or offset % page_size:
+        return None
+    page = offset // page_size
+    return page if page < settings.LISTING_MATERIALIZED_PAGES else None
+
+
+def _load_latest_posts(db: Session, category: Optional[str], rows: int) -> List[Dict]:
+    """讀取資料庫中最新的 rows 條貼文"""
+    return [post_to_dict(post) for post in query_posts(db, category).limit(rows).all()]
+
+
+def _record_fill(trigger: str, category: Optional[str], count: int) -> None:
+    post_cache_fills_total.labels(trigger=trigger, status="success").inc()
+    post_cache_fill_rows_total.labels(trigger=trigger).inc(count)
+    logger.info(f"從資料庫回填 {count} 條貼文到快取（類別: {category}，來源: {trigger}）")
+
+
+def fill_posts_from_db(
+    redis: Redis,
+    db: Session,
+    category: Optional[str] = None,
+    rows: Optional[int] = None,
+    trigger: str = "read"
+) -> List[Dict]:
+    """
+    讀取資料庫中最新的貼文並回填到 Redis
+    
+    回填從索引開頭開始，使快取索引的前 rows 個位置與資料庫一致，
+    offset 分頁因此可以直接命中快取
+    
+    Args:
+        redis: Redis 客戶端
+        db: 資料庫會話
+        category: 貼文類別過濾
+        rows: 回填的行數，預設為 REDIS_WARM_ROWS
+        trigger: 指標中的觸發來源（read / warm）
+    
+    Returns:
+        從資料庫讀出的貼文字典清單（按爬取時間倒序）
+    """
+    rows = rows or settings.REDIS_WARM_ROWS
+    try:
+        posts = _load_latest_posts(db, category, rows)
+        if posts:
+            save_posts_to_redis(redis, posts)
+        if len(posts) < rows:
+            redis.set(complete_marker_key(category), len(posts), ex=settings.REDIS_FILL_COMPLETE_TTL)
+    except Exception:
+        post_cache_fills_total.labels(trigger=trigger, status="error").inc()
+        raise
+    
+    _record_fill(trigger, category, len(posts))
+    return posts
+
+
+async def fill_posts_from_db_async(
+    redis: AsyncRedis,
+    db: Session,
+    category: Optional[str] = None,
+    rows: Optional[int] = None,
+    trigger: str = "read"
+) -> List[Dict]:
+    """
+    讀取資料庫中最新的貼文並回填到 Redis（非同步客戶端版本）
+    
+    資料庫查詢在執行緒池中執行，不阻塞事件迴圈
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        db: 資料庫會話
+        category: 貼文類別過濾
+        rows: 回填的行數，預設為 REDIS_WARM_ROWS
+        trigger: 指標中的觸發來源（read / warm）
+    
+    Returns:
+        從資料庫讀出的貼文字典清單（按爬取時間倒序）
+    """
+    rows = rows or settings.REDIS_WARM_ROWS
+    try:
+        posts = await run_in_threadpool(_load_latest_posts, db, category, rows)
+        if posts:
+            await save_posts_to_redis_async(redis, posts)
+        if len(posts) < rows:
+            await redis.set(
+                complete_marker_key(category), len(posts), ex=settings.REDIS_FILL_COMPLETE_TTL
+            )
+    except Exception:
+        post_cache_fills_total.labels(trigger=trigger, status="error").inc()
+        raise
+    
+    _record_fill(trigger, category, len(posts))
+    return posts
+
+
+async def _release_lock(redis: AsyncRedis, key: str, token: str) -> None:
+    """釋放回填鎖"""
+    try:
+        await redis.register_script(RELEASE_LOCK_SCRIPT)(keys=[key], args=[token])
+    except RedisError as e:
+        logger.warning(f"釋放回填鎖失敗（將於逾時後自動釋放）: {e}")
+
+
+def _read_db(
+    session_factory: Callable[[], Session],
+    category: Optional[str],
+    limit: int,
+    offset: int
+) -> List[Dict]:
+    db = session_factory()
+    try:
+        posts = get_posts_from_db(db, category=category, limit=limit, offset=offset)
+        return [post_to_dict(post) for post in posts]
+    finally:
+        db.close()
+
+
+async def get_materialized_page(
+    redis: AsyncRedis,
+    category: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> Optional[bytes]:
+    """
+    讀取預先渲染的列表頁
+    
+    只有 limit 為 LISTING_MATERIALIZED_PAGE_SIZE 且 offset 落在前
+    LISTING_MATERIALIZED_PAGES 頁的頁首時才會查詢 Redis；讀取失敗時返回 None，
+    由呼叫方改為動態組裝
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        category: 貼文類別過濾
+        limit: 返回數量限制
+        offset: 偏移量
+    
+    Returns:
+        序列化後的回應內容，沒有對應頁面時返回 None
+    """
+    page = _materialized_page_number(limit, offset)
+    if page is None:
+        return None
+    try:
+        body = await redis.hget(listing_pages_key(category), str(page))
+    except RedisError as e:
+        logger.warning(f"讀取預先渲染的列表頁失敗: {e}")
+        return None
+    if body is not None:
+        post_cache_requests_total.labels(result="materialized").inc()
+    return body
+
+
+async def get_posts_read_through(
+    redis: AsyncRedis,
+    session_factory: Callable[[], Session],
+    category: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0,
+    raw: bool = False
+) -> Tuple[List[Union[Dict, bytes]], str]:
+    """
+    讀穿快取獲取貼文
+    
+    快取頁面完整（或索引已標記為完整）時直接返回；否則由取得單飛鎖的請求
+    查詢資料庫並回填索引前 max(offset + limit, REDIS_WARM_ROWS) 行，
+    其他請求等待回填完成後再讀快取，冷鍵在高併發下只會觸發一次資料庫查詢。
+    分頁深度超過 REDIS_FILL_MAX_ROWS 或 Redis 不可用時直接查詢資料庫。
+    資料庫會話只在需要查詢時才由 session_factory 創建，查詢後立即關閉
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        session_factory: 唯讀資料庫會話工廠
+        category: 貼文類別過濾
+        limit: 返回數量限制
+        offset: 偏移量
+        raw: 為 True 時從快取讀取的貼文為 JSON 位元組（供 render_listing_page 直接拼接），
+            從資料庫讀取的貼文仍為字典
+    
+    Returns:
+        (貼文清單, 資料來源 cache / db)
+    """
+    depth = offset + limit
+    read_cache = get_post_fragments_from_redis_async if raw else get_posts_from_redis_async
+    try:
+        posts = await read_cache(redis, category=category, limit=limit, offset=offset)
+        if len(posts) >= limit or await redis.exists(complete_marker_key(category)):
+            post_cache_requests_total.labels(result="hit").inc()
+            return posts, "cache"
+        
+        if depth > settings.REDIS_FILL_MAX_ROWS:
+            post_cache_requests_total.labels(result="bypass").inc()
+            return await run_in_threadpool(_read_db, session_factory, category, limit, offset), "db"
+        
+        lock_key = fill_lock_key(category)
+        token = uuid.uuid4().hex
+        if await redis.set(lock_key, token, nx=True, ex=settings.REDIS_FILL_LOCK_SECONDS):
+            post_cache_requests_total.labels(result="miss").inc()
+            db = session_factory()
+            try:
+                filled = await fill_posts_from_db_async(
+                    redis, db, category, rows=max(depth, settings.REDIS_WARM_ROWS)
+                )
+            finally:
+                db.close()
+                await _release_lock(redis, lock_key, token)
+            return filled[offset:depth], "db"
+        
+        # 其他請求正在回填，等待完成後重新讀取快取
+        post_cache_requests_total.labels(result="wait").inc()
+        deadline = time.monotonic() + settings.REDIS_FILL_WAIT_SECONDS
+        while await redis.exists(lock_key) and time.monotonic() < deadline:
+            await asyncio.sleep(FILL_POLL_INTERVAL)
+        
+        posts = await read_cache(redis, category=category, limit=limit, offset=offset)
+        if len(posts) >= limit or await redis.exists(complete_marker_key(category)):
+            return posts, "cache"
+    except RedisError as e:
+        logger.warning(f"Redis 讀取失敗，改從資料庫讀取: {e}")
+    
+    return await run_in_threadpool(_read_db, session_factory, category, limit, offset), "db"
+
+
+def materialize_listing_pages(
+    redis: Redis,
+    category: Optional[str],
+    posts: List[Dict],
+    complete: bool = False
+) -> Optional[int]:
+    """
+    將列表前 LISTING_MATERIALIZED_PAGES 頁渲染為回應內容並寫入 Redis
+    
+    只渲染完整的頁面；complete 表示 posts 已包含該列表的全部貼文，此時最後一個
+    不足一頁的頁面也會渲染。新頁面以 HSET 覆蓋舊頁面，超出新頁數的舊頁面同時刪除
+    
+    Args:
+        redis: Redis 客戶端
+        category: 貼文類別（None 表示全域列表）
+        posts: 按爬取時間倒序的最新貼文字典清單
+        complete: posts 是否為該列表的全部貼文
+    
+    Returns:
+        渲染的頁數
+    """
+    page_count = settings.LISTING_MATERIALIZED_PAGES
+    page_size = settings.LISTING_MATERIALIZED_PAGE_SIZE
+    if page_count <= 0 or page_size <= 0:
+        return 0
+    
+    pages = {}
+    for page in range(page_count):
+        offset = page * page_size
+        rows = posts[offset:offset + page_size]
+        if len(rows) < page_size and not complete:
+            break
+        pages[str(page)] = render_listing_page(rows, category, page_size, offset, "cache")
+        if len(rows) < page_size:
+            break
+    
+    key = listing_pages_key(category)
+    pipe = redis.pipeline(transaction=not is_cluster(redis))
+    if pages:
+        pipe.hset(key, mapping=pages)
+    stale = [str(page) for page in range(len(pages), page_count)]
+    if stale:
+        pipe.hdel(key, *stale)
+    pipe.expire(key, settings.REDIS_POST_TTL)
+    pipe.execute()
+    
+    logger.info(f"已預先渲染 {len(pages)} 個列表頁（類別: {category}）")
+    return len(pages)
+
+
+def bump_listing_version(redis: Redis, category: Optional[str] = None) -> Tuple[int, float]:
+    """
+    遞增列表的內容版本（在快取和預先渲染的頁面寫入之後呼叫）
+    
+    Args:
+        redis: Redis 客戶端
+        category: 貼文類別（None 表示全域列表）
+    
+    Returns:
+        (新的版本號, 更新時間戳)
+    """
+    modified = time.time()
+    key = listing_version_key(category)
+    pipe = redis.pipeline(transaction=not is_cluster(redis))
+    pipe.hincrby(key, "version", 1)
+    pipe.hset(key, "modified", modified)
+    version, _ = pipe.execute()
+    return version, modified
+
+
+async def get_listing_version(
+    redis: AsyncRedis,
+    category: Optional[str] = None
+) -> Optional[Tuple[int, float]]:
+    """
+    讀取列表的內容版本，結果保存在進程內版本快取直到過期或收到失效通知
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        category: 貼文類別（None 表示全域列表）
+    
+    Returns:
+        (版本號, 更新時間戳)，尚未有版本或讀取失敗時返回 None
+    """
+    cached = listing_version_cache.get(category)
+    if cached is None:
+        try:
+            version, modified = await redis.hmget(listing_version_key(category), ["version", "modified"])
+        except RedisError as e:
+            logger.warning(f"讀取列表版本失敗: {e}")
+            return None
+        cached = (int(version or 0), float(modified or 0))
+        listing_version_cache.set(category, cached)
+    return cached if cached[0] else None
+
+
+def warm_post_listing(
+    redis: Redis,
+    db: Session,
+    categories: Iterable[Optional[str]] = ()
+) -> Dict[str, int]:
+    """
+    預熱全域和指定類別列表的前幾頁，預先渲染前 LISTING_MATERIALIZED_PAGES 頁，
+    最後遞增列表的內容版本
+    
+    回填 REDIS_WARM_ROWS 行（不少於預先渲染需要的行數），預熱失敗只記錄日誌，不影響呼叫方
+    
+    Args:
+        redis: Redis 客戶端
+        db: 資料庫會話（應使用主庫，避免讀到副本延遲前的資料）
+        categories: 需要預熱的類別
+    
+    Returns:
+        類別（全域為 "all"）-> 回填的貼文數量
+    """
+    rows = max(
+        settings.REDIS_WARM_ROWS,
+        settings.LISTING_MATERIALIZED_PAGES * settings.LISTING_MATERIALIZED_PAGE_SIZE
+    )
+    warmed = {}
+    for category in [None] + sorted({c for c in categories if c}):
+        try:
+            posts = fill_posts_from_db(redis, db, category, rows=rows, trigger="warm")
+            warmed[category or "all"] = len(posts)
+            materialize_listing_pages(redis, category, posts, complete=len(posts) < rows)
+            bump_listing_version(redis, category)
+        except Exception as e:
+            logger.error(f"預熱貼文快取失敗（類別: {category}）: {e}")
+    return warmed
+
+
+def publish_listing_invalidation(redis: Redis, categories: Iterable[Optional[str]] = ()) -> int:
+    """
+    通知所有 API worker 清空進程內列表快取
+    
+    發布失敗只記錄日誌，各 worker 的快取最多在 LISTING_CACHE_TTL_SECONDS 後過期。
+    各 worker 在 REDIS_URL 的客戶端上訂閱，發布也必須使用同一端點的客戶端（redis_client），
+    REDIS_CACHE_URL 指向另一個端點時發往貼文快取客戶端的通知不會被收到
+    
+    Args:
+        redis: 一般資料的 Redis 客戶端（與訂閱者相同的端點）
+        categories: 有新貼文的類別（僅用於日誌）
+    
+    Returns:
+        收到通知的訂閱者數量
+    """
+    payload = json.dumps({"categories": sorted({c for c in categories if c})})
+    try:
+        receivers = redis.publish(POSTS_INVALIDATION_CHANNEL, payload)
+        logger.info(f"已發布列表快取失效通知 {payload}，{receivers} 個訂閱者")
+        return receivers
+    except RedisError as e:
+        logger.error(f"發布列表快取失效通知失敗: {e}")
+        return 0
+
+
+def invalidate_listing_cache(message: Any = None) -> None:
+    """收到失效通知（或重新訂閱）時清空進程內列表快取和版本快取"""
+    listing_cache.clear()
+    listing_version_cache.clear()
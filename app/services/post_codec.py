@@ -0,0 +1,124 @@
+"""
+貼文快取編碼
+Redis 中貼文內容的序列化格式，可通過 REDIS_POST_CODEC 切換
+
+JSON 內容以 "{" 開頭，其他格式以一個位元組的標籤開頭，
+因此不同格式的資料可以在遷移期間共存並被正確讀取
+"""
+import json
+import zlib
+from typing import Dict, Optional, Union
+from app.core.config import settings
+from app.core.serialization import dumps, loads
+
+try:
+    import msgpack
+except ImportError:  # 可選依賴，只有 msgpack 編碼需要
+    msgpack = None
+
+CODECS = ("json", "msgpack")
+
+TAG_MSGPACK = b"\x01"
+TAG_ZLIB_JSON = b"\x02"
+TAG_ZLIB_MSGPACK = b"\x03"
+
+
+def _require_msgpack() -> None:
+    if msgpack is None:
+        raise RuntimeError("msgpack 編碼需要安裝 msgpack")
+
+
+def encode_post(
+    post: Dict,
+    codec: Optional[str] = None,
+    compress_min_bytes: Optional[int] = None
+) -> bytes:
+    """
+    將貼文編碼為 Redis 儲存的位元組
+
+    Args:
+        post: 貼文數据
+        codec: json 或 msgpack，預設使用配置
+        compress_min_bytes: 編碼後達到此大小才用 zlib 壓縮，0 表示不壓縮
+
+    Returns:
+        編碼後的位元組
+    """
+    codec = codec or settings.REDIS_POST_CODEC
+    if compress_min_bytes is None:
+        compress_min_bytes = settings.REDIS_POST_COMPRESS_MIN_BYTES
+
+    if codec == "json":
+        payload = json.dumps(post, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tag, compressed_tag = b"", TAG_ZLIB_JSON
+    elif codec == "msgpack":
+        _require_msgpack()
+        payload = msgpack.packb(post, use_bin_type=True)
+        tag, compressed_tag = TAG_MSGPACK, TAG_ZLIB_MSGPACK
+    else:
+        raise ValueError(f"不支援的貼文編碼: {codec}")
+
+    if compress_min_bytes and len(payload) >= compress_min_bytes:
+        compressed = zlib.compress(payload)
+        # 壓縮後沒有變小就保留原始格式
+        if len(compressed) + 1 < len(payload) + len(tag):
+            return compressed_tag + compressed
+    return tag + payload
+
+
+def decode_post(data: Union[bytes, str]) -> Dict:
+    """
+    解碼任意支援格式的貼文
+
+    Args:
+        data: Redis 中讀出的值
+
+    Returns:
+        貼文數据
+
+    Raises:
+        ValueError: 資料無法解碼時抛出
+    """
+    if isinstance(data, str):
+        return loads(data)
+    if not data:
+        raise ValueError("空的貼文資料")
+
+    try:
+        tag = data[:1]
+        if tag == b"{":
+            return loads(data)
+        if tag == TAG_MSGPACK:
+            _require_msgpack()
+            return msgpack.unpackb(data[1:], raw=False)
+        if tag == TAG_ZLIB_JSON:
+            return loads(zlib.decompress(data[1:]))
+        if tag == TAG_ZLIB_MSGPACK:
+            _require_msgpack()
+            return msgpack.unpackb(zlib.decompress(data[1:]), raw=False)
+    except (ValueError, zlib.error) as e:
+        raise ValueError(f"解碼貼文資料失敗: {e}") from e
+    raise ValueError(f"未知的貼文編碼標籤: {tag!r}")
+
+
+def post_json_fragment(data: Union[bytes, str]) -> bytes:
+    """
+    返回貼文的 JSON 位元組，用於直接拼接到回應中
+
+    未壓縮的 JSON 內容原樣返回，不經過解碼和重新序列化；
+    其他格式解碼後重新序列化為 JSON
+
+    Args:
+        data: Redis 中讀出的值
+
+    Returns:
+        貼文的 JSON 位元組
+
+    Raises:
+        ValueError: 資料無法解碼時抛出
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data[:1] == b"{" and data[-1:] == b"}":
+        return data
+    return dumps(decode_post(data))
@@ -3,37 +3,338 @@
 處理貼文的儲存和查詢
 """
 from app.models.post import Post
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import Float, cast, func, or_, select, text, tuple_
+from sqlalchemy.sql import Select
 from redis import Redis
-from typing import List, Dict, Optional
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from typing import Any, Iterator, List, Dict, Optional, Tuple
+from datetime import datetime
+import base64
 import json
+import time
 from app.core.config import settings
+from app.core.db import retry_on_primary
 from app.core.logger import get_logger
+from app.core.redis import is_cluster
+from app.core.monitoring import redis_operations_total, redis_pipeline_duration_seconds
+from app.services.post_codec import encode_post, decode_post, post_json_fragment
 
 logger = get_logger(__name__)
 
+POST_COLUMNS = {column.name for column in Post.__table__.columns}
+
+# post_to_dict 輸出的欄位，也是 fields= 投影可選擇的範圍（按輸出順序）
+POST_FIELDS = (
+    "uid", "post_url", "video_url", "image_url",
+    "comments", "reactions", "category", "crawled_at"
+)
+
+# Redis 快取鍵
+# 貼文內容鍵和類別索引以 {類別} 作為 hash tag，Redis Cluster 下同一類別的索引和貼文內容
+# 位於同一個 slot，可以在同一個 pipeline 或 Lua 腳本中讀寫。
+# 全域索引的成員為「類別:UID」，由成員即可推得貼文內容鍵和類別索引鍵
+POSTS_INDEX_KEY = "posts:index"  # 全部貼文的時間索引（sorted set）
+POSTS_CLEANUP_CURSOR_KEY = "posts:cleanup:cursor"  # 索引清理的 ZSCAN 游標
+NO_CATEGORY = "_"  # 沒有類別的貼文使用的 hash tag
+# 改用「類別:UID」之前寫入的全域索引成員只有 UID，解析時以此類別標記。
+# 這類成員對應的貼文鍵已不再使用，讀取和清理時一律視為過期並以原始成員移除
+LEGACY_CATEGORY = ""
+# 時間範圍查詢跳過游標之前的同分成員時，每次讀取數量的上限
+RANGE_TIE_SCAN_MAX = 1000
+
+
+def _as_str(value: Any) -> str:
+    """二進位客戶端返回 bytes，統一轉為字串"""
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def post_key(uid: str, category: Optional[str] = None) -> str:
+    """貼文內容的快取鍵（與類別索引位於同一個 slot）"""
+    return f"post:{{{category or NO_CATEGORY}}}:{uid}"
+
+
+def category_index_key(category: str) -> str:
+    """單一類別的時間索引鍵"""
+    return f"posts:index:{{{category}}}"
+
+
+def index_member(uid: str, category: Optional[str] = None) -> str:
+    """貼文在全域索引中的成員"""
+    return f"{category or NO_CATEGORY}:{uid}"
+
+
+def parse_index_member(member: Any) -> Tuple[Optional[str], str]:
+    """
+    解析全域索引的成員
+    
+    Returns:
+        (類別, UID)，沒有類別時類別為 None，舊格式成員的類別為 LEGACY_CATEGORY
+    """
+    category, sep, uid = _as_str(member).partition(":")
+    if not sep:
+        return LEGACY_CATEGORY, category
+    return (None if category == NO_CATEGORY else category), uid
+
+
+def _raw_member(category: Optional[str], uid: str) -> str:
+    """還原 parse_index_member 解析前的全域索引成員"""
+    return uid if category == LEGACY_CATEGORY else index_member(uid, category)
+
+
+def _live_keys(posts: List[Tuple[Optional[str], str]]) -> List[str]:
+    """需要讀取內容的貼文鍵，舊格式成員沒有對應的鍵"""
+    return [post_key(uid, category) for category, uid in posts if category != LEGACY_CATEGORY]
+
+
+def _align_values(posts: List[Tuple[Optional[str], str]], values: List[Any]) -> List[Any]:
+    """將 _live_keys 的讀取結果對齊回貼文清單，舊格式成員的位置補 None"""
+    values = iter(values)
+    return [None if category == LEGACY_CATEGORY else next(values) for category, _ in posts]
+
+
+def _use_transaction(redis: Any) -> bool:
+    """Redis Cluster 的 pipeline 不支援 MULTI/EXEC，此時一律以非交易模式送出"""
+    return settings.REDIS_PIPELINE_TRANSACTION and not is_cluster(redis)
+
+
+def _mget(redis: Any, keys: List[str]) -> Any:
+    """
+    批次讀取貼文內容
+    
+    Cluster 模式下全域索引的貼文分佈在多個 slot，改用 mget_nonatomic 按 slot 分組讀取；
+    非同步客戶端返回可等待物件
+    """
+    return redis.mget_nonatomic(keys) if is_cluster(redis) else redis.mget(keys)
+
+
+def _queue_prune(pipe: Any, expired: List[Tuple[Optional[str], str]]) -> None:
+    """將移除過期貼文的 ZREM 加入 pipeline"""
+    pipe.zrem(POSTS_INDEX_KEY, *[_raw_member(category, uid) for category, uid in expired])
+    by_category: Dict[str, List[str]] = {}
+    for category, uid in expired:
+        if category:
+            by_category.setdefault(category, []).append(uid)
+    for category, uids in by_category.items():
+        pipe.zrem(category_index_key(category), *uids)
+
+
+def prune_index_members(redis: Redis, expired: List[Tuple[Optional[str], str]]) -> None:
+    """
+    從全域索引和所屬類別索引中移除已過期的貼文
+    
+    Args:
+        redis: Redis 客戶端
+        expired: 要移除的 (類別, UID) 清單
+    """
+    if not expired:
+        return
+    pipe = redis.pipeline(transaction=False)
+    _queue_prune(pipe, expired)
+    pipe.execute()
+
+
+async def prune_index_members_async(
+    redis: AsyncRedis,
+    expired: List[Tuple[Optional[str], str]]
+) -> None:
+    """從全域索引和所屬類別索引中移除已過期的貼文（非同步客戶端版本）"""
+    if not expired:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        _queue_prune(pipe, expired)
+        await pipe.execute()
+
+
+def post_to_dict(post: Post) -> Dict:
+    """
+    将 ORM 貼文物件轉換為 API 回應使用的字典
+    
+    Args:
+        post: 貼文物件
+    
+    Returns:
+        貼文字典
+    """
+    return {
+        "uid": post.uid,
+        "post_url": post.post_url,
+        "video_url": post.video_url,
+        "image_url": post.image_url,
+        "comments": post.comments,
+        "reactions": post.reactions,
+        "category": post.category,
+        "crawled_at": post.crawled_at.isoformat() if post.crawled_at else None
+    }
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    解析 fields= 投影參數
+    
+    Args:
+        fields: 逗號分隔的欄位名稱，未提供或為空時表示全部欄位
+    
+    Returns:
+        按 POST_FIELDS 順序排列的欄位，全部欄位時返回 None
+    
+    Raises:
+        ValueError: 包含不支援的欄位時抛出
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(POST_FIELDS)
+    if unknown:
+        raise ValueError(f"不支援的欄位: {', '.join(sorted(unknown))}（可選: {', '.join(POST_FIELDS)}）")
+    if not requested or requested == set(POST_FIELDS):
+        return None
+    return tuple(name for name in POST_FIELDS if name in requested)
+
+
+def project_post(post: Dict, fields: Tuple[str, ...]) -> Dict:
+    """
+    只保留指定欄位
+    
+    爬蟲寫入快取的貼文只有 timestamp，要求 crawled_at 時由 timestamp 推導
+    
+    Args:
+        post: 貼文字典
+        fields: parse_fields 返回的欄位
+    
+    Returns:
+        投影後的貼文字典
+    """
+    projected = {name: post.get(name) for name in fields}
+    if "crawled_at" in projected and projected["crawled_at"] is None and post.get("timestamp"):
+        projected["crawled_at"] = datetime.utcfromtimestamp(float(post["timestamp"])).isoformat()
+    return projected
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    将鍵集分頁的排序鍵編碼為不透明游標
+    
+    Args:
+        values: 排序鍵值（datetime 會轉為 ISO 字串）
+    
+    Returns:
+        URL 安全的 base64 游標字串
+    """
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    解碼 encode_cursor 生成的游標
+    
+    Args:
+        cursor: 游標字串
+    
+    Returns:
+        排序鍵值清單（不做型別還原）
+    
+    Raises:
+        ValueError: 游標格式無效時抛出
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"無效的游標: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"無效的游標: {cursor}")
+    return values
+
+
+def post_timestamp(post: Dict) -> float:
+    """
+    返回貼文的排序時間戳（Unix 秒）
+    
+    優先使用爬蟲寫入的 timestamp，其次是 crawled_at，都沒有時使用目前時間
+    
+    Args:
+        post: 貼文數据
+    
+    Returns:
+        Unix 時間戳
+    """
+    timestamp = post.get("timestamp")
+    if timestamp:
+        return float(timestamp)
+    crawled_at = post.get("crawled_at")
+    if isinstance(crawled_at, str):
+        crawled_at = datetime.fromisoformat(crawled_at)
+    if isinstance(crawled_at, datetime):
+        return to_timestamp(crawled_at)
+    return time.time()
+
+
+def to_timestamp(value: datetime) -> float:
+    """將 datetime 轉為 Unix 時間戳，無時區的值視為 UTC（與 crawled_at 一致）"""
+    if value.tzinfo is not None:
+        return value.timestamp()
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def _to_post_row(data: Dict) -> Dict:
+    """只保留 posts 表的欄位，並由 timestamp 推導 crawled_at"""
+    row = {key: value for key, value in data.items() if key in POST_COLUMNS}
+    if row.get("crawled_at") is None and data.get("timestamp"):
+        row["crawled_at"] = datetime.utcfromtimestamp(float(data["timestamp"]))
+    return row
+
+
+def _lock_post_uids(db: Session, uids: List[str]) -> None:
+    """
+    在目前交易中對 UID 加 PostgreSQL advisory lock，直到提交或回滾時釋放
+    
+    分區表的主鍵是 (uid, crawled_at)，資料庫不再保證 uid 唯一；同步爬取和 Celery 任務
+    同時寫入同一頁面時，先加鎖再檢查是否存在才不會重複寫入。鎖按雜湊值排序後取得，
+    不同交易的加鎖順序一致，不會互相死鎖
+    """
+    if not uids or db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text(
+            "SELECT pg_advisory_xact_lock(key) FROM ("
+            "SELECT DISTINCT hashtext(uid) AS key FROM unnest(CAST(:uids AS text[])) AS uid "
+            "ORDER BY key) AS keys"
+        ),
+        {"uids": uids}
+    )
+
 
 def save_posts_to_db(db: Session, posts: List[Dict]) -> int:
     """
     将貼文儲存到資料庫
     
+    同一 UID 只保存一次：寫入前先對本批 UID 加 advisory lock（PostgreSQL），
+    並略過批次內重複的 UID
+    
     Args:
         db: 資料庫會話
         posts: 貼文數据清單
-        
+    
     Returns:
         成功儲存的貼文數量
     """
     saved_count = 0
+    seen = set()
     try:
+        _lock_post_uids(db, [data["uid"] for data in posts if data.get("uid")])
         for data in posts:
             try:
-                # 檢查是否已存在
-                existing = db.query(Post).filter(Post.uid == data["uid"]).first()
+                # 檢查是否已存在（包含本批已加入的貼文）
+                existing = data["uid"] in seen or db.query(Post).filter(Post.uid == data["uid"]).first()
                 if not existing:
-                    db_post = Post(**data)
+                    db_post = Post(**_to_post_row(data))
                     db.add(db_post)
+                    seen.add(data["uid"])
                     saved_count += 1
                 else:
                     logger.debug(f"貼文已存在，跳過: {data['uid']}")
@@ -44,7 +345,7 @@ def save_posts_to_db(db: Session, posts: List[Dict]) -> int:
         db.commit()
         logger.info(f"成功儲存 {saved_count} 條貼文到資料庫")
         return saved_count
-        
+    
     except SQLAlchemyError as e:
         db.rollback()
         logger.error(f"資料庫儲存失敗: {e}")
@@ -55,43 +356,343 @@ def save_posts_to_db(db: Session, posts: List[Dict]) -> int:
         raise
 
 
+def _queue_post_batch(pipe: Any, batch: List[Dict]) -> int:
+    """
+    將一批貼文的 SETEX 與索引 ZADD 加入 pipeline（同步或非同步 pipeline 皆可）
+    
+    Returns:
+        加入 pipeline 的貼文數量
+    """
+    scores = {}
+    category_scores: Dict[str, Dict[str, float]] = {}
+    for post in batch:
+        try:
+            # 設定带過期時間的快取
+            pipe.setex(
+                post_key(post['uid'], post.get('category')),
+                settings.REDIS_POST_TTL,
+                encode_post(post)
+            )
+            score = post_timestamp(post)
+            scores[index_member(post['uid'], post.get('category'))] = score
+            if post.get('category'):
+                category_scores.setdefault(post['category'], {})[post['uid']] = score
+        except Exception as e:
+            logger.error(f"序列化貼文失敗: {e}, 數据: {post}")
+            continue
+    
+    if not scores:
+        return 0
+    # 添加到全域和類別索引（使用 ZADD 可以按時間排序）
+    pipe.zadd(POSTS_INDEX_KEY, scores)
+    for category, members in category_scores.items():
+        pipe.zadd(category_index_key(category), members)
+    return len(scores)
+
+
+def _post_batches(posts: List[Dict]) -> Iterator[List[Dict]]:
+    """按 REDIS_PIPELINE_BATCH_SIZE 將貼文分批"""
+    batch_size = max(settings.REDIS_PIPELINE_BATCH_SIZE, 1)
+    for start in range(0, len(posts), batch_size):
+        yield posts[start:start + batch_size]
+
+
+def _record_post_batch(queued: int, started: float, error: Optional[Exception]) -> int:
+    """
+    記錄一批貼文寫入的指標和日誌（同步和非同步版本共用）
+    
+    Returns:
+        成功儲存的貼文數量
+    """
+    redis_pipeline_duration_seconds.labels(operation="save_posts").observe(
+        time.perf_counter() - started
+    )
+    if error is not None:
+        redis_operations_total.labels(operation="save_posts", status="error").inc()
+        logger.error(f"批次儲存 {queued} 條貼文到 Redis 失敗: {error}")
+        return 0
+    redis_operations_total.labels(operation="save_posts", status="success").inc()
+    return queued
+
+
 def save_posts_to_redis(redis: Redis, posts: List[Dict]) -> int:
     """
     将貼文儲存到 Redis 快取
     
+    每批貼文的 SETEX 與全域/類別索引的 ZADD 合併在同一個 pipeline 中送出
+    （REDIS_PIPELINE_TRANSACTION 開啟且非 Cluster 模式時以 MULTI/EXEC 原子執行），
+    索引分數為貼文的爬取時間戳
+    
     Args:
         redis: Redis 客戶端
         posts: 貼文數据清單
-        
+    
     Returns:
         成功儲存的貼文數量
     """
     saved_count = 0
     try:
-        for post in posts:
-            try:
-                key = f"post:{post['uid']}"
-                # 設定带過期時間的快取
-                redis.setex(
-                    key,
-                    settings.REDIS_POST_TTL,
-                    json.dumps(post, ensure_ascii=False)
-                )
-                # 添加到索引清單（使用 ZADD 可以按時間排序）
-                redis.zadd("posts:index", {post['uid']: post.get('timestamp', 0)})
-                saved_count += 1
-            except Exception as e:
-                logger.error(f"儲存單條貼文到 Redis 失敗: {e}, 數据: {post}")
+        for batch in _post_batches(posts):
+            pipe = redis.pipeline(transaction=_use_transaction(redis))
+            queued = _queue_post_batch(pipe, batch)
+            if not queued:
                 continue
+            
+            started = time.perf_counter()
+            error = None
+            try:
+                pipe.execute()
+            except RedisError as e:
+                error = e
+            saved_count += _record_post_batch(queued, started, error)
         
         logger.info(f"成功儲存 {saved_count} 條貼文到 Redis")
         return saved_count
-        
+    
     except Exception as e:
         logger.error(f"儲存貼文到 Redis 時出錯: {e}")
         raise
 
 
+async def save_posts_to_redis_async(redis: AsyncRedis, posts: List[Dict]) -> int:
+    """
+    将貼文儲存到 Redis 快取（非同步客戶端版本，行為與 save_posts_to_redis 相同）
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        posts: 貼文數据清單
+    
+    Returns:
+        成功儲存的貼文數量
+    """
+    saved_count = 0
+    for batch in _post_batches(posts):
+        async with redis.pipeline(transaction=_use_transaction(redis)) as pipe:
+            queued = _queue_post_batch(pipe, batch)
+            if not queued:
+                continue
+            
+            started = time.perf_counter()
+            error = None
+            try:
+                await pipe.execute()
+            except RedisError as e:
+                error = e
+            saved_count += _record_post_batch(queued, started, error)
+    
+    logger.info(f"成功儲存 {saved_count} 條貼文到 Redis")
+    return saved_count
+
+
+# 讀取一頁快取貼文：在伺服器端完成範圍讀取、存在性檢查、補齊、索引清理和內容讀取，
+# 整個過程只需一次往返且不會與並發寫入交錯。
+# 鍵的格式與 post_key / category_index_key / index_member 一致
+# KEYS[1] 讀取的索引, KEYS[2] 全域索引（讀取類別索引且需要同步清理全域索引時）
+# ARGV[1] 起始位置, ARGV[2] 頁面大小, ARGV[3] 最大輪數,
+# ARGV[4] 類別（空字串表示讀取全域索引，成員為「類別:UID」）, ARGV[5] 是否同步清理另一側索引（1/0）
+FETCH_PAGE_SCRIPT = """
+local position = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local category = ARGV[4]
+local page = {}
+local expired = {}
+local expired_categories = {}
+local expired_uids = {}
+for _ = 1, tonumber(ARGV[3]) do
+    local need = limit - #page
+    local members = redis.call('ZREVRANGE', KEYS[1], position, position + need - 1)
+    if #members == 0 then
+        break
+    end
+    position = position + #members
+    local categories = {}
+    local uids = {}
+    local keys = {}
+    for i, member in ipairs(members) do
+        if category == '' then
+            local sep = string.find(member, ':', 1, true)
+            if sep then
+                categories[i] = string.sub(member, 1, sep - 1)
+                uids[i] = string.sub(member, sep + 1)
+            else
+                -- 舊格式成員只有 UID，沒有對應的貼文鍵，直接視為過期
+                categories[i] = false
+                uids[i] = member
+            end
+        else
+            categories[i] = category
+            uids[i] = member
+        end
+        if categories[i] then
+            keys[#keys + 1] = 'post:{' .. categories[i] .. '}:' .. uids[i]
+        end
+    end
+    local bodies = {}
+    if #keys > 0 then
+        bodies = redis.call('MGET', unpack(keys))
+    end
+    local read = 0
+    for i, member in ipairs(members) do
+        local body = false
+        if categories[i] then
+            read = read + 1
+            body = bodies[read]
+        end
+        if body then
+            page[#page + 1] = body
+        else
+            expired[#expired + 1] = member
+            expired_categories[#expired] = categories[i]
+            expired_uids[#expired] = uids[i]
+        end
+    end
+    if #page >= limit or #members < need then
+        break
+    end
+end
+if #expired > 0 then
+    redis.call('ZREM', KEYS[1], unpack(expired))
+    if ARGV[5] == '1' then
+        for i = 1, #expired do
+            if category == '' then
+                if expired_categories[i] and expired_categories[i] ~= '_' then
+                    redis.call('ZREM', 'posts:index:{' .. expired_categories[i] .. '}', expired_uids[i])
+                end
+            else
+                redis.call('ZREM', KEYS[2], category .. ':' .. expired_uids[i])
+            end
+        end
+    end
+end
+return page
+"""
+
+
+def _fetch_page_params(
+    redis: Any,
+    category: Optional[str],
+    limit: int,
+    offset: int
+) -> Tuple[List[str], List[Any]]:
+    """
+    FETCH_PAGE_SCRIPT 的 KEYS 與 ARGV
+    
+    Cluster 模式下腳本只能存取同一個 slot 的鍵，類別索引的過期成員由腳本清理，
+    全域索引中對應的成員留給定期的索引清理任務
+    """
+    prune_other = not (category and is_cluster(redis))
+    if category:
+        keys = [category_index_key(category)]
+        if prune_other:
+            keys.append(POSTS_INDEX_KEY)
+    else:
+        keys = [POSTS_INDEX_KEY]
+    args = [
+        offset,
+        limit,
+        max(settings.REDIS_READ_MAX_ROUNDS, 1),
+        category or "",
+        1 if prune_other else 0
+    ]
+    return keys, args
+
+
+class _GlobalPageReader:
+    """
+    Cluster 模式下全域列表一頁的讀取狀態（不做 I/O，同步和非同步版本共用）
+    
+    與 FETCH_PAGE_SCRIPT 相同的補齊流程：每輪以 ZREVRANGE 讀取不足的數量，
+    缺少內容的成員記為過期並繼續向後補齊，最多 REDIS_READ_MAX_ROUNDS 輪
+    """
+    
+    def __init__(self, limit: int, offset: int):
+        self.limit = limit
+        self.position = offset
+        self.rounds = max(settings.REDIS_READ_MAX_ROUNDS, 1)
+        self.page: List[Any] = []
+        self.expired: List[Tuple[Optional[str], str]] = []
+        self._done = False
+        self._need = 0
+        self._posts: List[Tuple[Optional[str], str]] = []
+    
+    def next_range(self) -> Optional[Tuple[int, int]]:
+        """下一次 ZREVRANGE 的 (start, end)，頁面已完成時返回 None"""
+        if self._done or self.rounds <= 0 or len(self.page) >= self.limit:
+            return None
+        self.rounds -= 1
+        self._need = self.limit - len(self.page)
+        return self.position, self.position + self._need - 1
+    
+    def add_members(self, members: List[Any]) -> List[str]:
+        """處理讀出的索引成員，返回需要讀取內容的貼文鍵"""
+        self.position += len(members)
+        if len(members) < self._need:
+            self._done = True
+        self._posts = [parse_index_member(member) for member in members]
+        return _live_keys(self._posts)
+    
+    def add_bodies(self, bodies: List[Any]) -> None:
+        """將讀取結果分為頁面內容和過期貼文"""
+        for entry, data in zip(self._posts, _align_values(self._posts, bodies)):
+            if data:
+                self.page.append(data)
+            else:
+                self.expired.append(entry)
+
+
+def _fetch_global_page_cluster(redis: Any, limit: int, offset: int) -> List[Any]:
+    """
+    Cluster 模式下讀取全域索引的一頁貼文內容
+    
+    全域索引的貼文分佈在所有 slot，無法在單一腳本中讀取，
+    改為在客戶端執行與 FETCH_PAGE_SCRIPT 相同的補齊和清理流程
+    """
+    reader = _GlobalPageReader(limit, offset)
+    while True:
+        span = reader.next_range()
+        if span is None:
+            break
+        keys = reader.add_members(redis.zrevrange(POSTS_INDEX_KEY, *span))
+        reader.add_bodies(redis.mget_nonatomic(keys) if keys else [])
+    prune_index_members(redis, reader.expired)
+    return reader.page
+
+
+async def _fetch_global_page_cluster_async(redis: Any, limit: int, offset: int) -> List[Any]:
+    """Cluster 模式下讀取全域索引的一頁貼文內容（非同步客戶端版本）"""
+    reader = _GlobalPageReader(limit, offset)
+    while True:
+        span = reader.next_range()
+        if span is None:
+            break
+        keys = reader.add_members(await redis.zrevrange(POSTS_INDEX_KEY, *span))
+        reader.add_bodies(await redis.mget_nonatomic(keys) if keys else [])
+    await prune_index_members_async(redis, reader.expired)
+    return reader.page
+
+
+def _decode_posts(bodies: List[Any]) -> List[Dict]:
+    """解碼一批貼文內容，略過無法解析的項目"""
+    results = []
+    for data in bodies:
+        try:
+            results.append(decode_post(data))
+        except ValueError as e:
+            logger.error(f"解析貼文數据失敗: {e}")
+    return results
+
+
+def _json_fragments(bodies: List[Any]) -> List[bytes]:
+    """將一批貼文內容轉為 JSON 位元組（JSON 編碼的內容不解碼），略過無法解析的項目"""
+    results = []
+    for data in bodies:
+        try:
+            results.append(post_json_fragment(data))
+        except ValueError as e:
+            logger.error(f"解析貼文數据失敗: {e}")
+    return results
+
+
 def get_posts_from_redis(
     redis: Redis,
     category: Optional[str] = None,
@@ -101,76 +702,696 @@ def get_posts_from_redis(
     """
     從 Redis 獲取貼文
     
+    指定類別時直接讀取該類別的索引，limit/offset 與索引位置一一對應。
+    讀取由 FETCH_PAGE_SCRIPT 以 EVALSHA 在伺服器端原子執行：過期的 UID 造成頁面不足時
+    繼續向後補齊（最多 REDIS_READ_MAX_ROUNDS 輪），並從全域和類別索引中清理過期 UID。
+    伺服器的腳本快取被清空時（NOSCRIPT）會自動重新載入腳本。
+    Cluster 模式下全域列表改由客戶端分步讀取
+    
     Args:
         redis: Redis 客戶端
         category: 貼文類別別過濾
         limit: 返回數量限制
         offset: 偏移量
-        
+    
     Returns:
         貼文清單
     """
     try:
-        # 獲取索引中的 UID（按分數倒序）
-        uids = redis.zrevrange("posts:index", offset, offset + limit * 2 - 1)
-        results = []
-        
-        for uid in uids:
-            if len(results) >= limit:
-                break
-            
-            data = redis.get(f"post:{uid}")
-            if not data:
-                # 如果快取過期，從索引中刪除
-                redis.zrem("posts:index", uid)
-                continue
-            
-            try:
-                post = json.loads(data)
-                # 類別別過濾
-                if category and post.get("category") != category:
-                    continue
-                results.append(post)
-            except json.JSONDecodeError as e:
-                logger.error(f"解析貼文數据失敗: {e}, UID: {uid}")
-                continue
-        
+        results = _decode_posts(_fetch_page_bodies(redis, category, limit, offset))
         logger.info(f"從 Redis 獲取了 {len(results)} 條貼文")
         return results
-        
+    
+    except Exception as e:
+        logger.error(f"從 Redis 獲取貼文時出錯: {e}")
+        return []
+
+
+def _fetch_page_bodies(
+    redis: Redis,
+    category: Optional[str],
+    limit: int,
+    offset: int
+) -> List[Any]:
+    """讀取一頁貼文的原始內容"""
+    started = time.perf_counter()
+    try:
+        if not category and is_cluster(redis):
+            return _fetch_global_page_cluster(redis, limit, offset)
+        keys, args = _fetch_page_params(redis, category, limit, offset)
+        return redis.register_script(FETCH_PAGE_SCRIPT)(keys=keys, args=args)
+    finally:
+        redis_pipeline_duration_seconds.labels(operation="fetch_page").observe(
+            time.perf_counter() - started
+        )
+
+
+async def _fetch_page_bodies_async(
+    redis: AsyncRedis,
+    category: Optional[str],
+    limit: int,
+    offset: int
+) -> List[Any]:
+    """讀取一頁貼文的原始內容（非同步客戶端）"""
+    started = time.perf_counter()
+    try:
+        if not category and is_cluster(redis):
+            return await _fetch_global_page_cluster_async(redis, limit, offset)
+        keys, args = _fetch_page_params(redis, category, limit, offset)
+        return await redis.register_script(FETCH_PAGE_SCRIPT)(keys=keys, args=args)
+    finally:
+        redis_pipeline_duration_seconds.labels(operation="fetch_page").observe(
+            time.perf_counter() - started
+        )
+
+
+async def get_posts_from_redis_async(
+    redis: AsyncRedis,
+    category: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> List[Dict]:
+    """
+    從 Redis 獲取貼文（非同步客戶端版本，行為與 get_posts_from_redis 相同）
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        category: 貼文類別別過濾
+        limit: 返回數量限制
+        offset: 偏移量
+    
+    Returns:
+        貼文清單
+    """
+    try:
+        results = _decode_posts(await _fetch_page_bodies_async(redis, category, limit, offset))
+        logger.info(f"從 Redis 獲取了 {len(results)} 條貼文")
+        return results
+    
+    except Exception as e:
+        logger.error(f"從 Redis 獲取貼文時出錯: {e}")
+        return []
+
+
+async def get_post_fragments_from_redis_async(
+    redis: AsyncRedis,
+    category: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0
+) -> List[bytes]:
+    """
+    從 Redis 獲取貼文的 JSON 位元組（讀取方式與 get_posts_from_redis_async 相同）
+    
+    JSON 編碼的貼文內容不解碼，由呼叫方直接拼接到回應中
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        category: 貼文類別別過濾
+        limit: 返回數量限制
+        offset: 偏移量
+    
+    Returns:
+        貼文 JSON 位元組清單
+    """
+    try:
+        results = _json_fragments(await _fetch_page_bodies_async(redis, category, limit, offset))
+        logger.info(f"從 Redis 獲取了 {len(results)} 條貼文")
+        return results
+    
     except Exception as e:
         logger.error(f"從 Redis 獲取貼文時出錯: {e}")
         return []
 
 
+def cleanup_expired_index_members(
+    redis: Redis,
+    batch_size: Optional[int] = None,
+    time_budget: Optional[float] = None
+) -> Dict:
+    """
+    以 ZSCAN 分批走訪全域索引，清理內容已過期的貼文 UID
+    
+    每批成員以 pipeline 的 EXISTS 檢查是否仍有快取內容，過期者從全域和類別索引中移除
+    （Cluster 模式下讀取類別列表時不會清理全域索引，由此任務負責）。
+    超過時間預算時將 ZSCAN 游標保存在 POSTS_CLEANUP_CURSOR_KEY，下次從該位置繼續；
+    走訪完整個索引後刪除游標，下次重新開始
+    
+    Args:
+        redis: Redis 客戶端
+        batch_size: 每批 ZSCAN 的成員數量，預設使用配置
+        time_budget: 本次執行的時間上限（秒），預設使用配置；至少處理一批
+    
+    Returns:
+        本次執行的統計資訊
+    """
+    batch_size = max(batch_size or settings.REDIS_CLEANUP_BATCH_SIZE, 1)
+    if time_budget is None:
+        time_budget = settings.REDIS_CLEANUP_TIME_BUDGET_SECONDS
+    
+    saved = redis.get(POSTS_CLEANUP_CURSOR_KEY)
+    cursor = int(saved) if saved else 0
+    deadline = time.monotonic() + time_budget
+    scanned = 0
+    pruned = 0
+    categories = set()
+    
+    while True:
+        started = time.perf_counter()
+        cursor, members = redis.zscan(POSTS_INDEX_KEY, cursor, count=batch_size)
+        entries = [parse_index_member(member) for member, _ in members]
+        if entries:
+            pipe = redis.pipeline(transaction=False)
+            for key in _live_keys(entries):
+                pipe.exists(key)
+            exists = _align_values(entries, pipe.execute())
+            expired = [entry for entry, alive in zip(entries, exists) if not alive]
+            prune_index_members(redis, expired)
+            scanned += len(entries)
+            pruned += len(expired)
+            categories.update(category for category, _ in expired if category)
+        redis_pipeline_duration_seconds.labels(operation="cleanup").observe(
+            time.perf_counter() - started
+        )
+        
+        if cursor == 0 or time.monotonic() >= deadline:
+            break
+    
+    completed = cursor == 0
+    if completed:
+        redis.delete(POSTS_CLEANUP_CURSOR_KEY)
+    else:
+        redis.set(POSTS_CLEANUP_CURSOR_KEY, cursor)
+    
+    logger.info(
+        f"索引清理{'完成一輪' if completed else '暫停'}：檢查 {scanned} 個，清理 {pruned} 個過期貼文"
+    )
+    return {
+        "scanned": scanned,
+        "deleted_count": pruned,
+        "categories": sorted(categories),
+        "cursor": cursor,
+        "completed": completed
+    }
+
+
+def _range_query_bounds(
+    category: Optional[str],
+    since: Optional[float],
+    until: Optional[float],
+    cursor: Optional[str]
+) -> Tuple[str, Any, Any, Optional[Tuple[float, str]]]:
+    """
+    解析時間範圍查詢的索引鍵、分數上下限和游標
+    
+    Returns:
+        (索引鍵, 最大分數, 最小分數, 游標位置 (score, 索引成員))
+    
+    Raises:
+        ValueError: 游標格式無效時抛出
+    """
+    after = None
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 2:
+            raise ValueError(f"無效的游標: {cursor}")
+        after = (float(values[0]), str(values[1]))
+    
+    index_key = category_index_key(category) if category else POSTS_INDEX_KEY
+    max_score = f"({until}" if until is not None else "+inf"
+    if after and (until is None or after[0] < until):
+        max_score = after[0]
+    min_score = since if since is not None else "-inf"
+    return index_key, max_score, min_score, after
+
+
+def _skip_returned(
+    entries: List[Tuple[Any, float]],
+    after: Optional[Tuple[float, str]]
+) -> List[Tuple[str, float]]:
+    """同分成員按成員字串倒序排列，跳過游標及之前已返回的成員"""
+    entries = [(_as_str(member), score) for member, score in entries]
+    if not after:
+        return entries
+    return [
+        (member, score) for member, score in entries
+        if not (score == after[0] and member >= after[1])
+    ]
+
+
+def _entry_posts(
+    category: Optional[str],
+    entries: List[Tuple[str, float]]
+) -> List[Tuple[Optional[str], str]]:
+    """將索引成員轉為 (類別, UID)：類別索引的成員即為 UID，全域索引的成員需要解析"""
+    if category:
+        return [(category, member) for member, _ in entries]
+    return [parse_index_member(member) for member, _ in entries]
+
+
+class _RangePageReader:
+    """
+    時間範圍查詢一頁的讀取狀態（不做 I/O，同步和非同步版本共用）
+    
+    每輪以 ZREVRANGEBYSCORE ... LIMIT 讀取不足的數量，跳過游標之前已返回的同分成員，
+    缺少內容的貼文記為過期並繼續向後補齊，最多 REDIS_READ_MAX_ROUNDS 輪。
+    整批都是已返回的同分成員時不計入輪數，並加倍下一批的讀取數量（上限 RANGE_TIE_SCAN_MAX），
+    直到讀到新成員或索引讀完，避免同分成員過多時游標停滯
+    """
+    
+    def __init__(
+        self,
+        category: Optional[str],
+        limit: int,
+        since: Optional[float],
+        until: Optional[float],
+        cursor: Optional[str]
+    ):
+        self.category = category
+        self.limit = limit
+        self.cursor = cursor
+        self.index_key, self.max_score, self.min_score, self.after = _range_query_bounds(
+            category, since, until, cursor
+        )
+        self.rounds = max(settings.REDIS_READ_MAX_ROUNDS, 1)
+        self.position = 0
+        self.results: List[Dict] = []
+        self.expired: List[Tuple[Optional[str], str]] = []
+        self.exhausted = False
+        self._last_seen: Optional[Tuple[str, float]] = None
+        self._need = 0
+        self._num = 0
+        self._tie_scan = 0
+        self._posts: List[Tuple[Optional[str], str]] = []
+    
+    def next_query(self) -> Optional[Dict[str, Any]]:
+        """下一次 ZREVRANGEBYSCORE 的參數，頁面已完成時返回 None"""
+        if self.exhausted or self.rounds <= 0 or len(self.results) >= self.limit:
+            return None
+        self.rounds -= 1
+        self._need = self.limit - len(self.results)
+        self._num = max(self._need, self._tie_scan)
+        return {
+            "name": self.index_key,
+            "max": self.max_score,
+            "min": self.min_score,
+            "start": self.position,
+            "num": self._num,
+            "withscores": True
+        }
+    
+    def add_entries(self, entries: List[Tuple[Any, float]]) -> List[str]:
+        """處理讀出的索引成員，返回需要讀取內容的貼文鍵"""
+        fresh = _skip_returned(entries, self.after)
+        # 已返回的同分成員排在最前面，多讀的新成員留給下一輪
+        skipped = len(entries) - len(fresh)
+        fresh = fresh[:self._need]
+        consumed = skipped + len(fresh)
+        self.position += consumed
+        if len(entries) < self._num and consumed == len(entries):
+            self.exhausted = True
+        
+        if fresh:
+            self._last_seen = fresh[-1]
+            self._tie_scan = 0
+        elif entries and not self.exhausted:
+            self.rounds += 1
+            self._tie_scan = min(self._num * 2, RANGE_TIE_SCAN_MAX)
+        
+        self._posts = _entry_posts(self.category, fresh)
+        return _live_keys(self._posts)
+    
+    def add_bodies(self, bodies: List[Any]) -> None:
+        """解碼 MGET 結果，缺少內容的貼文記為過期"""
+        for (category, uid), data in zip(self._posts, _align_values(self._posts, bodies)):
+            if not data:
+                self.expired.append((category, uid))
+                continue
+            try:
+                self.results.append(decode_post(data))
+            except ValueError as e:
+                logger.error(f"解析貼文數据失敗: {e}, UID: {uid}")
+    
+    def next_cursor(self) -> Optional[str]:
+        """計算下一頁游標，沒有更多貼文時為 None"""
+        if self.exhausted:
+            return None
+        if self._last_seen:
+            return encode_cursor([self._last_seen[1], self._last_seen[0]])
+        # 沒有讀到任何新成員，沿用原游標的位置繼續
+        return self.cursor
+
+
+def get_posts_range_from_redis(
+    redis: Redis,
+    category: Optional[str] = None,
+    limit: int = 10,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    按爬取時間範圍從 Redis 獲取貼文
+    
+    使用 ZREVRANGEBYSCORE ... LIMIT 讀取（全域或類別）索引，並以
+    (score, 索引成員) 作為游標：下一頁從游標的分數開始讀取並跳過已返回的同分成員，
+    因此有新貼文寫入時分頁也不會重複或遺漏
+    
+    Args:
+        redis: Redis 客戶端
+        category: 貼文類別別過濾
+        limit: 返回數量限制
+        since: 只返回爬取時間戳（含）之後的貼文
+        until: 只返回爬取時間戳之前的貼文
+        cursor: 上一頁返回的 next_cursor
+    
+    Returns:
+        (貼文清單, 下一頁游標)，沒有更多貼文時游標為 None
+    
+    Raises:
+        ValueError: 游標格式無效時抛出
+    """
+    reader = _RangePageReader(category, limit, since, until, cursor)
+    while True:
+        query = reader.next_query()
+        if query is None:
+            break
+        keys = reader.add_entries(redis.zrevrangebyscore(**query))
+        reader.add_bodies(_mget(redis, keys) if keys else [])
+    
+    prune_index_members(redis, reader.expired)
+    
+    logger.info(f"從 Redis 按時間範圍獲取了 {len(reader.results)} 條貼文")
+    return reader.results, reader.next_cursor()
+
+
+async def get_posts_range_from_redis_async(
+    redis: AsyncRedis,
+    category: Optional[str] = None,
+    limit: int = 10,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    按爬取時間範圍從 Redis 獲取貼文（非同步客戶端版本，行為與 get_posts_range_from_redis 相同）
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        category: 貼文類別別過濾
+        limit: 返回數量限制
+        since: 只返回爬取時間戳（含）之後的貼文
+        until: 只返回爬取時間戳之前的貼文
+        cursor: 上一頁返回的 next_cursor
+    
+    Returns:
+        (貼文清單, 下一頁游標)，沒有更多貼文時游標為 None
+    
+    Raises:
+        ValueError: 游標格式無效時抛出
+    """
+    reader = _RangePageReader(category, limit, since, until, cursor)
+    while True:
+        query = reader.next_query()
+        if query is None:
+            break
+        keys = reader.add_entries(await redis.zrevrangebyscore(**query))
+        reader.add_bodies(await _mget(redis, keys) if keys else [])
+    
+    await prune_index_members_async(redis, reader.expired)
+    
+    logger.info(f"從 Redis 按時間範圍獲取了 {len(reader.results)} 條貼文")
+    return reader.results, reader.next_cursor()
+
+
+def query_posts(
+    db: Session,
+    category: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    columns: Optional[List[Any]] = None
+) -> Query:
+    """
+    構建按爬取時間倒序的貼文查詢
+    
+    Args:
+        db: 資料庫會話
+        category: 貼文類別別過濾
+        since: 只返回此時間（含）之後爬取的貼文
+        until: 只返回此時間之前爬取的貼文
+        columns: 只查詢這些欄位（返回行而非 ORM 物件），None 表示查詢完整的貼文
+    
+    Returns:
+        尚未套用分頁的查詢物件
+    """
+    query = db.query(*columns) if columns else db.query(Post)
+    
+    if category:
+        query = query.filter(Post.category == category)
+    # 時間範圍過濾可讓 PostgreSQL 只掃描相關月份的分區
+    if since:
+        query = query.filter(Post.crawled_at >= since)
+    if until:
+        query = query.filter(Post.crawled_at < until)
+    
+    return query.order_by(Post.crawled_at.desc(), Post.uid)
+
+
 def get_posts_from_db(
     db: Session,
     category: Optional[str] = None,
     limit: int = 10,
-    offset: int = 0
+    offset: int = 0,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
 ) -> List[Post]:
     """
-    從資料庫獲取貼文
+    從資料庫獲取貼文（按爬取時間倒序）
     
     Args:
         db: 資料庫會話
         category: 貼文類別別過濾
         limit: 返回數量限制
         offset: 偏移量
-        
+        since: 只返回此時間（含）之後爬取的貼文
+        until: 只返回此時間之前爬取的貼文
+    
     Returns:
         貼文清單
     """
     try:
-        query = db.query(Post)
-        
-        if category:
-            query = query.filter(Post.category == category)
-        
-        posts = query.offset(offset).limit(limit).all()
+        posts = retry_on_primary(
+            db,
+            lambda session: query_posts(session, category, since, until).offset(offset).limit(limit).all()
+        )
         logger.info(f"從資料庫獲取了 {len(posts)} 條貼文")
         return posts
-        
+    
+    except Exception as e:
+        logger.error(f"從資料庫獲取貼文時出錯: {e}")
+        return []
+
+
+def get_post_dicts_from_db(
+    db: Session,
+    fields: Optional[Tuple[str, ...]] = None,
+    category: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    從資料庫獲取貼文字典（按爬取時間倒序）
+    
+    指定欄位時只 SELECT 這些欄位，不載入完整的 ORM 物件
+    
+    Args:
+        db: 資料庫會話
+        fields: parse_fields 返回的欄位，None 表示全部欄位
+        category: 貼文類別別過濾
+        limit: 返回數量限制
+        offset: 偏移量
+        since: 只返回此時間（含）之後爬取的貼文
+        until: 只返回此時間之前爬取的貼文
+    
+    Returns:
+        貼文字典清單
+    """
+    if fields is None:
+        posts = get_posts_from_db(db, category, limit, offset, since, until)
+        return [post_to_dict(post) for post in posts]
+    
+    try:
+        columns = [getattr(Post, name) for name in fields]
+        rows = retry_on_primary(
+            db,
+            lambda session: query_posts(session, category, since, until, columns)
+            .offset(offset).limit(limit).all()
+        )
+        logger.info(f"從資料庫獲取了 {len(rows)} 條貼文（欄位: {','.join(fields)}）")
     except Exception as e:
         logger.error(f"從資料庫獲取貼文時出錯: {e}")
         return []
+    
+    results = []
+    for row in rows:
+        post = dict(zip(fields, row))
+        if post.get("crawled_at") is not None:
+            post["crawled_at"] = post["crawled_at"].isoformat()
+        results.append(post)
+    return results
+
+
+def _escape_like(value: str) -> str:
+    """轉義 LIKE 模式中的萬用字元（以 ! 作為轉義字元）"""
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def build_search_statement(
+    query: str,
+    category: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    after: Optional[Tuple[float, datetime, str]] = None
+) -> Select:
+    """
+    構建貼文搜尋查詢
+    
+    ILIKE 條件由 post_url / content 上的 pg_trgm GIN 索引支援，
+    結果按 trigram 相似度排序，使用 (rank, crawled_at, uid) 做鍵集分頁
+    
+    Args:
+        query: 搜尋字串
+        category: 貼文類別過濾
+        since: 只搜尋此時間（含）之後爬取的貼文
+        until: 只搜尋此時間之前爬取的貼文
+        limit: 返回數量限制
+        after: 上一頁最後一筆的 (rank, crawled_at, uid)
+    
+    Returns:
+        SQLAlchemy 查詢語句，返回 (Post, rank) 行
+    """
+    pattern = f"%{_escape_like(query)}%"
+    rank = cast(
+        func.greatest(
+            func.similarity(Post.post_url, query),
+            func.similarity(func.coalesce(Post.content, ""), query)
+        ),
+        Float
+    )
+    
+    stmt = select(Post, rank.label("rank")).where(
+        or_(
+            Post.post_url.ilike(pattern, escape="!"),
+            Post.content.ilike(pattern, escape="!")
+        )
+    )
+    if category:
+        stmt = stmt.where(Post.category == category)
+    if since:
+        stmt = stmt.where(Post.crawled_at >= since)
+    if until:
+        stmt = stmt.where(Post.crawled_at < until)
+    if after:
+        stmt = stmt.where(tuple_(rank, Post.crawled_at, Post.uid) < tuple_(*after))
+    
+    return stmt.order_by(
+        rank.desc(),
+        Post.crawled_at.desc(),
+        Post.uid.desc()
+    ).limit(limit)
+
+
+def search_posts(
+    db: Session,
+    query: str,
+    category: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    按網址和貼文文字搜尋貼文（需要 PostgreSQL pg_trgm）
+    
+    Args:
+        db: 資料庫會話
+        query: 搜尋字串
+        category: 貼文類別過濾
+        since: 只搜尋此時間（含）之後爬取的貼文
+        until: 只搜尋此時間之前爬取的貼文
+        limit: 返回數量限制
+        cursor: 上一頁返回的 next_cursor
+    
+    Returns:
+        (貼文字典清單, 下一頁游標)，沒有更多結果時游標為 None
+    
+    Raises:
+        ValueError: 游標格式無效時抛出
+    """
+    after = None
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 3:
+            raise ValueError(f"無效的游標: {cursor}")
+        after = (float(values[0]), datetime.fromisoformat(values[1]), str(values[2]))
+    
+    stmt = build_search_statement(query, category, since, until, limit, after)
+    rows = retry_on_primary(db, lambda session: session.execute(stmt).all())
+    
+    results = []
+    for post, rank in rows:
+        item = post_to_dict(post)
+        item["content"] = post.content
+        item["rank"] = rank
+        results.append(item)
+    
+    next_cursor = None
+    if len(rows) == limit:
+        last_post, last_rank = rows[-1]
+        next_cursor = encode_cursor([last_rank, last_post.crawled_at, last_post.uid])
+    
+    logger.info(f"搜尋貼文 '{query}' 返回 {len(results)} 條結果")
+    return results, next_cursor
+
+
+def iter_posts_for_export(
+    db: Session,
+    category: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    batch_size: Optional[int] = None
+) -> Iterator[Post]:
+    """
+    按 (crawled_at, uid) 順序串流讀取貼文
+    
+    使用 yield_per 走伺服器端游標，記憶體佔用與總行數無關
+    
+    Args:
+        db: 資料庫會話
+        category: 貼文類別過濾
+        since: 只讀取此時間（含）之後爬取的貼文
+        until: 只讀取此時間之前爬取的貼文
+        after: 從此 (crawled_at, uid) 之後繼續（用於斷點續傳）
+        batch_size: 每批讀取的行數
+    
+    Yields:
+        貼文物件
+    """
+    stmt = select(Post)
+    if category:
+        stmt = stmt.where(Post.category == category)
+    if since:
+        stmt = stmt.where(Post.crawled_at >= since)
+    if until:
+        stmt = stmt.where(Post.crawled_at < until)
+    if after:
+        stmt = stmt.where(tuple_(Post.crawled_at, Post.uid) > tuple_(*after))
+    stmt = stmt.order_by(Post.crawled_at, Post.uid).execution_options(
+        yield_per=batch_size or settings.EXPORT_BATCH_SIZE
+    )
+    
+    for post in db.execute(stmt).scalars():
+        yield post
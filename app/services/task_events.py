@@ -0,0 +1,172 @@
+"""
+任務進度事件
+爬蟲任務將進度寫入每個任務一個的 Redis Stream，API 以 Server-Sent Events 推送給客戶端，
+客戶端保持一個長連接即可取代反覆輪詢 Celery 結果後端
+"""
+from fastapi.responses import StreamingResponse
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import RedisError
+from typing import Any, AsyncIterator, Dict, Optional
+import json
+import re
+import time
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.core.monitoring import task_event_streams, task_events_published_total
+
+logger = get_logger(__name__)
+
+# 任務結束的事件類型，推送後伺服器關閉 SSE 連接
+TERMINAL_EVENTS = ("result", "error")
+
+# Stream 事件 ID 格式（毫秒時間戳-序號），用於檢查客戶端的 Last-Event-ID
+EVENT_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+# 本進程進行中的 SSE 連接數
+_active_streams = 0
+
+
+def task_events_key(task_id: str) -> str:
+    """任務進度事件的 Stream 鍵"""
+    return f"task:events:{task_id}"
+
+
+def _decode(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def publish_task_event(redis: Redis, task_id: str, event: str, data: Dict[str, Any]) -> Optional[str]:
+    """
+    寫入一個任務進度事件（失敗只記錄日誌，不影響任務執行）
+    
+    每次寫入都會延長 Stream 的有效期，任務結束後保留 TASK_EVENTS_TTL_SECONDS，
+    期間連接的客戶端仍可讀取完整的事件紀錄
+    
+    Args:
+        redis: 同步 Redis 客戶端
+        task_id: 任務 ID
+        event: 事件類型（progress / result / error）
+        data: 事件資料（需可序列化為 JSON）
+        
+    Returns:
+        事件 ID，寫入失敗時為 None
+    """
+    key = task_events_key(task_id)
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.xadd(
+            key,
+            {"event": event, "data": json.dumps(data, ensure_ascii=False)},
+            maxlen=settings.TASK_EVENTS_MAXLEN,
+            approximate=True
+        )
+        pipe.expire(key, settings.TASK_EVENTS_TTL_SECONDS)
+        event_id, _ = pipe.execute()
+    except RedisError as e:
+        task_events_published_total.labels(event=event, status="error").inc()
+        logger.error(f"寫入任務 {task_id} 的進度事件失敗: {e}")
+        return None
+    
+    task_events_published_total.labels(event=event, status="success").inc()
+    return _decode(event_id)
+
+
+def format_sse(event_id: str, event: str, data: str) -> str:
+    """組裝一則 SSE 訊息"""
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+def active_event_streams() -> int:
+    """本進程進行中的 SSE 連接數"""
+    return _active_streams
+
+
+def reserve_event_stream() -> bool:
+    """
+    在接受請求時預留一個 SSE 連接名額
+    
+    檢查和遞增之間沒有 await，同時到達的請求不會一起通過上限檢查
+    
+    Returns:
+        是否取得名額，已達 TASK_EVENTS_MAX_STREAMS 時返回 False
+    """
+    global _active_streams
+    if _active_streams >= settings.TASK_EVENTS_MAX_STREAMS:
+        return False
+    _active_streams += 1
+    task_event_streams.inc()
+    return True
+
+
+def release_event_stream() -> None:
+    """釋放 reserve_event_stream 預留的名額"""
+    global _active_streams
+    _active_streams -= 1
+    task_event_streams.dec()
+
+
+class TaskEventStreamResponse(StreamingResponse):
+    """
+    任務進度的 SSE 回應，回應結束時釋放預留的連接名額
+    
+    名額在回應結束（包括客戶端在串流開始前斷線）時釋放，
+    而不是依賴產生器的 finally（產生器尚未開始執行時不會觸發）
+    """
+    
+    media_type = "text/event-stream"
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            release_event_stream()
+
+
+async def task_event_stream(
+    redis: AsyncRedis,
+    task_id: str,
+    last_event_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    以 SSE 格式逐一產生任務進度事件
+    
+    以阻塞的 XREAD 等待新事件（每次最多 TASK_EVENTS_BLOCK_SECONDS），
+    沒有事件時定期發送心跳註解；推送 result / error 事件、Redis 發生錯誤
+    或連接超過 TASK_EVENTS_MAX_SECONDS 時結束，客戶端可帶上最後收到的事件 ID 重連
+    
+    Args:
+        redis: 非同步 Redis 客戶端
+        task_id: 任務 ID
+        last_event_id: 從此事件之後開始推送，未提供或格式無效時從頭開始
+        
+    Yields:
+        SSE 訊息字串
+    """
+    key = task_events_key(task_id)
+    cursor = last_event_id if last_event_id and EVENT_ID_PATTERN.match(last_event_id) else "0-0"
+    block_ms = max(int(settings.TASK_EVENTS_BLOCK_SECONDS * 1000), 1)
+    deadline = time.monotonic() + settings.TASK_EVENTS_MAX_SECONDS
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        try:
+            response = await redis.xread({key: cursor}, count=100, block=block_ms)
+        except RedisError as e:
+            logger.error(f"讀取任務 {task_id} 的進度事件失敗: {e}")
+            return
+        
+        if not response:
+            if time.monotonic() - last_sent >= settings.TASK_EVENTS_HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            continue
+        
+        for _, entries in response:
+            for event_id, fields in entries:
+                cursor = _decode(event_id)
+                fields = {_decode(k): _decode(v) for k, v in fields.items()}
+                event = fields.get("event", "progress")
+                yield format_sse(cursor, event, fields.get("data", "{}"))
+                if event in TERMINAL_EVENTS:
+                    return
+        last_sent = time.monotonic()
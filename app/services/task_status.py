@@ -0,0 +1,88 @@
+"""
+任務狀態查詢服務
+以一次 MGET 從 Celery 結果後端讀取多個任務的狀態，已結束的任務狀態保存在進程內快取
+"""
+from celery import states
+from redis.asyncio import Redis as AsyncRedis
+from typing import Any, Dict, List
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.local_cache import TTLCache
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 已結束（SUCCESS / FAILURE / REVOKED）的任務狀態不會再變化：任務 ID -> 回應內容
+terminal_status_cache = TTLCache(
+    "task_status",
+    maxsize=settings.TASK_STATUS_CACHE_MAX_ENTRIES,
+    ttl=settings.TASK_STATUS_CACHE_TTL_SECONDS
+)
+
+
+def task_status_payload(task_id: str, state: str, info: Any) -> Dict[str, Any]:
+    """
+    組裝任務狀態的回應內容
+    
+    Args:
+        task_id: 任務 ID
+        state: Celery 任務狀態
+        info: 任務結果、進度資訊或異常
+        
+    Returns:
+        任務狀態字典
+    """
+    response = {
+        "task_id": task_id,
+        "status": state,
+    }
+    
+    if state == states.PENDING:
+        response["message"] = "任務等待中"
+    elif state == "PROGRESS":
+        response["message"] = info.get("status", "執行中") if isinstance(info, dict) else "執行中"
+    elif state == states.SUCCESS:
+        response["result"] = info
+    elif state == states.FAILURE:
+        response["error"] = str(info)
+    
+    return response
+
+
+async def get_task_statuses(redis: AsyncRedis, task_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    批次查詢任務狀態
+    
+    快取中沒有的任務以一次 MGET 讀取結果後端（與 AsyncResult 使用相同的鍵和解碼方式），
+    後端沒有紀錄的任務視為 PENDING；結束狀態寫入進程內快取，之後不再讀取後端
+    
+    Args:
+        redis: 連接 Celery 結果後端的非同步客戶端
+        task_ids: 任務 ID 列表（可重複）
+        
+    Returns:
+        與 task_ids 順序相同的任務狀態列表
+    """
+    statuses = {}
+    missing = []
+    for task_id in dict.fromkeys(task_ids):
+        cached = terminal_status_cache.get(task_id)
+        if cached is not None:
+            statuses[task_id] = cached
+        else:
+            missing.append(task_id)
+    
+    if missing:
+        backend = celery_app.backend
+        values = await redis.mget([backend.get_key_for_task(task_id) for task_id in missing])
+        for task_id, value in zip(missing, values):
+            if value is None:
+                statuses[task_id] = task_status_payload(task_id, states.PENDING, None)
+                continue
+            meta = backend.decode_result(value)
+            payload = task_status_payload(task_id, meta["status"], meta.get("result"))
+            if meta["status"] in states.READY_STATES:
+                terminal_status_cache.set(task_id, payload)
+            statuses[task_id] = payload
+    
+    return [statuses[task_id] for task_id in task_ids]
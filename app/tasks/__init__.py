@@ -1,6 +1,16 @@
 """
 Celery 任務模組
 """
-from app.tasks.crawler_tasks import crawl_facebook_async, cleanup_old_posts
+from app.tasks.crawler_tasks import (
+    crawl_facebook_async,
+    cleanup_old_posts,
+    maintain_post_partitions,
+    export_posts_snapshot
+)
 
-__all__ = ['crawl_facebook_async', 'cleanup_old_posts']
+__all__ = [
+    'crawl_facebook_async',
+    'cleanup_old_posts',
+    'maintain_post_partitions',
+    'export_posts_snapshot'
+]
@@ -3,9 +3,22 @@ Celery 異步任務
 """
 from app.core.celery_app import celery_app
 from app.crawler.facebook import crawl_facebook_posts, FacebookCrawlerError
-from app.services.post_service import save_posts_to_db, save_posts_to_redis
-from app.core.db import SessionLocal
-from app.core.redis import redis_client
+from app.services.post_service import (
+    save_posts_to_db,
+    save_posts_to_redis,
+    cleanup_expired_index_members
+)
+from app.services.post_cache import (
+    bump_listing_version,
+    warm_post_listing,
+    publish_listing_invalidation
+)
+from app.services.export_service import write_parquet_snapshot
+from app.services.task_events import publish_task_event
+from app.core.db import SessionLocal, engine, get_read_session_factory
+from app.core.partitions import ensure_post_partitions, expire_post_partitions
+from app.core.redis import redis_client, redis_cache_client
+from app.core.config import settings
 from app.core.logger import get_logger
 from app.core.monitoring import crawler_tasks_total, crawler_posts_scraped
 
@@ -17,6 +30,8 @@ def crawl_facebook_async(self, page_url: str, max_posts: int = 30):
     """
     異步爬取 Facebook 貼文
     
+    進度同時寫入 Celery 任務狀態和任務進度事件串流（供 SSE 推送）
+    
     Args:
         page_url: Facebook 頁面 URL
         max_posts: 最多爬取的貼文數量
@@ -27,23 +42,34 @@ def crawl_facebook_async(self, page_url: str, max_posts: int = 30):
     task_id = self.request.id
     logger.info(f"開始異步爬蟲任務 {task_id}: {page_url}")
     
+    def report(phase: str, status: str = None, **data):
+        """推送進度事件，帶 status 的階段變化同時更新 Celery 任務狀態"""
+        if status:
+            self.update_state(state='PROGRESS', meta={'status': status})
+            data['status'] = status
+        publish_task_event(redis_client, task_id, 'progress', {'phase': phase, **data})
+    
     try:
         # 更新任務狀態
-        self.update_state(state='PROGRESS', meta={'status': '正在爬取...'})
+        report('crawling', '正在爬取...')
         
-        # 執行爬取
-        posts = crawl_facebook_posts(page_url, max_posts)
+        # 執行爬取（頁面加載、滾動和解析的進度只寫入事件串流）
+        posts = crawl_facebook_posts(
+            page_url, max_posts, progress=lambda phase, data: report(phase, **data)
+        )
         
         if not posts:
             crawler_tasks_total.labels(status="no_posts").inc()
-            return {
+            result = {
                 'status': 'completed',
                 'posts_count': 0,
                 'message': '未找到任何貼文'
             }
+            publish_task_event(redis_client, task_id, 'result', result)
+            return result
         
         # 儲存到資料庫
-        self.update_state(state='PROGRESS', meta={'status': '正在儲存到資料庫...'})
+        report('saving_db', '正在儲存到資料庫...', posts_found=len(posts))
         db = SessionLocal()
         try:
             db_count = save_posts_to_db(db, posts)
@@ -51,8 +77,18 @@ def crawl_facebook_async(self, page_url: str, max_posts: int = 30):
             db.close()
         
         # 儲存到 Redis
-        self.update_state(state='PROGRESS', meta={'status': '正在儲存到快取...'})
-        redis_count = save_posts_to_redis(redis_client, posts)
+        report('saving_cache', '正在儲存到快取...', posts_found=len(posts))
+        redis_count = save_posts_to_redis(redis_cache_client, posts)
+        
+        # 預熱並預先渲染列表前幾頁（使用主庫，剛寫入的貼文不受副本延遲影響），
+        # 再通知各 API worker 清空進程內列表快取
+        categories = [post.get('category') for post in posts]
+        db = SessionLocal()
+        try:
+            warmed = warm_post_listing(redis_cache_client, db, categories)
+        finally:
+            db.close()
+        publish_listing_invalidation(redis_client, categories)
         
         # 更新監控指標
         crawler_tasks_total.labels(status="success").inc()
@@ -63,52 +99,116 @@ def crawl_facebook_async(self, page_url: str, max_posts: int = 30):
             'posts_count': len(posts),
             'db_saved': db_count,
             'redis_saved': redis_count,
+            'warmed': warmed,
             'message': f'成功爬取 {len(posts)} 則貼文'
         }
         
         logger.info(f"異步爬蟲任務 {task_id} 完成: {result}")
+        publish_task_event(redis_client, task_id, 'result', result)
         return result
         
     except FacebookCrawlerError as e:
         crawler_tasks_total.labels(status="error").inc()
         logger.error(f"異步爬蟲任務 {task_id} 失敗: {e}")
+        publish_task_event(redis_client, task_id, 'error', {'error': str(e)})
         raise
     except Exception as e:
         crawler_tasks_total.labels(status="error").inc()
         logger.error(f"異步爬蟲任務 {task_id} 發生未知錯誤: {e}", exc_info=True)
+        publish_task_event(redis_client, task_id, 'error', {'error': str(e)})
         raise
 
 
 @celery_app.task(name="tasks.cleanup_old_posts")
 def cleanup_old_posts():
     """
-    清理過期的貼文資料（定期任務）
+    清理快取索引中已過期的貼文（定期任務）
+    
+    沿索引增量清理，每次執行受時間預算限制，未完成的部分下次繼續。
+    有貼文移出索引時遞增受影響類別和全域列表的內容版本並發布失效通知，
+    客戶端不會繼續以舊 ETag 收到 304
     """
     logger.info("開始清理過期貼文")
     try:
-        # 清理 Redis 中的過期鍵
-        deleted_count = 0
-        cursor = 0
-        while True:
-            cursor, keys = redis_client.scan(cursor, match="post:*", count=100)
-            for key in keys:
-                if not redis_client.exists(key):
-                    redis_client.zrem("posts:index", key.replace("post:", ""))
-                    deleted_count += 1
-            if cursor == 0:
-                break
+        result = cleanup_expired_index_members(redis_cache_client)
+        if result['deleted_count'] > 0:
+            try:
+                for category in result['categories']:
+                    bump_listing_version(redis_cache_client, category)
+                bump_listing_version(redis_cache_client)
+                publish_listing_invalidation(redis_client, result['categories'])
+            except Exception as e:
+                logger.error(f"清理過期貼文後更新列表內容版本失敗: {e}")
         
-        logger.info(f"清理完成，刪除了 {deleted_count} 個過期貼文")
-        return {'deleted_count': deleted_count}
+        logger.info(f"清理完成，刪除了 {result['deleted_count']} 個過期貼文")
+        return result
     except Exception as e:
         logger.error(f"清理過期貼文失敗: {e}")
         raise
 
 
+@celery_app.task(name="tasks.maintain_post_partitions")
+def maintain_post_partitions():
+    """
+    維護 posts 表分區（定期任務）
+    
+    預先創建未來月份的分區，並按保留配置刪除或分離過期分區。
+    有分區過期時遞增全域列表的內容版本並發布失效通知，
+    以該版本為 ETag 的類別統計（/posts/categories）不會繼續返回 304
+    """
+    logger.info("開始維護貼文分區")
+    try:
+        created = ensure_post_partitions(engine)
+        expired = expire_post_partitions(engine)
+        if expired:
+            try:
+                bump_listing_version(redis_cache_client)
+                publish_listing_invalidation(redis_client)
+            except Exception as e:
+                logger.error(f"分區過期後更新列表內容版本失敗: {e}")
+        
+        logger.info(f"分區維護完成，新建 {len(created)} 個，過期 {len(expired)} 個")
+        return {'created': created, 'expired': expired}
+    except Exception as e:
+        logger.error(f"維護貼文分區失敗: {e}")
+        raise
+
+
+@celery_app.task(name="tasks.export_posts_snapshot")
+def export_posts_snapshot():
+    """
+    匯出 Parquet 分析快照（定期任務）
+    
+    只匯出上次快照之後新增的貼文
+    """
+    logger.info("開始匯出 Parquet 快照")
+    try:
+        result = write_parquet_snapshot(get_read_session_factory())
+        return {
+            'run_id': result['run_id'],
+            'rows': result['rows'],
+            'files': len(result['files']),
+            'bytes': result['bytes']
+        }
+    except Exception as e:
+        logger.error(f"匯出 Parquet 快照失敗: {e}")
+        raise
+
+
 # Celery Beat 定期任務配置
 celery_app.conf.beat_schedule = {
-    'cleanup-old-posts-daily': {
+    'cleanup-old-posts': {
         'task': 'tasks.cleanup_old_posts',
+        'schedule': settings.REDIS_CLEANUP_INTERVAL_SECONDS,
+        # 積壓的清理任務沒有意義，過了下一次排程時間就丟棄
+        'options': {'expires': settings.REDIS_CLEANUP_INTERVAL_SECONDS},
+    },
+    'maintain-post-partitions-daily': {
+        'task': 'tasks.maintain_post_partitions',
         'schedule': 86400.0,  # 每天執行一次
     },
+    'export-posts-snapshot-hourly': {
+        'task': 'tasks.export_posts_snapshot',
+        'schedule': 3600.0,  # 每小時執行一次
+    },
 }
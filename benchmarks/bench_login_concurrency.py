@@ -0,0 +1,97 @@
+"""
+登入與列表讀取併發負載測試
+
+先單獨以固定併發讀取 /posts/，再於大量併發登入的同時重複相同的讀取，
+比較兩個階段 /posts/ 的延遲分佈。密碼驗證移出事件迴圈後，
+登入期間的讀取延遲應與單獨讀取時相近。
+
+需要已啟動的 API 服務和可登入的帳號，例如：
+    python -m benchmarks.bench_login_concurrency --base-url http://localhost:8000 \
+        --username testuser --password testpass123 --logins 50 --readers 20 --duration 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+async def read_loop(client: httpx.AsyncClient, deadline: float, timings: list, errors: list) -> None:
+    """在截止時間前持續讀取 /posts/，記錄每次請求的延遲（毫秒）"""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get("/posts/", params={"limit": 10})
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+
+
+async def login_loop(client: httpx.AsyncClient, deadline: float, args, statuses: dict) -> None:
+    """在截止時間前持續登入，統計各狀態碼的次數"""
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.post(
+                "/auth/login",
+                json={"username": args.username, "password": args.password}
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        except httpx.HTTPError:
+            statuses["error"] = statuses.get("error", 0) + 1
+
+
+def report(name: str, timings: list, errors: list) -> None:
+    """輸出延遲分佈"""
+    if not timings:
+        print(f"{name:<12} 沒有成功的請求（錯誤 {len(errors)} 次）")
+        return
+    timings.sort()
+
+    def pct(p: float) -> float:
+        return timings[min(int(len(timings) * p), len(timings) - 1)]
+
+    print(
+        f"{name:<12} 請求 {len(timings):6d}  平均 {statistics.mean(timings):8.2f} ms  "
+        f"p50 {pct(0.5):8.2f} ms  p95 {pct(0.95):8.2f} ms  p99 {pct(0.99):8.2f} ms  "
+        f"錯誤 {len(errors)}"
+    )
+
+
+async def run_phase(args, logins: int) -> tuple:
+    """執行一個階段，返回 (/posts/ 延遲, 錯誤, 登入狀態碼統計)"""
+    limits = httpx.Limits(max_connections=args.readers + logins)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + args.duration
+        timings, errors, statuses = [], [], {}
+        await asyncio.gather(
+            *[read_loop(client, deadline, timings, errors) for _ in range(args.readers)],
+            *[login_loop(client, deadline, args, statuses) for _ in range(logins)]
+        )
+    return timings, errors, statuses
+
+
+async def main_async(args) -> None:
+    timings, errors, _ = await run_phase(args, logins=0)
+    report("僅讀取", timings, errors)
+
+    timings, errors, statuses = await run_phase(args, logins=args.logins)
+    report("登入期間", timings, errors)
+    print(f"登入結果: {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登入與列表讀取併發負載測試")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=50, help="併發登入數")
+    parser.add_argument("--readers", type=int, default=20, help="併發讀取 /posts/ 數")
+    parser.add_argument("--duration", type=float, default=10.0, help="每個階段的秒數")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
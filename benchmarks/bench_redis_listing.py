@@ -0,0 +1,106 @@
+"""
+Redis 貼文清單讀取基準測試
+
+比較逐筆 GET/ZREM 的舊讀取方式與 MGET + 批次清理的 get_posts_from_redis。
+需要本機 Redis（使用 REDIS_HOST / REDIS_PORT 配置），資料寫入 db 15 並在結束時清空。
+
+使用方式：
+    python -m benchmarks.bench_redis_listing --posts 5000 --page-size 100 --expired-ratio 0.2
+"""
+import argparse
+import json
+import statistics
+import time
+import redis
+from app.core.config import settings
+from app.services.post_service import (
+    save_posts_to_redis,
+    get_posts_from_redis,
+    post_key,
+    parse_index_member,
+    POSTS_INDEX_KEY
+)
+
+
+def naive_get_posts(client: redis.Redis, limit: int, offset: int) -> list:
+    """舊版實現：每個 UID 一次 GET，每個過期 UID 一次 ZREM"""
+    members = client.zrevrange(POSTS_INDEX_KEY, offset, offset + limit - 1)
+    results = []
+    for member in members:
+        category, uid = parse_index_member(member)
+        data = client.get(post_key(uid, category))
+        if not data:
+            client.zrem(POSTS_INDEX_KEY, member)
+            continue
+        results.append(json.loads(data))
+    return results
+
+
+def seed(client: redis.Redis, count: int, expired_ratio: float) -> None:
+    """寫入測試貼文，並刪除部分貼文內容模擬過期"""
+    client.flushdb()
+    now = time.time()
+    posts = [
+        {
+            "uid": f"bench-{i}",
+            "post_url": f"https://www.facebook.com/bench/posts/{i}",
+            "video_url": "",
+            "image_url": f"https://scontent.example.com/{i}.jpg",
+            "comments": i % 50,
+            "reactions": i % 500,
+            "category": ("text", "image", "video", "reels")[i % 4],
+            "timestamp": now - i
+        }
+        for i in range(count)
+    ]
+    save_posts_to_redis(client, posts)
+    step = int(1 / expired_ratio) if expired_ratio > 0 else 0
+    if step:
+        client.delete(*[post_key(p["uid"], p["category"]) for p in posts[::step]])
+
+
+def measure(name: str, client: redis.Redis, fn, pages: int, page_size: int) -> None:
+    """執行並輸出每頁延遲與 Redis 指令數"""
+    timings = []
+    commands_before = client.info("stats")["total_commands_processed"]
+    for page in range(pages):
+        started = time.perf_counter()
+        fn(client, page_size, page * page_size)
+        timings.append((time.perf_counter() - started) * 1000)
+    # 扣除 INFO 指令本身
+    commands = client.info("stats")["total_commands_processed"] - commands_before - 1
+    timings.sort()
+    print(
+        f"{name:<10} 平均 {statistics.mean(timings):7.3f} ms/頁  "
+        f"p95 {timings[int(len(timings) * 0.95) - 1]:7.3f} ms  "
+        f"指令數 {commands / pages:6.1f}/頁"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis 貼文清單讀取基準測試")
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--expired-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    client = redis.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=15,
+        decode_responses=True
+    )
+    try:
+        for name, fn in (
+            ("naive", naive_get_posts),
+            ("batched", lambda c, limit, offset: get_posts_from_redis(c, limit=limit, offset=offset)),
+        ):
+            seed(client, args.posts, args.expired_ratio)
+            measure(name, client, fn, args.pages, args.page_size)
+    finally:
+        client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
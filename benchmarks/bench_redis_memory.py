@@ -0,0 +1,89 @@
+"""
+Redis 貼文快取記憶體基準測試
+
+以不同的 REDIS_POST_CODEC / 壓縮門檻寫入相同的貼文，
+用 MEMORY USAGE 統計每則貼文內容鍵與索引的平均位元組數。
+需要本機 Redis（使用 REDIS_HOST / REDIS_PORT 配置），資料寫入 db 15 並在結束時清空。
+
+使用方式：
+    python -m benchmarks.bench_redis_memory --posts 2000 --content-length 600
+"""
+import argparse
+import random
+import string
+import time
+import redis
+from app.core.config import settings
+from app.services.post_service import (
+    save_posts_to_redis,
+    post_key,
+    category_index_key,
+    POSTS_INDEX_KEY
+)
+
+VARIANTS = [
+    ("json", 0),
+    ("json", 256),
+    ("msgpack", 0),
+    ("msgpack", 256),
+]
+
+
+def make_posts(count: int, content_length: int) -> list:
+    """生成接近真實大小的貼文"""
+    rng = random.Random(42)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(300)]
+    now = time.time()
+    posts = []
+    for i in range(count):
+        content = " ".join(rng.choices(words, k=content_length // 5))[:content_length]
+        posts.append({
+            "uid": f"{rng.getrandbits(128):032x}",
+            "post_url": f"https://www.facebook.com/page{i % 50}/posts/{10 ** 15 + i}",
+            "video_url": "",
+            "image_url": f"https://scontent.xx.fbcdn.net/v/t39/{rng.getrandbits(64):x}.jpg" if i % 2 else "",
+            "comments": rng.randint(0, 500),
+            "reactions": rng.randint(0, 5000),
+            "category": ("text", "image", "video", "reels")[i % 4],
+            "content": content,
+            "timestamp": now - i
+        })
+    return posts
+
+
+def measure(client: redis.Redis, posts: list) -> tuple:
+    """返回 (內容鍵平均位元組, 索引每則平均位元組)"""
+    body_bytes = sum(client.memory_usage(post_key(p["uid"], p.get("category")), samples=0) for p in posts)
+    index_keys = [POSTS_INDEX_KEY] + [category_index_key(c) for c in ("text", "image", "video", "reels")]
+    index_bytes = sum(client.memory_usage(key, samples=0) or 0 for key in index_keys)
+    return body_bytes / len(posts), index_bytes / len(posts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis 貼文快取記憶體基準測試")
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--content-length", type=int, default=600)
+    args = parser.parse_args()
+
+    client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=15)
+    posts = make_posts(args.posts, args.content_length)
+    original = (settings.REDIS_POST_CODEC, settings.REDIS_POST_COMPRESS_MIN_BYTES)
+    try:
+        print(f"{'編碼':<10}{'壓縮門檻':>10}{'內容 B/則':>12}{'索引 B/則':>12}{'每 GB 則數':>14}")
+        for codec, compress_min_bytes in VARIANTS:
+            settings.REDIS_POST_CODEC = codec
+            settings.REDIS_POST_COMPRESS_MIN_BYTES = compress_min_bytes
+            client.flushdb()
+            save_posts_to_redis(client, posts)
+            body, index = measure(client, posts)
+            print(
+                f"{codec:<10}{compress_min_bytes:>10}{body:>12.1f}{index:>12.1f}"
+                f"{int(1024 ** 3 / (body + index)):>14,}"
+            )
+    finally:
+        settings.REDIS_POST_CODEC, settings.REDIS_POST_COMPRESS_MIN_BYTES = original
+        client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
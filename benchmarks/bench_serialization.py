@@ -0,0 +1,98 @@
+"""
+貼文回應序列化基準測試
+
+以每 100 則貼文為單位，比較各回應路徑的序列化成本（不需要 Redis 或資料庫）：
+- /posts/ 快取頁：逐則 json.loads 後以 JSONResponse 序列化（舊）/ 直接拼接快取中的 JSON（新）
+- /posts/db：post_to_dict 後經 jsonable_encoder 與 JSONResponse（舊）/ 以 orjson 直接序列化（新）
+
+使用方式：
+    python -m benchmarks.bench_serialization --posts 100 --content-length 600 --rounds 2000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.serialization import FastJSONResponse, orjson
+from app.models.post import Post
+from app.services.post_cache import listing_payload, render_listing_page
+from app.services.post_codec import encode_post, post_json_fragment
+from app.services.post_service import post_to_dict, _json_fragments
+from benchmarks.bench_redis_memory import make_posts
+
+
+def timed(fn, rounds: int) -> float:
+    """返回每次呼叫的平均微秒數"""
+    fn()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def make_rows(posts: list) -> list:
+    """將貼文轉為未綁定會話的 ORM 物件（模擬資料庫查詢結果）"""
+    base = datetime(2024, 5, 1, 12, 0)
+    return [
+        Post(
+            uid=p["uid"],
+            post_url=p["post_url"],
+            video_url=p["video_url"],
+            image_url=p["image_url"],
+            comments=p["comments"],
+            reactions=p["reactions"],
+            category=p["category"],
+            content=p["content"],
+            crawled_at=base - timedelta(seconds=i)
+        )
+        for i, p in enumerate(posts)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="貼文回應序列化基準測試")
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--content-length", type=int, default=600)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts, args.content_length)
+    bodies = [encode_post(p, codec="json", compress_min_bytes=0) for p in posts]
+    rows = make_rows(posts)
+    scale = 100 / args.posts
+
+    def cache_page_before():
+        decoded = [json.loads(body) for body in bodies]
+        return JSONResponse(listing_payload(decoded, None, args.posts, 0, "cache")).body
+
+    def cache_page_after():
+        return render_listing_page(_json_fragments(bodies), None, args.posts, 0, "cache")
+
+    def db_page_before():
+        data = [post_to_dict(row) for row in rows]
+        payload = {"data": data, "count": len(data), "category": None, "limit": args.posts, "offset": 0}
+        return JSONResponse(jsonable_encoder(payload)).body
+
+    def db_page_after():
+        data = [post_to_dict(row) for row in rows]
+        payload = {"data": data, "count": len(data), "category": None, "limit": args.posts, "offset": 0}
+        return FastJSONResponse(payload).body
+
+    assert json.loads(cache_page_before()) == json.loads(cache_page_after())
+    assert json.loads(db_page_before()) == json.loads(db_page_after())
+    assert all(post_json_fragment(body) is body for body in bodies)
+
+    print(f"orjson: {'已安裝' if orjson is not None else '未安裝（退回標準庫 json）'}")
+    print(f"{'路徑':<16}{'舊 µs/100則':>14}{'新 µs/100則':>14}{'加速':>8}")
+    for name, before, after in (
+        ("/posts/ 快取頁", cache_page_before, cache_page_after),
+        ("/posts/db", db_page_before, db_page_after),
+    ):
+        old = timed(before, args.rounds) * scale
+        new = timed(after, args.rounds) * scale
+        print(f"{name:<16}{old:>14.1f}{new:>14.1f}{old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,42 @@ CREATE TABLE IF NOT EXISTS users (
     password VARCHAR NOT NULL
 );
 
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 按 crawled_at 月份範圍分區，分區由 tasks.maintain_post_partitions 預先創建和過期清理
 CREATE TABLE IF NOT EXISTS posts (
-    uid VARCHAR PRIMARY KEY,
+    uid VARCHAR NOT NULL,
     post_url TEXT,
     video_url TEXT,
     image_url TEXT,
     comments INT,
     reactions INT,
-    category VARCHAR
-);
+    category VARCHAR,
+    content TEXT,
+    crawled_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (uid, crawled_at)
+) PARTITION BY RANGE (crawled_at);
+
+CREATE INDEX IF NOT EXISTS ix_posts_uid ON posts (uid);
+CREATE INDEX IF NOT EXISTS ix_posts_crawled_at ON posts (crawled_at);
+CREATE INDEX IF NOT EXISTS ix_posts_post_url_trgm ON posts USING gin (post_url gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_posts_content_trgm ON posts USING gin (content gin_trgm_ops);
+
+-- 當月分區（之後的月份由維護任務創建）
+DO $$
+DECLARE
+    month_start DATE := date_trunc('month', now() AT TIME ZONE 'utc')::date;
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF posts FOR VALUES FROM (%L) TO (%L)',
+        'posts_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+        month_start,
+        (month_start + INTERVAL '1 month')::date
+    );
+END $$;
+
+-- 預設分區承接沒有對應月份分區的資料，維護任務漏跑時寫入不會失敗
+CREATE TABLE IF NOT EXISTS posts_default PARTITION OF posts DEFAULT;
 
 -- admin1 密碼: 1minda（bcrypt hash）
 INSERT INTO users (username, password)
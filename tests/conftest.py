@@ -6,8 +6,11 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.core.db import Base, get_db
+from app.core.db import Base, get_db, get_read_db, get_read_session_factory, get_session_factory
 from app.core.redis import redis_client
+from app.services.post_cache import invalidate_listing_cache
+from app.services.auth import invalidate_auth_cache
+from app.services.task_status import terminal_status_cache
 import os
 
 # 使用測試資料庫
@@ -42,6 +45,9 @@ def client(db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_read_session_factory] = lambda: TestingSessionLocal
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
     
     with TestClient(app) as test_client:
         yield test_client
@@ -105,6 +111,9 @@ def admin_token(client, admin_user):
 def clear_redis():
     """清除 Redis 測試資料"""
     yield
+    invalidate_listing_cache()
+    invalidate_auth_cache()
+    terminal_status_cache.clear()
     try:
         redis_client.flushdb()
     except:
@@ -35,6 +35,43 @@ class TestAuth:
         )
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
     
+    def test_login_busy(self, client, test_user, monkeypatch):
+        """測試密碼雜湊執行緒池已滿時返回 503"""
+        from app.core.executor import ExecutorBusyError
+        from app.services import auth
+        
+        async def _busy(*args):
+            raise ExecutorBusyError("password-hash 執行緒池已滿")
+        
+        monkeypatch.setattr(auth.password_executor, "run", _busy)
+        response = client.post(
+            "/auth/login",
+            json={"username": "testuser", "password": "testpass123"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+    
+    def test_login_rehash(self, client, db, test_user, monkeypatch):
+        """測試登入成功時升級密碼雜湊"""
+        from app.core.config import settings
+        from app.services import auth
+        
+        monkeypatch.setattr(settings, "PASSWORD_REHASH_ON_LOGIN", True)
+        monkeypatch.setattr(settings, "PASSWORD_HASH_SCHEME", "pbkdf2_sha256")
+        monkeypatch.setattr(auth, "pwd_context", auth._build_password_context())
+        
+        response = client.post(
+            "/auth/login",
+            json={"username": "testuser", "password": "testpass123"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        db.refresh(test_user)
+        assert test_user.hashed_password.startswith("$pbkdf2-sha256$")
+        assert client.post(
+            "/auth/login",
+            json={"username": "testuser", "password": "testpass123"}
+        ).status_code == status.HTTP_200_OK
+    
     def test_login_validation(self, client):
         """測試輸入驗證"""
         # 使用者名稱太短
@@ -0,0 +1,271 @@
+"""
+爬蟲 API 測試
+"""
+import threading
+from fastapi import status
+from app.api import crawler
+
+
+def _fake_posts(count: int):
+    return [
+        {"uid": f"crawl-{i}", "post_url": f"https://facebook.com/crawl/{i}",
+         "category": "text", "content": f"貼文 {i}", "timestamp": 1714564800.0 - i}
+        for i in range(count)
+    ]
+
+
+class TestCrawlApi:
+    """同步爬取端點測試"""
+    
+    def test_crawl_runs_in_executor(self, client, admin_token, monkeypatch):
+        """測試爬取在執行緒池中執行，並以執行緒自己的會話寫入資料庫和快取"""
+        from tests.conftest import TestingSessionLocal
+        from app.models.post import Post
+        
+        threads = []
+        
+        def fake_crawl(page_url, limit):
+            threads.append(threading.current_thread().name)
+            return _fake_posts(limit)
+        
+        monkeypatch.setattr(crawler, "crawl_facebook_posts", fake_crawl)
+        monkeypatch.setattr(crawler, "SessionLocal", TestingSessionLocal)
+        response = client.post(
+            "/crawler/crawl",
+            json={"page_url": "https://www.facebook.com/test", "limit": 3},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["posts_count"] == 3
+        assert threads[0].startswith("crawl")
+        db = TestingSessionLocal()
+        try:
+            assert db.query(Post).count() == 3
+        finally:
+            db.close()
+        
+        response = client.get("/posts/", params={"limit": 10})
+        assert [p["uid"] for p in response.json()["data"]] == ["crawl-0", "crawl-1", "crawl-2"]
+    
+    def test_crawl_invalidation_with_separate_cache_endpoint(self, client, admin_token, monkeypatch):
+        """測試 REDIS_CACHE_URL 與 REDIS_URL 不同時，失效通知仍送達在 REDIS_URL 上訂閱的 worker"""
+        import time
+        from tests.conftest import TestingSessionLocal
+        from app.core.config import settings
+        from app.services.post_cache import listing_cache
+        
+        class SeparateCacheEndpoint:
+            """位於另一個端點的貼文快取客戶端：發布的訊息不會到達 REDIS_URL 上的訂閱者"""
+            
+            def __init__(self, client):
+                self._client = client
+                self.published = []
+            
+            def __getattr__(self, name):
+                return getattr(self._client, name)
+            
+            def publish(self, channel, message):
+                self.published.append(channel)
+                return 0
+        
+        cache = SeparateCacheEndpoint(crawler.redis_cache_client)
+        monkeypatch.setattr(settings, "REDIS_CACHE_URL", "redis://cache.internal:6379/0")
+        monkeypatch.setattr(crawler, "redis_cache_client", cache)
+        monkeypatch.setattr(crawler, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(crawler, "crawl_facebook_posts", lambda page_url, limit: _fake_posts(limit))
+        assert settings.redis_cache_url != settings.redis_url
+        
+        listing_cache.set("stale", b"{}")
+        response = client.post(
+            "/crawler/crawl",
+            json={"page_url": "https://www.facebook.com/test", "limit": 2},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        
+        deadline = time.monotonic() + 5
+        while listing_cache.get("stale") is not None and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert listing_cache.get("stale") is None
+        assert cache.published == []
+    
+    def test_crawl_busy(self, client, admin_token, monkeypatch):
+        """測試同時進行的爬取已達上限時返回 429 與 Retry-After"""
+        from app.core.executor import ExecutorBusyError
+        
+        async def _busy(*args):
+            raise ExecutorBusyError("crawl 執行緒池已滿")
+        
+        monkeypatch.setattr(crawler.crawl_executor, "run", _busy)
+        response = client.post(
+            "/crawler/crawl",
+            json={"page_url": "https://www.facebook.com/test", "limit": 3},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers["Retry-After"] == "30"
+
+
+class TestTaskEvents:
+    """任務進度事件測試"""
+    
+    def test_stream_task_events(self, client, admin_token):
+        """測試 SSE 依序推送進度事件，收到最終結果後結束"""
+        from app.core.redis import redis_client
+        from app.services.task_events import publish_task_event
+        
+        publish_task_event(redis_client, "task-1", "progress", {"phase": "crawling"})
+        second = publish_task_event(redis_client, "task-1", "progress", {"phase": "parsed", "posts_found": 3})
+        publish_task_event(redis_client, "task-1", "result", {"status": "completed", "posts_count": 3})
+        
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.get("/crawler/task/task-1/events", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/event-stream")
+        messages = [m for m in response.text.split("\n\n") if m]
+        assert [m.split("\n")[1] for m in messages] == [
+            "event: progress", "event: progress", "event: result"
+        ]
+        assert messages[1].startswith(f"id: {second}\n")
+        assert '"posts_found": 3' in messages[1]
+        
+        # 帶上 Last-Event-ID 重連時只推送之後的事件
+        response = client.get(
+            "/crawler/task/task-1/events",
+            headers={**headers, "Last-Event-ID": second}
+        )
+        assert [m.split("\n")[1] for m in response.text.split("\n\n") if m] == ["event: result"]
+    
+    def test_stream_limit(self, client, admin_token, monkeypatch):
+        """測試 SSE 連接已達上限時返回 429"""
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "TASK_EVENTS_MAX_STREAMS", 0)
+        response = client.get(
+            "/crawler/task/task-1/events",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    
+    def test_stream_slot_reserved_at_admission(self, client, admin_token, monkeypatch):
+        """測試名額在接受請求時預留，回應結束後釋放"""
+        from app.core.config import settings
+        from app.core.redis import redis_client
+        from app.services.task_events import (
+            active_event_streams, publish_task_event, release_event_stream, reserve_event_stream
+        )
+        
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        publish_task_event(redis_client, "task-2", "result", {"status": "completed"})
+        monkeypatch.setattr(settings, "TASK_EVENTS_MAX_STREAMS", 1)
+        
+        assert reserve_event_stream()
+        try:
+            assert not reserve_event_stream()
+            response = client.get("/crawler/task/task-2/events", headers=headers)
+            assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        finally:
+            release_event_stream()
+        
+        response = client.get("/crawler/task/task-2/events", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert active_event_streams() == 0
+    
+    def test_stream_does_not_hold_db_session(self, client, admin_token):
+        """測試認證只在快取未命中時短暫開啟資料庫會話，不會在串流期間佔用"""
+        from tests.conftest import TestingSessionLocal
+        from app.main import app
+        from app.core.db import get_session_factory
+        from app.core.redis import redis_client
+        from app.services.task_events import publish_task_event
+        
+        opened = []
+        closed = []
+        
+        def tracking_factory():
+            session = TestingSessionLocal()
+            opened.append(session)
+            close = session.close
+            
+            def _close():
+                closed.append(session)
+                close()
+            
+            session.close = _close
+            return session
+        
+        app.dependency_overrides[get_session_factory] = lambda: tracking_factory
+        publish_task_event(redis_client, "task-3", "result", {"status": "completed"})
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        
+        response = client.get("/crawler/task/task-3/events", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(opened) == 1
+        assert closed == opened
+        
+        # 使用者已在進程內快取，不再開啟會話
+        client.get("/crawler/task/task-3/events", headers=headers)
+        assert len(opened) == 1
+
+
+class TestTaskStatus:
+    """任務狀態查詢測試"""
+    
+    @staticmethod
+    def _store(task_id: str, state: str, result):
+        """以 Celery Redis 結果後端的格式寫入任務狀態"""
+        import json
+        import redis
+        from app.core.celery_app import celery_app
+        from app.core.config import settings
+        
+        client = redis.Redis.from_url(settings.celery_result_backend)
+        client.set(
+            celery_app.backend.get_key_for_task(task_id),
+            json.dumps({"status": state, "result": result, "task_id": task_id})
+        )
+        return client
+    
+    def test_bulk_status(self, client, admin_token):
+        """測試一次查詢多個任務，已結束的任務狀態快取後不再讀取後端"""
+        from app.core.celery_app import celery_app
+        
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        self._store("t-done", "SUCCESS", {"posts_count": 3})
+        self._store("t-run", "PROGRESS", {"status": "正在爬取..."})
+        backend = self._store(
+            "t-fail", "FAILURE",
+            {"exc_type": "ValueError", "exc_message": ["boom"], "exc_module": "builtins"}
+        )
+        
+        response = client.post(
+            "/crawler/tasks/status",
+            json={"task_ids": ["t-done", "t-run", "t-fail", "t-none", "t-done"]},
+            headers=headers
+        )
+        assert response.status_code == status.HTTP_200_OK
+        tasks = response.json()["tasks"]
+        assert [t["status"] for t in tasks] == ["SUCCESS", "PROGRESS", "FAILURE", "PENDING", "SUCCESS"]
+        assert tasks[0]["result"] == {"posts_count": 3}
+        assert tasks[1]["message"] == "正在爬取..."
+        assert tasks[2]["error"] == "boom"
+        
+        # 已結束的任務從快取讀取，進行中的任務仍讀取後端
+        backend.delete(*[celery_app.backend.get_key_for_task(t) for t in ("t-done", "t-run")])
+        response = client.get("/crawler/task/t-done", headers=headers)
+        assert response.json()["result"] == {"posts_count": 3}
+        response = client.get("/crawler/task/t-run", headers=headers)
+        assert response.json()["status"] == "PENDING"
+    
+    def test_bulk_status_limit(self, client, admin_token, monkeypatch):
+        """測試超過每次查詢的任務數上限時返回 422"""
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "TASK_STATUS_BATCH_MAX", 2)
+        response = client.post(
+            "/crawler/tasks/status",
+            json={"task_ids": ["a", "b", "c"]},
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
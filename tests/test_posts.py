@@ -4,6 +4,7 @@
 import pytest
 from fastapi import status
 from app.models.post import Post
+from app.services.post_cache import listing_cache
 
 
 class TestPosts:
@@ -49,6 +50,112 @@ class TestPosts:
         data = response.json()
         assert "data" in data
         assert "count" in data
+        
+        # 第一次未命中時從資料庫回填，之後從快取返回
+        assert data["source"] == "db"
+        assert data["count"] == 3
+        listing_cache.clear()
+        data = client.get("/posts/").json()
+        assert data["source"] == "cache"
+        assert {p["uid"] for p in data["data"]} == {"post-1", "post-2", "post-3"}
+    
+    def test_get_posts_materialized_page(self, client, db, sample_posts):
+        """測試直接返回爬取完成時預先渲染的列表頁"""
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import listing_pages_key, warm_post_listing
+        
+        warm_post_listing(redis_cache_client, db, ["video"])
+        redis_cache_client.hset(listing_pages_key("video"), "0", b'{"materialized":true}')
+        
+        response = client.get("/posts/?category=video")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"materialized": True}
+        # 其他頁面大小動態組裝
+        assert client.get("/posts/?category=video&limit=5").json()["count"] == 1
+    
+    def test_conditional_get(self, client, db, sample_posts):
+        """測試列表內容版本的 ETag / Last-Modified 與 304 回應"""
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import invalidate_listing_cache, warm_post_listing
+        
+        response = client.get("/posts/")
+        assert "ETag" not in response.headers
+        assert response.headers["Cache-Control"] == "public, no-cache"
+        
+        warm_post_listing(redis_cache_client, db, ["video"])
+        invalidate_listing_cache()
+        response = client.get("/posts/?category=video")
+        etag = response.headers["ETag"]
+        assert etag.startswith('W/"1-')
+        
+        not_modified = client.get("/posts/?category=video", headers={"If-None-Match": etag})
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert not_modified.content == b""
+        assert not_modified.headers["ETag"] == etag
+        since = client.get("/posts/?category=video", headers={
+            "If-Modified-Since": response.headers["Last-Modified"]
+        })
+        assert since.status_code == status.HTTP_304_NOT_MODIFIED
+        categories = client.get("/posts/categories")
+        assert client.get("/posts/categories", headers={
+            "If-None-Match": categories.headers["ETag"]
+        }).status_code == status.HTTP_304_NOT_MODIFIED
+        
+        # 再次爬取寫入後版本遞增
+        warm_post_listing(redis_cache_client, db, ["video"])
+        invalidate_listing_cache()
+        response = client.get("/posts/?category=video", headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"].startswith('W/"2-')
+        assert response.json()["count"] == 1
+    
+    def test_cached_listing_opens_no_session(self, client, sample_posts):
+        """測試只有回填時才開啟資料庫會話，命中快取和 304 回應不開啟"""
+        from tests.conftest import TestingSessionLocal
+        from app.main import app
+        from app.core.db import get_read_session_factory
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import bump_listing_version
+        
+        bump_listing_version(redis_cache_client, "text")
+        opened = []
+        
+        def counting_factory():
+            opened.append(1)
+            return TestingSessionLocal()
+        
+        app.dependency_overrides[get_read_session_factory] = lambda: counting_factory
+        first = client.get("/posts/?category=text")
+        assert first.json()["count"] == 1
+        assert len(opened) == 1
+        
+        assert client.get("/posts/?category=text").content == first.content
+        response = client.get("/posts/?category=text", headers={"If-None-Match": first.headers["ETag"]})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(opened) == 1
+    
+    def test_listing_cache_invalidation(self, client, sample_posts):
+        """測試進程內列表快取在收到失效通知前返回相同內容"""
+        import time
+        from app.core.redis import redis_client, redis_cache_client
+        from app.services.post_service import save_posts_to_redis
+        from app.services.post_cache import publish_listing_invalidation
+        
+        first = client.get("/posts/?category=text")
+        assert first.json()["count"] == 1
+        
+        save_posts_to_redis(redis_cache_client, [{
+            "uid": "post-new", "post_url": "https://facebook.com/post/new",
+            "category": "text", "timestamp": time.time()
+        }])
+        assert client.get("/posts/?category=text").content == first.content
+        
+        publish_listing_invalidation(redis_client, ["text"])
+        deadline = time.monotonic() + 5
+        while len(listing_cache) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        data = client.get("/posts/?category=text").json()
+        assert data["data"][0]["uid"] == "post-new"
     
     def test_get_posts_from_database(self, client, sample_posts):
         """測試從資料庫獲取貼文"""
@@ -78,6 +185,125 @@ class TestPosts:
         data = response.json()
         assert len(data["data"]) == 1
     
+    def test_get_posts_with_time_range(self, client, db, sample_posts):
+        """測試按爬取時間範圍篩選"""
+        from datetime import datetime, timedelta
+        
+        old_post = Post(
+            uid="post-old",
+            post_url="https://facebook.com/post/old",
+            category="text",
+            crawled_at=datetime.utcnow() - timedelta(days=90)
+        )
+        db.add(old_post)
+        db.commit()
+        
+        since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+        response = client.get(f"/posts/db?since={since}")
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["count"] == 3
+        assert "post-old" not in [p["uid"] for p in data["data"]]
+        
+        until = (datetime.utcnow() - timedelta(days=30)).isoformat()
+        response = client.get(f"/posts/db?until={until}")
+        data = response.json()
+        assert [p["uid"] for p in data["data"]] == ["post-old"]
+    
+    def test_fields_projection(self, client, sample_posts):
+        """測試 fields= 只返回指定欄位（資料庫與快取路徑）"""
+        expected = {
+            "post-1": {"uid": "post-1", "post_url": "https://facebook.com/post/1", "category": "text"},
+            "post-2": {"uid": "post-2", "post_url": "https://facebook.com/post/2", "category": "video"},
+            "post-3": {"uid": "post-3", "post_url": "https://facebook.com/post/3", "category": "image"},
+        }
+        data = client.get("/posts/db", params={"fields": "category,uid,post_url"}).json()
+        assert {p["uid"]: p for p in data["data"]} == expected
+        
+        # 第一次從資料庫回填，第二次從快取讀取後投影
+        for source in ("db", "cache"):
+            listing_cache.clear()
+            data = client.get("/posts/", params={"fields": "uid,post_url,category"}).json()
+            assert data["source"] == source
+            assert {p["uid"]: p for p in data["data"]} == expected
+        
+        # 投影與完整回應分別快取
+        assert "reactions" in client.get("/posts/").json()["data"][0]
+        
+        response = client.get("/posts/db", params={"fields": "uid,password"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.get("/posts/", params={"fields": "uid,password"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_response_compression(self, client, db):
+        """測試依 Accept-Encoding 與大小門檻壓縮回應"""
+        from app.core.compression import choose_encoding
+        
+        db.add_all([
+            Post(uid=f"bulk-{i:03d}", post_url=f"https://facebook.com/post/bulk/{i}", category="text")
+            for i in range(100)
+        ])
+        db.commit()
+        
+        response = client.get("/posts/db?limit=100", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.num_bytes_downloaded < len(response.content)
+        assert response.json()["count"] == 100
+        
+        response = client.get("/posts/db?limit=100", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+        response = client.get("/posts/db?limit=1", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        
+        assert choose_encoding("gzip;q=0.5, br;q=0") == "gzip"
+        assert choose_encoding("deflate") is None
+        assert choose_encoding("*") in ("br", "gzip")
+    
+    def test_export_ndjson_and_resume(self, client, sample_posts, admin_token):
+        """測試 NDJSON 匯出與斷點續傳"""
+        import json
+        
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.get("/posts/export", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 3
+        
+        last = rows[0]
+        response = client.get(
+            "/posts/export",
+            headers=headers,
+            params={"after_crawled_at": last["crawled_at"], "after_uid": last["uid"]}
+        )
+        resumed = [json.loads(line) for line in response.text.splitlines()]
+        assert [r["uid"] for r in resumed] == [r["uid"] for r in rows[1:]]
+    
+    def test_export_csv_gzip(self, client, sample_posts, admin_token):
+        """測試 gzip 壓縮的 CSV 匯出"""
+        import csv
+        import gzip
+        import io
+        
+        response = client.get(
+            "/posts/export?format=csv&compress=true&category=video",
+            headers={"Authorization": f"Bearer {admin_token}"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/gzip"
+        text = gzip.decompress(response.content).decode("utf-8")
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert [r["uid"] for r in rows] == ["post-2"]
+    
+    def test_export_requires_admin(self, client, sample_posts, auth_token):
+        """測試匯出需要 admin1 權限"""
+        response = client.get(
+            "/posts/export",
+            headers={"Authorization": f"Bearer {auth_token}"}
+        )
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    
     def test_get_categories_stats(self, client, sample_posts):
         """測試類別統計"""
         response = client.get("/posts/categories")
@@ -0,0 +1,148 @@
+"""
+Redis Cluster 測試
+Cluster 整合測試需設定 TEST_REDIS_CLUSTER_URL（任一節點位址，測試會清空該 Cluster），
+例如使用 DEPLOYMENT.md 中的本機六節點 Cluster：redis://127.0.0.1:7000/0
+"""
+import os
+import pytest
+import pytest_asyncio
+from redis.crc import key_slot
+from app.services.post_service import (
+    POSTS_INDEX_KEY,
+    LEGACY_CATEGORY,
+    category_index_key,
+    index_member,
+    parse_index_member,
+    post_key
+)
+
+TEST_REDIS_CLUSTER_URL = os.getenv("TEST_REDIS_CLUSTER_URL")
+
+
+def _posts(count: int):
+    categories = ("text", "image", "video", "reels", None)
+    return [
+        {"uid": f"cl-{i:03d}", "post_url": f"https://facebook.com/cl/{i}",
+         "category": categories[i % 5], "timestamp": 1714564800.0 - i}
+        for i in range(count)
+    ]
+
+
+class TestClusterKeySchema:
+    """貼文鍵的 hash tag 測試"""
+    
+    def test_category_keys_share_slot(self):
+        """測試類別索引與該類別的貼文內容位於同一個 slot"""
+        for category in ("text", "video", None):
+            index_slot = key_slot(category_index_key(category or "_").encode())
+            assert key_slot(post_key("p-1", category).encode()) == index_slot
+            assert key_slot(post_key("p-2:x", category).encode()) == index_slot
+        assert key_slot(post_key("p-1", "text").encode()) != key_slot(post_key("p-1", "video").encode())
+    
+    def test_index_member_roundtrip(self):
+        """測試全域索引成員的編碼與解析（UID 可包含冒號）"""
+        assert index_member("p-1", "video") == "video:p-1"
+        assert parse_index_member(b"video:p-1") == ("video", "p-1")
+        assert parse_index_member(index_member("a:b", None)) == (None, "a:b")
+        assert parse_index_member(b"p-1") == (LEGACY_CATEGORY, "p-1")
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not TEST_REDIS_CLUSTER_URL, reason="需要設定 TEST_REDIS_CLUSTER_URL")
+class TestRedisCluster:
+    """Redis Cluster 整合測試"""
+    
+    @pytest.fixture
+    def cluster(self):
+        from redis.cluster import RedisCluster
+        
+        client = RedisCluster.from_url(TEST_REDIS_CLUSTER_URL)
+        client.flushdb(target_nodes=RedisCluster.PRIMARIES)
+        try:
+            yield client
+        finally:
+            client.flushdb(target_nodes=RedisCluster.PRIMARIES)
+            client.close()
+    
+    @pytest_asyncio.fixture
+    async def async_cluster(self, cluster):
+        from redis.asyncio.cluster import RedisCluster
+        
+        client = RedisCluster.from_url(TEST_REDIS_CLUSTER_URL)
+        try:
+            yield client
+        finally:
+            await client.aclose()
+    
+    def test_save_and_list(self, cluster):
+        """測試寫入後讀取全域和類別列表，並清理過期貼文"""
+        from app.services.post_service import save_posts_to_redis, get_posts_from_redis
+        
+        posts = _posts(50)
+        assert save_posts_to_redis(cluster, posts) == 50
+        assert cluster.zcard(POSTS_INDEX_KEY) == 50
+        
+        page = get_posts_from_redis(cluster, limit=10, offset=5)
+        assert [p["uid"] for p in page] == [f"cl-{i:03d}" for i in range(5, 15)]
+        
+        cluster.delete(post_key("cl-002", "video"))
+        videos = get_posts_from_redis(cluster, category="video", limit=3)
+        assert [p["uid"] for p in videos] == ["cl-007", "cl-012", "cl-017"]
+        assert cluster.zscore(category_index_key("video"), "cl-002") is None
+        # 類別列表的腳本不跨 slot，全域索引的成員由清理任務移除
+        assert cluster.zscore(POSTS_INDEX_KEY, "video:cl-002") is not None
+        
+        cluster.delete(post_key("cl-001", "image"), post_key("cl-004", None))
+        page = get_posts_from_redis(cluster, limit=4)
+        assert [p["uid"] for p in page] == ["cl-000", "cl-003", "cl-005", "cl-006"]
+        assert cluster.zscore(POSTS_INDEX_KEY, "image:cl-001") is None
+        assert cluster.zscore(category_index_key("image"), "cl-001") is None
+    
+    def test_range_and_cleanup(self, cluster):
+        """測試時間範圍游標分頁和索引清理"""
+        from app.services.post_service import (
+            save_posts_to_redis, get_posts_range_from_redis, cleanup_expired_index_members
+        )
+        
+        save_posts_to_redis(cluster, _posts(30))
+        cluster.delete(*[post_key(f"cl-{i:03d}", "text") for i in range(0, 30, 5)])
+        
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = get_posts_range_from_redis(cluster, limit=7, cursor=cursor)
+            seen.extend(p["uid"] for p in page)
+            if not cursor:
+                break
+        assert seen == [f"cl-{i:03d}" for i in range(30) if i % 5]
+        
+        cluster.delete(post_key("cl-003", "reels"))
+        result = cleanup_expired_index_members(cluster, batch_size=10, time_budget=60)
+        assert result["completed"]
+        assert result["deleted_count"] == 1
+        assert cluster.zcard(POSTS_INDEX_KEY) == 23
+        assert cluster.zcard(category_index_key("reels")) == 5
+    
+    @pytest.mark.asyncio
+    async def test_async_client(self, async_cluster):
+        """測試非同步 Cluster 客戶端的寫入和讀取"""
+        from app.services.post_service import save_posts_to_redis_async, get_posts_from_redis_async
+        
+        assert await save_posts_to_redis_async(async_cluster, _posts(20)) == 20
+        page = await get_posts_from_redis_async(async_cluster, limit=5)
+        assert [p["uid"] for p in page] == [f"cl-{i:03d}" for i in range(5)]
+        page = await get_posts_from_redis_async(async_cluster, category="image", limit=2)
+        assert [p["uid"] for p in page] == ["cl-001", "cl-006"]
+    
+    @pytest.mark.asyncio
+    async def test_async_token_lifecycle(self, cluster):
+        """測試 Token 的兩個鍵分屬不同 slot 時仍可寫入和驗證"""
+        from redis.asyncio.cluster import RedisCluster
+        from app.services.auth import create_access_token_async, validate_token_async
+        
+        client = RedisCluster.from_url(TEST_REDIS_CLUSTER_URL, decode_responses=True)
+        try:
+            token = await create_access_token_async("cluster-user", client)
+            assert await validate_token_async(token, client) == "cluster-user"
+        finally:
+            await client.aclose()
@@ -0,0 +1,114 @@
+"""
+貼文搜尋測試
+PostgreSQL 整合測試需設定 TEST_POSTGRES_URL（會在該資料庫建立並刪除 posts 表）
+"""
+import os
+import json
+import pytest
+from fastapi import status
+from app.services.post_service import encode_cursor, decode_cursor
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+class TestSearchCursor:
+    """搜尋游標測試"""
+    
+    def test_cursor_roundtrip(self):
+        """測試游標編碼與解碼"""
+        from datetime import datetime
+        
+        crawled_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+        cursor = encode_cursor([0.4285714328289032, crawled_at, "post-1"])
+        assert decode_cursor(cursor) == [0.4285714328289032, crawled_at.isoformat(), "post-1"]
+    
+    def test_invalid_cursor(self, client):
+        """測試無效游標返回 400"""
+        response = client.get("/posts/search?q=facebook&cursor=not-a-cursor")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_query_too_short(self, client):
+        """測試搜尋字串太短"""
+        response = client.get("/posts/search?q=ab")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="需要設定 TEST_POSTGRES_URL")
+class TestSearchPostgres:
+    """PostgreSQL trigram 搜尋整合測試"""
+    
+    @pytest.fixture
+    def pg_session(self):
+        """建立含大量貼文的 PostgreSQL 會話"""
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        from app.core.db import Base
+        from app.core.partitions import ensure_post_partitions
+        from app.models.post import Post
+        
+        engine = create_engine(TEST_POSTGRES_URL)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        Base.metadata.drop_all(bind=engine, tables=[Post.__table__])
+        Base.metadata.create_all(bind=engine, tables=[Post.__table__])
+        ensure_post_partitions(engine, months_ahead=0)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO posts (uid, post_url, category, content, crawled_at) "
+                "SELECT 'uid-' || i, "
+                "'https://www.facebook.com/page' || (i % 500) || '/posts/' || i, "
+                "(ARRAY['text','image','video','reels'])[i % 4 + 1], "
+                "'post body ' || md5(i::text), "
+                "now() AT TIME ZONE 'utc' "
+                "FROM generate_series(1, 50000) AS i"
+            ))
+            conn.execute(text(
+                "INSERT INTO posts (uid, post_url, category, content, crawled_at) VALUES "
+                "('needle-1', 'https://www.facebook.com/needlepage/posts/1', 'video', 'needle', now() AT TIME ZONE 'utc'), "
+                "('needle-2', 'https://www.facebook.com/needlepage/posts/2', 'text', 'needle', now() AT TIME ZONE 'utc'), "
+                "('needle-3', 'https://www.facebook.com/other/posts/3', 'text', 'about a needlepage', now() AT TIME ZONE 'utc')"
+            ))
+            conn.execute(text("ANALYZE posts"))
+        
+        session = sessionmaker(bind=engine)()
+        try:
+            yield session
+        finally:
+            session.close()
+            Base.metadata.drop_all(bind=engine, tables=[Post.__table__])
+            engine.dispose()
+    
+    def test_search_uses_trigram_index(self, pg_session):
+        """測試搜尋查詢使用 trigram GIN 索引而非順序掃描"""
+        from app.services.post_service import build_search_statement
+        
+        compiled = build_search_statement("needlepage", limit=20).compile(
+            dialect=pg_session.bind.dialect
+        )
+        plan = pg_session.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}",
+            compiled.params
+        ).scalar()
+        plan_text = json.dumps(plan)
+        
+        assert "Bitmap Index Scan" in plan_text
+        assert "trgm" in plan_text or "post_url" in plan_text
+        assert "Seq Scan" not in plan_text
+    
+    def test_search_ranking_and_pagination(self, pg_session):
+        """測試搜尋排序與鍵集分頁"""
+        from app.services.post_service import search_posts
+        
+        first_page, cursor = search_posts(pg_session, "needlepage", limit=2)
+        assert len(first_page) == 2
+        assert cursor is not None
+        assert first_page[0]["rank"] >= first_page[1]["rank"]
+        
+        second_page, cursor = search_posts(pg_session, "needlepage", limit=2, cursor=cursor)
+        uids = [p["uid"] for p in first_page + second_page]
+        assert sorted(uids) == ["needle-1", "needle-2", "needle-3"]
+        assert cursor is None
+        
+        video_only, _ = search_posts(pg_session, "needlepage", category="video")
+        assert [p["uid"] for p in video_only] == ["needle-1"]
@@ -2,6 +2,7 @@
 服務層測試
 """
 import pytest
+import pytest_asyncio
 from app.services.auth import (
     verify_password,
     get_password_hash,
@@ -42,6 +43,153 @@ class TestAuthService:
         # 驗證無效 Token
         invalid_username = validate_token("invalid.token.here")
         assert invalid_username is None
+    
+    @pytest.mark.asyncio
+    async def test_async_token_lifecycle(self):
+        """測試非同步 Redis 客戶端的 Token 創建、驗證與撤銷"""
+        from app.core.redis import AsyncRedisClient
+        from app.services.auth import (
+            create_access_token_async, validate_token_async, revoke_token_async
+        )
+        
+        redis = AsyncRedisClient._create(True)
+        try:
+            token = await create_access_token_async("asyncuser", redis)
+            assert await validate_token_async(token, redis) == "asyncuser"
+            # 同步版本讀取同一份 Redis 資料
+            assert validate_token(token) == "asyncuser"
+            
+            assert await revoke_token_async("asyncuser", redis)
+            assert await validate_token_async(token, redis) is None
+        finally:
+            await redis.aclose(close_connection_pool=True)
+    
+    @pytest.mark.asyncio
+    async def test_token_cache_fast_path(self):
+        """測試已驗證的 Token 不再查詢 Redis，撤銷和重新登入時刪除快取"""
+        from app.core.redis import AsyncRedisClient, redis_client
+        from app.services.auth import (
+            create_access_token_async, validate_token_async, revoke_token_async, token_cache
+        )
+        
+        redis = AsyncRedisClient._create(True)
+        try:
+            token = await create_access_token_async("cacheuser", redis)
+            assert await validate_token_async(token, redis) == "cacheuser"
+            
+            # 命中快取時只驗證簽章，直接刪除 Redis 中的鍵不影響結果
+            redis_client.delete("user_token:cacheuser")
+            assert await validate_token_async(token, redis) == "cacheuser"
+            
+            # 重新登入後舊 Token 的快取被刪除
+            new_token = await create_access_token_async("cacheuser", redis)
+            assert token_cache.get("cacheuser") is None
+            assert await validate_token_async(token, redis) is None
+            assert await validate_token_async(new_token, redis) == "cacheuser"
+            
+            assert await revoke_token_async("cacheuser", redis)
+            assert token_cache.get("cacheuser") is None
+            assert await validate_token_async(new_token, redis) is None
+        finally:
+            await redis.aclose(close_connection_pool=True)
+    
+    def test_invalidate_auth_cache(self):
+        """測試撤銷通知刪除單一使用者，重新訂閱時清空全部"""
+        from app.models.user import User
+        from app.services.auth import cache_user, get_cached_user, invalidate_auth_cache, token_cache
+        
+        token_cache.set("alice", "t1")
+        token_cache.set("bob", "t2")
+        cache_user(User(id=1, username="alice", hashed_password="x"))
+        assert get_cached_user("alice").id == 1
+        
+        invalidate_auth_cache(b"alice")
+        assert token_cache.get("alice") is None
+        assert get_cached_user("alice") is None
+        assert token_cache.get("bob") == "t2"
+        
+        invalidate_auth_cache(None)
+        assert token_cache.get("bob") is None
+    
+    @pytest.mark.asyncio
+    async def test_verify_password_async_rehash(self, monkeypatch):
+        """測試在執行緒池中驗證密碼，並在開啟時升級低成本的雜湊"""
+        from passlib.hash import bcrypt
+        from app.core.config import settings
+        from app.services import auth
+        
+        legacy = bcrypt.using(rounds=4).hash("secret")
+        monkeypatch.setattr(settings, "PASSWORD_BCRYPT_ROUNDS", 5)
+        monkeypatch.setattr(auth, "pwd_context", auth._build_password_context())
+        
+        assert await auth.verify_password_async("secret", legacy) == (True, None)
+        assert await auth.verify_password_async("wrong", legacy) == (False, None)
+        
+        monkeypatch.setattr(settings, "PASSWORD_REHASH_ON_LOGIN", True)
+        valid, new_hash = await auth.verify_password_async("secret", legacy)
+        assert valid
+        assert new_hash.startswith("$2b$05$")
+        assert await auth.verify_password_async("secret", new_hash) == (True, None)
+
+
+class TestBoundedExecutor:
+    """有界執行緒池測試"""
+    
+    @pytest.mark.asyncio
+    async def test_rejects_when_full(self):
+        """測試執行中加排隊中的工作達到上限時拒絕新工作"""
+        import asyncio
+        import threading
+        from app.core.executor import BoundedExecutor, ExecutorBusyError
+        
+        executor = BoundedExecutor("test-pool", max_workers=1, max_pending=2)
+        release = threading.Event()
+        try:
+            blocked = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            assert executor.pending == 2
+            with pytest.raises(ExecutorBusyError):
+                await executor.run(sum, [1, 2])
+            
+            release.set()
+            assert await asyncio.gather(*blocked) == [True, True]
+            assert await executor.run(sum, [1, 2]) == 3
+            assert executor.pending == 0
+        finally:
+            release.set()
+            executor.shutdown()
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_keeps_slot_until_work_ends(self):
+        """測試等待方被取消時，名額保留到執行中的工作實際結束"""
+        import asyncio
+        import threading
+        from app.core.executor import BoundedExecutor, ExecutorBusyError
+        
+        executor = BoundedExecutor("test-pool", max_workers=1, max_pending=2)
+        release = threading.Event()
+        try:
+            running = asyncio.ensure_future(executor.run(release.wait, 5))
+            queued = asyncio.ensure_future(executor.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            running.cancel()
+            queued.cancel()
+            await asyncio.sleep(0.05)
+            
+            # 排隊中的工作被取消並釋放名額，執行中的工作仍佔用名額
+            assert executor.pending == 1
+            blocked = asyncio.ensure_future(executor.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            with pytest.raises(ExecutorBusyError):
+                await executor.run(sum, [1, 2])
+            
+            release.set()
+            assert await blocked is True
+            await asyncio.sleep(0.05)
+            assert executor.pending == 0
+        finally:
+            release.set()
+            executor.shutdown()
 
 
 class TestPostService:
@@ -75,3 +223,826 @@ class TestPostService:
         # 重複儲存不應增加數量
         count = save_posts_to_db(db, posts_data)
         assert count == 0
+    
+    def test_save_posts_to_db_skips_duplicate_uids(self, db):
+        """測試同一 UID 只保存一次（批次內重複或已存在於資料庫）"""
+        from app.services.post_service import save_posts_to_db
+        from app.models.post import Post
+        
+        posts_data = [
+            {"uid": "dup-1", "post_url": "https://facebook.com/dup/1", "timestamp": 1714564800.0},
+            {"uid": "dup-1", "post_url": "https://facebook.com/dup/1", "timestamp": 1714564900.0},
+        ]
+        assert save_posts_to_db(db, posts_data) == 1
+        assert save_posts_to_db(db, posts_data[1:]) == 0
+        assert db.query(Post).filter(Post.uid == "dup-1").count() == 1
+    
+    def test_save_posts_to_db_with_timestamp(self, db):
+        """測試爬蟲時間戳寫入 crawled_at"""
+        from datetime import datetime
+        from app.services.post_service import save_posts_to_db
+        from app.models.post import Post
+        
+        save_posts_to_db(db, [{
+            "uid": "test-ts",
+            "post_url": "https://facebook.com/test/ts",
+            "category": "text",
+            "timestamp": 1714564800.0
+        }])
+        
+        post = db.query(Post).filter(Post.uid == "test-ts").first()
+        assert post.crawled_at == datetime(2024, 5, 1, 12, 0)
+    
+    def test_save_posts_to_redis(self):
+        """測試批次儲存貼文到 Redis"""
+        from app.core.redis import redis_client
+        from app.core.config import settings
+        from app.services.post_service import save_posts_to_redis, post_key
+        
+        posts = [
+            {"uid": f"redis-{i}", "post_url": f"https://facebook.com/p/{i}",
+             "category": "text", "timestamp": 1714564800.0 - i}
+            for i in range(5)
+        ]
+        
+        assert save_posts_to_redis(redis_client, posts) == 5
+        assert redis_client.zcard("posts:index") == 5
+        assert redis_client.zscore("posts:index", "text:redis-0") == 1714564800.0
+        assert redis_client.zrevrange("posts:index", 0, 1) == ["text:redis-0", "text:redis-1"]
+        assert redis_client.zrevrange("posts:index:{text}", 0, 1) == ["redis-0", "redis-1"]
+        assert post_key("redis-3", "text") == "post:{text}:redis-3"
+        assert 0 < redis_client.ttl(post_key("redis-3", "text")) <= settings.REDIS_POST_TTL
+    
+    def test_get_posts_from_redis_by_category(self):
+        """測試類別索引的精確分頁與過期清理"""
+        from app.core.redis import redis_client
+        from app.services.post_service import (
+            save_posts_to_redis, get_posts_from_redis, post_key, category_index_key
+        )
+        
+        # 20 則文字貼文中夾雜 3 則影片貼文
+        posts = [
+            {"uid": f"p-{i}", "post_url": f"https://facebook.com/p/{i}",
+             "category": "video" if i % 7 == 0 else "text",
+             "timestamp": 1714564800.0 - i}
+            for i in range(20)
+        ]
+        save_posts_to_redis(redis_client, posts)
+        
+        videos = get_posts_from_redis(redis_client, category="video", limit=2)
+        assert [p["uid"] for p in videos] == ["p-0", "p-7"]
+        videos = get_posts_from_redis(redis_client, category="video", limit=2, offset=2)
+        assert [p["uid"] for p in videos] == ["p-14"]
+        
+        # 過期貼文從全域和類別索引中移除
+        redis_client.delete(post_key("p-7", "video"))
+        videos = get_posts_from_redis(redis_client, category="video", limit=10)
+        assert [p["uid"] for p in videos] == ["p-0", "p-14"]
+        assert redis_client.zscore(category_index_key("video"), "p-7") is None
+        assert redis_client.zscore("posts:index", "video:p-7") is None
+    
+    def test_get_posts_from_redis_refills_expired(self):
+        """測試過期貼文造成頁面不足時向後補齊"""
+        from app.core.redis import redis_client
+        from app.services.post_service import (
+            save_posts_to_redis, get_posts_from_redis, post_key, category_index_key
+        )
+        
+        posts = [
+            {"uid": f"r-{i}", "post_url": f"https://facebook.com/r/{i}",
+             "category": "text", "timestamp": 1714564800.0 - i}
+            for i in range(10)
+        ]
+        save_posts_to_redis(redis_client, posts)
+        redis_client.delete(*[post_key(f"r-{i}", "text") for i in (1, 2, 4)])
+        
+        page = get_posts_from_redis(redis_client, limit=4)
+        assert [p["uid"] for p in page] == ["r-0", "r-3", "r-5", "r-6"]
+        assert redis_client.zcard("posts:index") == 7
+        assert redis_client.zcard(category_index_key("text")) == 7
+        
+        # 清理後下一頁從正確位置開始
+        page = get_posts_from_redis(redis_client, limit=4, offset=4)
+        assert [p["uid"] for p in page] == ["r-7", "r-8", "r-9"]
+    
+    def test_legacy_index_members_are_pruned(self):
+        """測試升級前只有 UID 的全域索引成員不會中斷讀取，並以原始成員移除"""
+        from app.core.redis import redis_client
+        from app.services.post_service import (
+            save_posts_to_redis, get_posts_from_redis, get_posts_range_from_redis,
+            cleanup_expired_index_members
+        )
+        
+        posts = [
+            {"uid": f"n-{i}", "post_url": f"https://facebook.com/n/{i}",
+             "category": "text", "timestamp": 1714564800.0 - i * 2}
+            for i in range(3)
+        ]
+        save_posts_to_redis(redis_client, posts)
+        legacy = {f"old-{i}": 1714564799.0 - i * 2 for i in range(3)}
+        redis_client.zadd("posts:index", legacy)
+        
+        page = get_posts_from_redis(redis_client, limit=10)
+        assert [p["uid"] for p in page] == ["n-0", "n-1", "n-2"]
+        assert redis_client.zcard("posts:index") == 3
+        
+        redis_client.zadd("posts:index", legacy)
+        page, _ = get_posts_range_from_redis(redis_client, limit=10)
+        assert [p["uid"] for p in page] == ["n-0", "n-1", "n-2"]
+        assert redis_client.zcard("posts:index") == 3
+        
+        redis_client.zadd("posts:index", legacy)
+        result = cleanup_expired_index_members(redis_client, batch_size=50, time_budget=60)
+        assert result["deleted_count"] == 3
+        assert redis_client.zscore("posts:index", "old-0") is None
+        assert redis_client.zcard("posts:index") == 3
+    
+    def test_cleanup_expired_index_members(self):
+        """測試沿索引增量清理過期貼文並保存游標"""
+        from app.core.redis import redis_cache_client
+        from app.services.post_service import (
+            POSTS_CLEANUP_CURSOR_KEY, save_posts_to_redis, cleanup_expired_index_members,
+            post_key, category_index_key
+        )
+        
+        posts = [
+            {"uid": f"c-{i}", "post_url": f"https://facebook.com/c/{i}",
+             "category": "video" if i % 2 else "text", "timestamp": 1714564800.0 - i}
+            for i in range(300)
+        ]
+        save_posts_to_redis(redis_cache_client, posts)
+        redis_cache_client.delete(*[
+            post_key(p["uid"], p["category"]) for p in posts[::3]
+        ])
+        
+        # 時間預算為 0 時每次只處理一批，游標保存到下次
+        result = cleanup_expired_index_members(redis_cache_client, batch_size=50, time_budget=0)
+        assert not result["completed"]
+        assert redis_cache_client.get(POSTS_CLEANUP_CURSOR_KEY) is not None
+        
+        total = result["deleted_count"]
+        runs = 1
+        while not result["completed"]:
+            result = cleanup_expired_index_members(redis_cache_client, batch_size=50, time_budget=0)
+            total += result["deleted_count"]
+            runs += 1
+        assert runs > 1
+        assert total == 100
+        assert redis_cache_client.get(POSTS_CLEANUP_CURSOR_KEY) is None
+        assert redis_cache_client.zcard("posts:index") == 200
+        assert sum(redis_cache_client.zcard(category_index_key(c)) for c in ("text", "video")) == 200
+        assert redis_cache_client.zscore(category_index_key("video"), "c-3") is None
+    
+    def test_cleanup_task_bumps_listing_version(self):
+        """測試清理任務移除過期貼文時遞增受影響類別和全域列表的內容版本"""
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import listing_version_key
+        from app.services.post_service import save_posts_to_redis, post_key
+        from app.tasks import crawler_tasks
+        
+        posts = [
+            {"uid": f"v-{i}", "post_url": f"https://facebook.com/v/{i}",
+             "category": "video" if i % 2 else "text", "timestamp": 1714564800.0 - i}
+            for i in range(4)
+        ]
+        save_posts_to_redis(redis_cache_client, posts)
+        
+        result = crawler_tasks.cleanup_old_posts()
+        assert result["deleted_count"] == 0
+        assert redis_cache_client.hget(listing_version_key(), "version") is None
+        
+        redis_cache_client.delete(post_key("v-1", "video"))
+        result = crawler_tasks.cleanup_old_posts()
+        assert result["categories"] == ["video"]
+        assert int(redis_cache_client.hget(listing_version_key(), "version")) == 1
+        assert int(redis_cache_client.hget(listing_version_key("video"), "version")) == 1
+        assert redis_cache_client.hget(listing_version_key("text"), "version") is None
+    
+    def test_get_posts_from_redis_reloads_flushed_script(self):
+        """測試伺服器腳本快取被清空後自動重新載入讀取腳本"""
+        import hashlib
+        from app.core.redis import redis_cache_client
+        from app.services.post_service import (
+            FETCH_PAGE_SCRIPT, save_posts_to_redis, get_posts_from_redis,
+            post_key, category_index_key
+        )
+        
+        posts = [
+            {"uid": f"s-{i}", "post_url": f"https://facebook.com/s/{i}",
+             "category": "video", "timestamp": 1714564800.0 - i}
+            for i in range(3)
+        ]
+        save_posts_to_redis(redis_cache_client, posts)
+        sha = hashlib.sha1(FETCH_PAGE_SCRIPT.encode("utf-8")).hexdigest()
+        
+        assert [p["uid"] for p in get_posts_from_redis(redis_cache_client, limit=2)] == ["s-0", "s-1"]
+        assert redis_cache_client.script_exists(sha) == [True]
+        
+        redis_cache_client.script_flush()
+        redis_cache_client.delete(post_key("s-1", "video"))
+        page = get_posts_from_redis(redis_cache_client, category="video", limit=2)
+        assert [p["uid"] for p in page] == ["s-0", "s-2"]
+        assert redis_cache_client.script_exists(sha) == [True]
+        assert redis_cache_client.zscore(category_index_key("video"), "s-1") is None
+    
+    def test_get_posts_range_from_redis(self):
+        """測試時間範圍查詢與分數游標分頁"""
+        from app.core.redis import redis_client
+        from app.services.post_service import save_posts_to_redis, get_posts_range_from_redis
+        
+        base = 1714564800.0
+        posts = [
+            {"uid": f"t-{i:02d}", "post_url": f"https://facebook.com/t/{i}",
+             "category": "image" if i % 2 else "text", "timestamp": base - i * 60}
+            for i in range(12)
+        ]
+        # 兩則同分貼文，驗證同分成員的游標處理
+        posts.append({"uid": "t-tie", "post_url": "https://facebook.com/t/tie",
+                      "category": "text", "timestamp": base - 4 * 60})
+        save_posts_to_redis(redis_client, posts)
+        
+        page, cursor = get_posts_range_from_redis(
+            redis_client, limit=3, since=base - 8 * 60, until=base
+        )
+        assert [p["uid"] for p in page] == ["t-01", "t-02", "t-03"]
+        
+        # 分頁過程中寫入更新的貼文不影響後續頁面
+        save_posts_to_redis(redis_client, [{"uid": "t-new", "post_url": "x",
+                                            "category": "text", "timestamp": base - 30}])
+        
+        seen = [p["uid"] for p in page]
+        while cursor:
+            page, cursor = get_posts_range_from_redis(
+                redis_client, limit=3, since=base - 8 * 60, until=base, cursor=cursor
+            )
+            seen.extend(p["uid"] for p in page)
+        assert seen == ["t-01", "t-02", "t-03", "t-tie", "t-04", "t-05", "t-06", "t-07", "t-08"]
+        
+        page, _ = get_posts_range_from_redis(redis_client, category="text", limit=10, since=base - 4 * 60)
+        assert [p["uid"] for p in page] == ["t-00", "t-new", "t-02", "t-tie", "t-04"]
+    
+    def test_get_posts_range_many_ties(self, monkeypatch):
+        """測試同分成員超過 limit × 輪數時游標仍會前進"""
+        from app.core.config import settings
+        from app.core.redis import redis_client
+        from app.services.post_service import save_posts_to_redis, get_posts_range_from_redis
+        
+        monkeypatch.setattr(settings, "REDIS_READ_MAX_ROUNDS", 2)
+        posts = [
+            {"uid": f"tie-{i:02d}", "post_url": f"https://facebook.com/tie/{i}",
+             "category": "text", "timestamp": 1714564800.0}
+            for i in range(25)
+        ]
+        save_posts_to_redis(redis_client, posts)
+        
+        seen = []
+        cursor = None
+        for _ in range(20):
+            page, cursor = get_posts_range_from_redis(redis_client, category="text", limit=2, cursor=cursor)
+            seen.extend(p["uid"] for p in page)
+            if not cursor:
+                break
+        assert cursor is None
+        assert seen == [f"tie-{i:02d}" for i in reversed(range(25))]
+
+
+class TestPostCache:
+    """讀穿快取測試"""
+    
+    @pytest.fixture
+    def stored_posts(self, db):
+        from datetime import datetime, timedelta
+        from app.models.post import Post
+        
+        base = datetime(2024, 5, 1, 12, 0)
+        for i in range(15):
+            db.add(Post(
+                uid=f"db-{i:02d}",
+                post_url=f"https://facebook.com/db/{i}",
+                category="video" if i % 5 == 0 else "text",
+                crawled_at=base - timedelta(minutes=i)
+            ))
+        db.commit()
+    
+    @pytest_asyncio.fixture
+    async def async_cache_redis(self):
+        from app.core.redis import AsyncRedisClient
+        
+        client = AsyncRedisClient._create(False)
+        yield client
+        await client.aclose(close_connection_pool=True)
+    
+    @pytest.mark.asyncio
+    async def test_read_through_fills_then_hits(self, db, stored_posts, async_cache_redis):
+        """測試未命中時回填快取，之後的請求直接命中"""
+        import json
+        from app.services.post_cache import get_posts_read_through
+        from tests.conftest import TestingSessionLocal
+        
+        posts, source = await get_posts_read_through(
+            async_cache_redis, TestingSessionLocal, limit=5, offset=5
+        )
+        assert source == "db"
+        assert [p["uid"] for p in posts] == [f"db-{i:02d}" for i in range(5, 10)]
+        assert await async_cache_redis.zcard("posts:index") == 15
+        
+        posts, source = await get_posts_read_through(
+            async_cache_redis, TestingSessionLocal, limit=5, offset=10
+        )
+        assert source == "cache"
+        assert [p["uid"] for p in posts] == [f"db-{i:02d}" for i in range(10, 15)]
+        
+        fragments, source = await get_posts_read_through(
+            async_cache_redis, TestingSessionLocal, limit=5, offset=10, raw=True
+        )
+        assert source == "cache"
+        assert [json.loads(f) for f in fragments] == posts
+    
+    @pytest.mark.asyncio
+    async def test_short_page_uses_complete_marker(self, db, stored_posts, async_cache_redis):
+        """測試資料庫行數不足時以完整標記避免重複查詢"""
+        from app.services.post_cache import get_posts_read_through
+        from tests.conftest import TestingSessionLocal
+        
+        posts, source = await get_posts_read_through(
+            async_cache_redis, TestingSessionLocal, category="video", limit=10
+        )
+        assert source == "db"
+        assert [p["uid"] for p in posts] == ["db-00", "db-05", "db-10"]
+        assert await async_cache_redis.exists("posts:complete:video")
+        
+        posts, source = await get_posts_read_through(
+            async_cache_redis, TestingSessionLocal, category="video", limit=10
+        )
+        assert source == "cache"
+        assert len(posts) == 3
+    
+    @pytest.mark.asyncio
+    async def test_waits_for_concurrent_fill(self, db, stored_posts, async_cache_redis):
+        """測試其他請求持有回填鎖時等待並讀取快取，不查詢資料庫"""
+        import asyncio
+        from app.services.post_cache import (
+            get_posts_read_through, fill_posts_from_db_async, fill_lock_key
+        )
+        from tests.conftest import TestingSessionLocal
+        
+        await async_cache_redis.set(fill_lock_key(), "other")
+        
+        async def _fill():
+            await asyncio.sleep(0.2)
+            await fill_posts_from_db_async(async_cache_redis, db, rows=20)
+            await async_cache_redis.delete(fill_lock_key())
+        
+        (posts, source), _ = await asyncio.gather(
+            get_posts_read_through(async_cache_redis, TestingSessionLocal, limit=5),
+            _fill()
+        )
+        assert source == "cache"
+        assert [p["uid"] for p in posts] == [f"db-{i:02d}" for i in range(5)]
+    
+    def test_warm_post_listing(self, db, stored_posts):
+        """測試預熱全域和類別列表"""
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import warm_post_listing
+        
+        warmed = warm_post_listing(redis_cache_client, db, ["video", None, "video"])
+        assert warmed == {"all": 15, "video": 3}
+        assert redis_cache_client.zcard("posts:index:{video}") == 3
+    
+    @pytest.mark.asyncio
+    async def test_materialized_listing_pages(self, db, stored_posts, async_cache_redis, monkeypatch):
+        """測試預熱時預先渲染列表頁，內容與動態組裝的回應一致"""
+        from app.core.config import settings
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import (
+            get_materialized_page, get_posts_read_through, listing_pages_key,
+            listing_version_key, render_listing_page, warm_post_listing
+        )
+        from tests.conftest import TestingSessionLocal
+        
+        monkeypatch.setattr(settings, "LISTING_MATERIALIZED_PAGES", 3)
+        monkeypatch.setattr(settings, "LISTING_MATERIALIZED_PAGE_SIZE", 4)
+        warm_post_listing(redis_cache_client, db, ["video"])
+        
+        body = await get_materialized_page(async_cache_redis, limit=4, offset=4)
+        posts, source = await get_posts_read_through(
+            async_cache_redis, TestingSessionLocal, limit=4, offset=4
+        )
+        assert source == "cache"
+        assert body == render_listing_page(posts, None, 4, 4, "cache")
+        assert await get_materialized_page(async_cache_redis, limit=4, offset=12) is None
+        assert await get_materialized_page(async_cache_redis, limit=5, offset=0) is None
+        assert await get_materialized_page(async_cache_redis, limit=4, offset=2) is None
+        
+        # 類別的全部貼文不足一頁時也會渲染
+        video = await get_materialized_page(async_cache_redis, category="video", limit=4)
+        assert b'"count":3' in video
+        
+        redis_cache_client.hset(listing_pages_key("video"), "1", b"stale")
+        warm_post_listing(redis_cache_client, db, ["video"])
+        assert await async_cache_redis.hget(listing_version_key("video"), "version") == b"2"
+        assert await get_materialized_page(async_cache_redis, category="video", limit=4, offset=4) is None
+
+
+class TestLocalCache:
+    """進程內快取測試"""
+    
+    def test_ttl_and_lru_eviction(self):
+        """測試過期與超出容量時的淘汰"""
+        from app.core.local_cache import TTLCache
+        
+        now = [0.0]
+        cache = TTLCache("test", maxsize=2, ttl=5, timer=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        
+        # a 剛被讀取，容量不足時淘汰 b
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        
+        now[0] = 5.0
+        assert cache.get("a") is None
+        assert len(cache) == 1
+        
+        cache.clear()
+        assert len(cache) == 0
+    
+    def test_disabled_when_ttl_zero(self):
+        """測試 TTL 為 0 時停用"""
+        from app.core.local_cache import TTLCache
+        
+        cache = TTLCache("test", maxsize=10, ttl=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+    
+    def test_invalidation_subscriber(self):
+        """測試收到頻道訊息時呼叫回呼"""
+        import time
+        from app.core.redis import redis_client
+        from app.core.local_cache import InvalidationSubscriber
+        
+        received = []
+        subscriber = InvalidationSubscriber(redis_client, "test:invalidate", received.append)
+        subscriber.start()
+        try:
+            deadline = time.monotonic() + 5
+            # 訂閱成功時會先以 None 呼叫一次
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.02)
+            redis_client.publish("test:invalidate", "hello")
+            while len(received) < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+        finally:
+            subscriber.stop()
+        assert received == [None, "hello"]
+
+
+class TestPostCodec:
+    """貼文快取編碼測試"""
+    
+    POST = {
+        "uid": "codec-1",
+        "post_url": "https://www.facebook.com/page/posts/1",
+        "category": "text",
+        "content": "貼文內容 " * 50,
+        "comments": 3,
+        "timestamp": 1714564800.5
+    }
+    
+    @pytest.mark.parametrize("codec,compress_min_bytes", [
+        ("json", 0), ("json", 64), ("msgpack", 0), ("msgpack", 64)
+    ])
+    def test_roundtrip(self, codec, compress_min_bytes):
+        """測試各種編碼可以還原"""
+        pytest.importorskip("msgpack")
+        from app.services.post_codec import encode_post, decode_post
+        
+        data = encode_post(self.POST, codec=codec, compress_min_bytes=compress_min_bytes)
+        assert decode_post(data) == self.POST
+        if compress_min_bytes:
+            assert len(data) < len(encode_post(self.POST, codec=codec, compress_min_bytes=0))
+    
+    def test_decode_legacy_json(self):
+        """測試舊版 JSON 字串仍可解碼"""
+        import json
+        from app.services.post_codec import decode_post
+        
+        legacy = json.dumps(self.POST, ensure_ascii=False)
+        assert decode_post(legacy) == self.POST
+        assert decode_post(legacy.encode("utf-8")) == self.POST
+        with pytest.raises(ValueError):
+            decode_post(b"\x7fgarbage")
+    
+    def test_mixed_codecs_in_cache(self, monkeypatch):
+        """測試遷移期間 JSON 與 msgpack 貼文並存"""
+        pytest.importorskip("msgpack")
+        from app.core.config import settings
+        from app.core.redis import redis_cache_client
+        from app.services.post_service import save_posts_to_redis, get_posts_from_redis, post_key
+        
+        save_posts_to_redis(redis_cache_client, [dict(self.POST, uid="old", timestamp=1.0)])
+        monkeypatch.setattr(settings, "REDIS_POST_CODEC", "msgpack")
+        save_posts_to_redis(redis_cache_client, [dict(self.POST, uid="new", timestamp=2.0)])
+        
+        assert redis_cache_client.get(post_key("new", self.POST["category"])).startswith(b"\x01")
+        posts = get_posts_from_redis(redis_cache_client, limit=10)
+        assert [p["uid"] for p in posts] == ["new", "old"]
+    
+    @pytest.mark.parametrize("codec,compress_min_bytes", [("json", 0), ("json", 64), ("msgpack", 0)])
+    def test_json_fragment(self, codec, compress_min_bytes):
+        """測試 JSON 內容原樣返回，其他格式轉為與直接序列化相同的 JSON"""
+        pytest.importorskip("msgpack")
+        from app.core.serialization import dumps
+        from app.services.post_codec import encode_post, post_json_fragment
+        
+        data = encode_post(self.POST, codec=codec, compress_min_bytes=compress_min_bytes)
+        fragment = post_json_fragment(data)
+        assert fragment == dumps(self.POST)
+        if codec == "json" and not compress_min_bytes:
+            assert fragment is data
+    
+    def test_dumps_fallback_matches_orjson(self, monkeypatch):
+        """測試未安裝 orjson 時的序列化結果與 orjson 相同（含 datetime）"""
+        from datetime import datetime, timezone
+        from app.core import serialization
+        
+        content = {
+            "since": datetime(2024, 5, 1, 10, 30),
+            "until": datetime(2024, 5, 2, 10, 30, 15, 123456, tzinfo=timezone.utc),
+            "data": [{"uid": "中文", "crawled_at": datetime(2024, 5, 1)}]
+        }
+        expected = serialization.dumps(content)
+        monkeypatch.setattr(serialization, "orjson", None)
+        assert serialization.dumps(content) == expected
+        assert serialization.loads(expected)["since"] == "2024-05-01T10:30:00"
+    
+    def test_render_listing_page_splices_fragments(self):
+        """測試列表頁拼接貼文 JSON 與序列化字典的結果一致"""
+        import json
+        from app.services.post_cache import listing_payload, render_listing_page
+        from app.services.post_codec import encode_post
+        
+        posts = [dict(self.POST, uid=f"codec-{i}") for i in range(3)]
+        spliced = render_listing_page([encode_post(p, codec="json") for p in posts], "text", 3, 0, "cache")
+        assert spliced == render_listing_page(posts, "text", 3, 0, "cache")
+        assert json.loads(spliced) == listing_payload(posts, "text", 3, 0, "cache")
+        assert json.loads(render_listing_page([], None, 3, 0, "cache"))["data"] == []
+
+
+class TestCrawlerParsing:
+    """爬蟲解析測試"""
+    
+    def test_extract_post_text(self):
+        """測試提取貼文文字"""
+        from app.crawler.facebook import extract_post_info
+        
+        post_html = (
+            '<div><a href="https://www.facebook.com/page/posts/123">link</a>'
+            '<script>var x = 1;</script>'
+            '<span dir="auto">Hello&nbsp;&amp; welcome</span>  <b>world</b></div>'
+        )
+        info = extract_post_info(post_html)
+        assert info is not None
+        assert info["content"] == "link Hello\xa0& welcome world"
+        assert "var x" not in info["content"]
+
+
+class TestReplicaRouter:
+    """讀取副本路由測試"""
+    
+    def test_round_robin_and_fallback(self, tmp_path):
+        """測試輪詢分派與故障回退"""
+        from sqlalchemy import create_engine
+        from app.core.db import ReplicaRouter
+        
+        primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+        replica_a = create_engine(f"sqlite:///{tmp_path}/a.db")
+        replica_b = create_engine(f"sqlite:///{tmp_path}/b.db")
+        router = ReplicaRouter(primary, [replica_a, replica_b])
+        
+        # 健康副本輪流使用
+        assert router.get_engine() is replica_a
+        assert router.get_engine() is replica_b
+        assert router.get_engine() is replica_a
+        
+        # 不健康的副本被跳過
+        router.mark_unhealthy(replica_b)
+        assert router.get_engine() is replica_a
+        assert router.get_engine() is replica_a
+        
+        # 全部不可用時回退到主庫
+        router.mark_unhealthy(replica_a)
+        assert router.get_engine() is primary
+    
+    def test_health_check_failure(self, tmp_path):
+        """測試健康檢查失敗的副本不會被使用"""
+        from sqlalchemy import create_engine
+        from app.core.db import ReplicaRouter
+        
+        primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+        broken = create_engine(f"sqlite:///{tmp_path}/missing/dir/replica.db")
+        router = ReplicaRouter(primary, [broken])
+        
+        assert router.get_engine() is primary
+    
+    def test_stale_health_check_runs_in_background(self, tmp_path):
+        """測試定期健康檢查在背景執行，同一副本同時只有一個檢查"""
+        import threading
+        import time
+        from sqlalchemy import create_engine
+        from app.core.db import ReplicaRouter
+        
+        primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+        replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+        router = ReplicaRouter(primary, [replica], health_check_interval=0)
+        assert router.get_engine() is replica
+        
+        release = threading.Event()
+        calls = []
+        
+        def slow_check(index):
+            calls.append(index)
+            release.wait(5)
+            router._set_health(index, False)
+            return False
+        
+        router._check = slow_check
+        try:
+            # 檢查進行中沿用上次的結果，請求不等待也不重複發起檢查
+            assert router.get_engine() is replica
+            assert router.get_engine() is replica
+            assert calls == [0]
+        finally:
+            release.set()
+        deadline = time.monotonic() + 5
+        while router._probing and time.monotonic() < deadline:
+            time.sleep(0.01)
+        router.health_check_interval = 60
+        assert router.get_engine() is primary
+    
+    def test_read_retries_on_primary(self, tmp_path, monkeypatch):
+        """測試副本查詢失敗時標記為不健康並改從主庫讀取"""
+        from datetime import datetime
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from app.core import db as db_module
+        from app.core.db import Base, ReplicaRouter
+        from app.models.post import Post
+        from app.services.post_service import get_posts_from_db, get_post_dicts_from_db
+        
+        primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+        Base.metadata.create_all(bind=primary)
+        broken = create_engine(f"sqlite:///{tmp_path}/missing/dir/replica.db")
+        session_factory = sessionmaker(bind=primary)
+        with session_factory() as session:
+            session.add(Post(uid="p-1", post_url="https://facebook.com/p/1", crawled_at=datetime(2024, 5, 1)))
+            session.commit()
+        
+        router = ReplicaRouter(primary, [broken])
+        router._set_health(0, True)
+        monkeypatch.setattr(db_module, "replica_router", router)
+        monkeypatch.setattr(db_module, "SessionLocal", session_factory)
+        
+        replica_session = session_factory(bind=broken)
+        try:
+            assert [p.uid for p in get_posts_from_db(replica_session)] == ["p-1"]
+            assert router.get_engine() is primary
+            router._set_health(0, True)
+            assert get_post_dicts_from_db(replica_session, ("uid",)) == [{"uid": "p-1"}]
+        finally:
+            replica_session.close()
+
+
+class TestPostPartitions:
+    """貼文分區管理測試"""
+    
+    def test_partition_naming(self):
+        """測試分區命名與月份計算"""
+        from datetime import date
+        from app.core.partitions import add_months, partition_name
+        
+        assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+        assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+        assert partition_name(date(2024, 5, 1)) == "posts_y2024m05"
+    
+    def test_non_postgres_is_noop(self, tmp_path):
+        """測試非 PostgreSQL 資料庫不做分區操作"""
+        from sqlalchemy import create_engine
+        from app.core.partitions import ensure_post_partitions, expire_post_partitions
+        
+        engine = create_engine(f"sqlite:///{tmp_path}/test.db")
+        assert ensure_post_partitions(engine) == []
+        assert expire_post_partitions(engine, retention_months=1) == []
+    
+    def test_expired_partitions_bump_listing_version(self, monkeypatch):
+        """測試分區過期時遞增全域列表的內容版本"""
+        from app.core.redis import redis_cache_client
+        from app.services.post_cache import listing_version_key
+        from app.tasks import crawler_tasks
+        
+        monkeypatch.setattr(crawler_tasks, "ensure_post_partitions", lambda engine: [])
+        monkeypatch.setattr(crawler_tasks, "expire_post_partitions", lambda engine: [])
+        crawler_tasks.maintain_post_partitions()
+        assert redis_cache_client.hget(listing_version_key(), "version") is None
+        
+        monkeypatch.setattr(crawler_tasks, "expire_post_partitions", lambda engine: ["posts_y2023m01"])
+        result = crawler_tasks.maintain_post_partitions()
+        assert result["expired"] == ["posts_y2023m01"]
+        assert int(redis_cache_client.hget(listing_version_key(), "version")) == 1
+
+
+class TestParquetSnapshot:
+    """Parquet 快照測試"""
+    
+    def test_incremental_snapshot(self, db, tmp_path):
+        """測試分區輸出與增量水位線"""
+        pq = pytest.importorskip("pyarrow.parquet")
+        from datetime import datetime
+        from sqlalchemy.orm import sessionmaker
+        from app.models.post import Post
+        from app.services.export_service import write_parquet_snapshot, load_manifest
+        
+        session_factory = sessionmaker(bind=db.get_bind())
+        for i, (day, category) in enumerate([
+            (1, "text"), (1, "text"), (1, "text"), (1, "video"), (2, "text")
+        ]):
+            db.add(Post(
+                uid=f"snap-{i}",
+                post_url=f"https://facebook.com/post/{i}",
+                category=category,
+                crawled_at=datetime(2024, 5, day, 10, i)
+            ))
+        db.commit()
+        
+        run = write_parquet_snapshot(
+            session_factory, str(tmp_path), rows_per_file=2, safety_lag_seconds=0
+        )
+        assert run["rows"] == 5
+        paths = sorted(f["path"] for f in run["files"])
+        assert len(paths) == 4
+        assert all(p.startswith("dt=2024-05-0") for p in paths)
+        
+        text_day1 = pq.read_table(tmp_path / "dt=2024-05-01" / "category=text")
+        assert text_day1.num_rows == 3
+        
+        manifest = load_manifest(tmp_path)
+        assert manifest["watermark"]["uid"] == "snap-4"
+        
+        # 沒有新資料時不產生檔案
+        run = write_parquet_snapshot(session_factory, str(tmp_path), safety_lag_seconds=0)
+        assert run["rows"] == 0
+        
+        db.add(Post(
+            uid="snap-new",
+            post_url="https://facebook.com/post/new",
+            category="image",
+            crawled_at=datetime(2024, 5, 3)
+        ))
+        db.commit()
+        run = write_parquet_snapshot(session_factory, str(tmp_path), safety_lag_seconds=0)
+        assert run["rows"] == 1
+        assert len(load_manifest(tmp_path)["runs"]) == 3
+    
+    def test_failed_snapshot_leaves_no_files(self, db, tmp_path, monkeypatch):
+        """測試中途失敗時不留下檔案，水位線不變"""
+        pytest.importorskip("pyarrow.parquet")
+        from datetime import datetime
+        from sqlalchemy.orm import sessionmaker
+        from app.models.post import Post
+        from app.services import export_service
+        
+        session_factory = sessionmaker(bind=db.get_bind())
+        for i in range(6):
+            db.add(Post(
+                uid=f"fail-{i}",
+                post_url=f"https://facebook.com/post/{i}",
+                category="text",
+                crawled_at=datetime(2024, 5, 1 + i // 3, 10, i)
+            ))
+        db.commit()
+        
+        iter_posts = export_service.iter_posts_for_export
+        
+        def _failing_iter(*args, **kwargs):
+            for i, post in enumerate(iter_posts(*args, **kwargs)):
+                if i == 4:
+                    raise RuntimeError("資料庫連線中斷")
+                yield post
+        
+        monkeypatch.setattr(export_service, "iter_posts_for_export", _failing_iter)
+        with pytest.raises(RuntimeError):
+            export_service.write_parquet_snapshot(
+                session_factory, str(tmp_path), rows_per_file=2, safety_lag_seconds=0
+            )
+        
+        assert list(tmp_path.rglob("*.parquet")) == []
+        assert export_service.load_manifest(tmp_path)["watermark"] is None
+        
+        monkeypatch.setattr(export_service, "iter_posts_for_export", iter_posts)
+        run = export_service.write_parquet_snapshot(
+            session_factory, str(tmp_path), rows_per_file=2, safety_lag_seconds=0
+        )
+        assert run["rows"] == 6
+        assert len(list(tmp_path.rglob("*.parquet"))) == 4